@@ -0,0 +1,196 @@
+"""
+Geofence Backfill Job
+Reclassifies samsara_location_history (and current tracker positions)
+against the active geofences after a fence is added or edited
+
+Usage:
+    python backfill_geofences.py
+    python backfill_geofences.py --since 2026-01-01 --page-size 500
+    python backfill_geofences.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from geofence import GeofenceRegistry
+from supabase_rest import DEFAULT_PAGE_SIZE, bulk_write
+
+# Load environment variables
+load_dotenv()
+
+HISTORY_COLUMNS = 'id,tracker_id,happened_at,latitude,longitude,accuracy_meters,zone_ids,uncertain_zone_ids,is_on_site'
+TRACKER_COLUMNS = 'id,name,last_latitude,last_longitude,last_accuracy_meters,zone_ids,uncertain_zone_ids,is_on_site'
+
+
+class GeofenceBackfill:
+    """Re-runs geofence classification over stored tracker data"""
+
+    def __init__(self, session=None, supabase_url=None, supabase_key=None):
+        self.session = session or requests.Session()
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env or GitHub secrets")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    @staticmethod
+    def _changed(row: dict, before: dict) -> bool:
+        return any(row.get(key) != before.get(key) for key in ('zone_ids', 'uncertain_zone_ids', 'is_on_site'))
+
+    def backfill_history(self, registry: GeofenceRegistry, since: str = None,
+                         page_size: int = DEFAULT_PAGE_SIZE, dry_run: bool = False) -> dict:
+        """
+        Reclassify location history page by page (keyset pagination on id)
+
+        Only rows whose classification changed are written back. Pages
+        larger than the PostgREST row limit come back truncated, so the loop
+        only ends on an empty page.
+        """
+        stats = {'rows_scanned': 0, 'rows_changed': 0, 'errors': 0}
+        url = f"{self.supabase_url}/rest/v1/samsara_location_history"
+        last_id = 0
+
+        while True:
+            params = {
+                'select': HISTORY_COLUMNS,
+                'id': f'gt.{last_id}',
+                'order': 'id',
+                'limit': page_size
+            }
+            if since:
+                params['happened_at'] = f'gte.{since}'
+
+            response = self.session.get(url, headers=self.supabase_headers, params=params)
+            if response.status_code != 200:
+                print(f"   Error reading history after id {last_id}: {response.text}")
+                stats['errors'] += 1
+                return stats
+
+            page = response.json()
+            if not page:
+                return stats
+
+            before = {row['id']: dict(row) for row in page}
+            registry.annotate(page, 'latitude', 'longitude', accuracy_key='accuracy_meters', on_site_key='is_on_site')
+            changed = [
+                {key: row[key] for key in ('tracker_id', 'happened_at', 'latitude', 'longitude',
+                                           'zone_ids', 'uncertain_zone_ids', 'is_on_site')}
+                for row in page if self._changed(row, before[row['id']])
+            ]
+
+            stats['rows_scanned'] += len(page)
+            stats['rows_changed'] += len(changed)
+            last_id = page[-1]['id']
+
+            if changed and not dry_run:
+                result = bulk_write(
+                    self.session, self.supabase_url, self.supabase_headers, 'samsara_location_history', changed,
+                    on_conflict='tracker_id,happened_at', resolution='merge-duplicates'
+                )
+                stats['errors'] += result['errors']
+                if result['errors']:
+                    print(f"   Error writing history: {result['error']}")
+
+            print(f"   Scanned {stats['rows_scanned']} rows, {stats['rows_changed']} reclassified")
+
+    def backfill_trackers(self, registry: GeofenceRegistry, dry_run: bool = False) -> dict:
+        """Reclassify each tracker's last known position"""
+        stats = {'rows_scanned': 0, 'rows_changed': 0, 'errors': 0}
+        response = self.session.get(
+            f"{self.supabase_url}/rest/v1/samsara_trackers",
+            headers=self.supabase_headers,
+            params={'select': TRACKER_COLUMNS, 'last_latitude': 'not.is.null'}
+        )
+        if response.status_code != 200:
+            print(f"   Error reading trackers: {response.text}")
+            stats['errors'] += 1
+            return stats
+
+        trackers = response.json()
+        before = {row['id']: dict(row) for row in trackers}
+        registry.annotate(trackers, 'last_latitude', 'last_longitude',
+                          accuracy_key='last_accuracy_meters', on_site_key='is_on_site')
+        changed = [
+            {key: row[key] for key in ('id', 'name', 'zone_ids', 'uncertain_zone_ids', 'is_on_site')}
+            for row in trackers if self._changed(row, before[row['id']])
+        ]
+
+        stats['rows_scanned'] = len(trackers)
+        stats['rows_changed'] = len(changed)
+
+        if changed and not dry_run:
+            result = bulk_write(
+                self.session, self.supabase_url, self.supabase_headers, 'samsara_trackers', changed,
+                resolution='merge-duplicates'
+            )
+            stats['errors'] += result['errors']
+            if result['errors']:
+                print(f"   Error writing trackers: {result['error']}")
+
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reclassify stored tracker fixes against current geofences')
+    parser.add_argument('--since', help='Only reclassify history on or after this ISO date')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("GEOFENCE BACKFILL")
+    print("=" * 80)
+
+    try:
+        backfill = GeofenceBackfill()
+        registry = GeofenceRegistry.load(backfill.session, backfill.supabase_url, backfill.supabase_headers)
+        if not registry.from_database:
+            print("\nNo active geofences found - run supabase/geofence_schema.sql first")
+            sys.exit(1)
+        if not registry.has_uncertain_column:
+            print("\nuncertain_zone_ids is missing - run supabase/geofence_polygon_schema.sql first")
+            sys.exit(1)
+        print(f"Zones: {len(registry.zones)} ({len(registry.site_zone_ids)} site)")
+
+        start = time.perf_counter()
+
+        print("\n1. Reclassifying tracker positions...")
+        tracker_stats = backfill.backfill_trackers(registry, dry_run=args.dry_run)
+        print(f"   {tracker_stats['rows_changed']} of {tracker_stats['rows_scanned']} trackers changed")
+
+        print("\n2. Reclassifying location history...")
+        history_stats = backfill.backfill_history(registry, since=args.since, page_size=args.page_size,
+                                                  dry_run=args.dry_run)
+
+        elapsed = time.perf_counter() - start
+        print("\n" + "=" * 80)
+        print("BACKFILL COMPLETED" + (" (dry run)" if args.dry_run else ""))
+        print("=" * 80)
+        print(f"History rows scanned:      {history_stats['rows_scanned']}")
+        print(f"History rows reclassified: {history_stats['rows_changed']}")
+        print(f"Elapsed:                   {elapsed:.1f}s")
+        print("=" * 80)
+
+        errors = tracker_stats['errors'] + history_stats['errors']
+        sys.exit(1 if errors else 0)
+
+    except Exception as e:
+        print(f"\nFatal error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Upload Checkpoints
+Lets a delete-and-reinsert sync resume after a failed batch instead of
+starting over. When an upload starts, the parsed rows are cached next to a
+small progress file that records the sync id, the workbook hash and the
+last committed batch. A retry against the same workbook reuses the cached
+rows (no Excel parse), does not clear the table again, and sends only the
+batches that are still missing.
+
+A batch PostgREST rejects for its data is bisected down to the offending
+rows: the rest of the batch is inserted, and the bad rows are logged with
+their Excel row numbers and added to the table's quarantine report. The
+checkpoint remembers them, so a resumed upload still leaves them out of the
+rows it reports as synced.
+
+Usage:
+    checkpoint = UploadCheckpoint.load('delivery_dates', workbook_hash)
+    if checkpoint is None:
+        checkpoint = UploadCheckpoint.start('delivery_dates', workbook_hash, records)
+    result = upload_batches(session, supabase_url, headers, checkpoint)
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from supabase_rest import insert_bisecting
+
+CHECKPOINT_DIR = os.getenv('SYNC_CHECKPOINT_DIR', str(Path(__file__).with_name('logs') / 'checkpoints'))
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path: Path, data) -> None:
+    """Write atomically so a crash never leaves a half-written checkpoint"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class UploadCheckpoint:
+    """Progress of one table upload"""
+
+    def __init__(self, table: str, workbook_hash: str, rows: List[Dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                 sync_id: Optional[str] = None, committed: int = 0, cleared: bool = False,
+                 started_at: Optional[str] = None, directory: Optional[str] = None,
+                 excel_rows: Optional[List[int]] = None, rejected: Optional[List[int]] = None):
+        """
+        Args:
+            table: Target table; one checkpoint per table
+            workbook_hash: sha256 of the workbook the rows were parsed from
+            rows: Every row of the upload, in batch order
+            batch_size: Rows per request
+            sync_id: Id shared by the first attempt and its resumes
+            committed: Number of batches the server has accepted
+            cleared: Whether the table has been cleared for this sync
+            started_at: ISO time of the first attempt
+            directory: Where checkpoint files live (default CHECKPOINT_DIR)
+            excel_rows: Excel row number of each row, for logging rejected rows
+            rejected: Indexes into rows of the rows committed batches left out
+        """
+        self.table = table
+        self.workbook_hash = workbook_hash
+        self.rows = rows
+        self.batch_size = batch_size
+        self.sync_id = sync_id or uuid.uuid4().hex
+        self.committed = committed
+        self.cleared = cleared
+        self.started_at = started_at or datetime.now(timezone.utc).isoformat()
+        self.directory = Path(directory or CHECKPOINT_DIR)
+        self.excel_rows = excel_rows
+        self.rejected = rejected or []
+
+    @property
+    def state_path(self) -> Path:
+        return self.directory / f"{self.table}.json"
+
+    @property
+    def rows_path(self) -> Path:
+        return self.directory / f"{self.table}.rows.json"
+
+    @property
+    def batch_count(self) -> int:
+        return (len(self.rows) + self.batch_size - 1) // self.batch_size
+
+    @property
+    def remaining_rows(self) -> int:
+        return max(len(self.rows) - self.committed * self.batch_size, 0)
+
+    @classmethod
+    def start(cls, table: str, workbook_hash: str, rows: List[Dict], batch_size: int = DEFAULT_BATCH_SIZE,
+              directory: Optional[str] = None, excel_rows: Optional[List[int]] = None) -> 'UploadCheckpoint':
+        """Begin a new upload, replacing any checkpoint left for the table"""
+        checkpoint = cls(table, workbook_hash, rows, batch_size, directory=directory, excel_rows=excel_rows)
+        checkpoint.directory.mkdir(parents=True, exist_ok=True)
+        _write_json(checkpoint.rows_path, {'rows': rows, 'excel_rows': excel_rows})
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, table: str, workbook_hash: str, directory: Optional[str] = None) -> Optional['UploadCheckpoint']:
+        """
+        Checkpoint left by an unfinished upload of the same workbook
+
+        A checkpoint for a different workbook is stale: it is removed and
+        None is returned, so the caller starts a fresh sync.
+        """
+        empty = cls(table, workbook_hash, [], directory=directory)
+        try:
+            with open(empty.state_path) as f:
+                state = json.load(f)
+            with open(empty.rows_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            empty.clear()
+            return None
+
+        if state.get('workbook_hash') != workbook_hash:
+            print(f"   Discarding {table} checkpoint from an older workbook")
+            empty.clear()
+            return None
+
+        # Checkpoints written before Excel rows were kept hold a bare row list
+        if isinstance(cached, list):
+            cached = {'rows': cached, 'excel_rows': None}
+        return cls(table, workbook_hash, cached['rows'], state['batch_size'], sync_id=state['sync_id'],
+                   committed=state['committed'], cleared=state['cleared'], started_at=state['started_at'],
+                   directory=directory, excel_rows=cached.get('excel_rows'), rejected=state.get('rejected'))
+
+    def save(self) -> None:
+        _write_json(self.state_path, {
+            'sync_id': self.sync_id,
+            'table': self.table,
+            'workbook_hash': self.workbook_hash,
+            'batch_size': self.batch_size,
+            'rows': len(self.rows),
+            'committed': self.committed,
+            'rejected': self.rejected,
+            'cleared': self.cleared,
+            'started_at': self.started_at,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+
+    def mark_cleared(self) -> None:
+        self.cleared = True
+        self.save()
+
+    def commit(self, batch_index: int, rejected: List[int] = ()) -> None:
+        """Record that batches up to and including batch_index are on the server, less the rejected rows"""
+        self.committed = batch_index + 1
+        self.rejected.extend(rejected)
+        self.save()
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the upload has finished"""
+        for path in (self.state_path, self.rows_path):
+            if path.exists():
+                path.unlink()
+
+
+def quarantine_rejected(table: str, rows: List[Dict], rejected: List, excel_rows: Optional[List[int]] = None,
+                        offset: int = 0, metrics=None) -> List[int]:
+    """
+    Log rows the server refused and add them to the table's quarantine report
+
+    Args:
+        table: Target table
+        rows: Every row of the upload
+        rejected: [(position, message)] from insert_bisecting
+        excel_rows: Excel row number of each of rows, if known
+        offset: Index in rows of the batch the positions refer to
+        metrics: RunMetrics to count 'rows_quarantined' and 'rows_rejected' into
+
+    Returns:
+        Indexes into rows of the rejected rows
+    """
+    # Imported here: row_validation loads pandas, and invenio_sync imports
+    # this module at startup only for file_sha256
+    from row_validation import append_quarantine_rows
+
+    indexes, quarantined = [], []
+    for position, message in rejected:
+        row_index = offset + position
+        excel_row = excel_rows[row_index] if excel_rows else None
+        where = f"Excel row {excel_row}" if excel_row is not None else f"Row {row_index + 1} of the upload"
+        print(f"   Rejected {where}: {message}")
+        indexes.append(row_index)
+        quarantined.append({'excel_row': excel_row,
+                            'problems': [{'column': None, 'value': None,
+                                          'problem': f"rejected by Supabase: {message}"}],
+                            'record': rows[row_index]})
+    if quarantined:
+        append_quarantine_rows(table, quarantined)
+        if metrics:
+            metrics.count('rows_quarantined', len(quarantined))
+            metrics.count('rows_rejected', len(quarantined))
+    return indexes
+
+
+def upload_batches(session, supabase_url: str, headers: Dict, checkpoint: UploadCheckpoint,
+                   metrics=None) -> Dict:
+    """
+    POST the batches a checkpoint still has outstanding, committing each
+
+    A batch rejected for its data is bisected (supabase_rest.insert_bisecting):
+    its good rows are inserted and the rows Postgres refuses are logged and
+    quarantined, and the upload carries on. Any other failure, or a batch
+    in which every row is rejected, stops the upload with the checkpoint
+    kept. A batch whose response was lost (process killed mid-request, or a
+    failure partway through a bisection) is sent again on resume; the tables
+    have no natural key to deduplicate on.
+
+    Returns:
+        Dictionary with 'success', 'count' (rows inserted by this call),
+        'batches' (requests sent), 'rejected' (indexes into checkpoint.rows
+        of rows the server refused, in this call or an earlier attempt) and
+        'error'
+    """
+    url = f"{supabase_url}/rest/v1/{checkpoint.table}"
+    rows = checkpoint.rows
+    size = checkpoint.batch_size
+    result = {'success': True, 'count': 0, 'batches': 0, 'rejected': [], 'error': None}
+    uploaded = checkpoint.committed * size
+
+    for index in range(checkpoint.committed, checkpoint.batch_count):
+        batch = rows[index * size:(index + 1) * size]
+        outcome = insert_bisecting(session, url, headers, batch)
+        result['batches'] += outcome['requests']
+        result['count'] += outcome['inserted']
+        if metrics:
+            metrics.count('rows_written', outcome['inserted'])
+
+        if not outcome['success']:
+            print(f"   Error inserting batch {index + 1}/{checkpoint.batch_count}: {outcome['error']}")
+            print(f"   Checkpoint saved; re-run to resume from batch {index + 1}")
+            result['success'] = False
+            result['error'] = outcome['error']
+            result['rejected'] = list(checkpoint.rejected)
+            return result
+
+        rejected = quarantine_rejected(checkpoint.table, rows, outcome['rejected'], checkpoint.excel_rows,
+                                       offset=index * size, metrics=metrics)
+        checkpoint.commit(index, rejected)
+        uploaded += len(batch)
+        print(f"   Inserted batch {index + 1}: {uploaded}/{len(rows)} records"
+              + (f" ({len(outcome['rejected'])} rejected)" if outcome['rejected'] else ''))
+
+    checkpoint.clear()
+    result['rejected'] = list(checkpoint.rejected)
+    return result
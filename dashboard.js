@@ -112,6 +112,27 @@ toastStyle.textContent = `
 `;
 document.head.appendChild(toastStyle);
 
+const SHIPMENT_TABLE_COLUMNS = 'shipment_number,po_number,part_description,status,supplier,category,eta,delivery_date,num_pieces';
+const PO_TABLE_COLUMNS = 'purchase_order_id,po_description,status,supplier,category,delivery_date_from,net_value';
+
+// One row per purchase order, kept up to date by dashboard_rollups.py.
+// Falls back to the PO lines if the rollup table has not been created yet.
+async function loadPOSummaries() {
+    const { data, error } = await projectSupabaseClient.from('rollup_po_status')
+        .select(PO_TABLE_COLUMNS + ',shipment_status')
+        .order('purchase_order_id', { ascending: false });
+
+    if (!error) return data;
+    console.warn('rollup_po_status unavailable, loading purchase_orders instead:', error.message);
+
+    const { data: poLines, error: poError } = await projectSupabaseClient.from('purchase_orders')
+        .select(PO_TABLE_COLUMNS)
+        .order('created_on', { ascending: false, nullsFirst: false });
+
+    if (poError) throw poError;
+    return poLines;
+}
+
 // Load all data from Supabase
 async function loadAllData() {
     try {
@@ -126,19 +147,15 @@ async function loadAllData() {
 
         if (metricsError) throw metricsError;
 
-        // Load shipments
+        // Load shipments (only the columns the table shows)
         const { data: shipments, error: shipmentsError } = await projectSupabaseClient.from('shipments')
-            .select('*')
+            .select(SHIPMENT_TABLE_COLUMNS)
             .order('delivery_date', { ascending: false, nullsFirst: false });
 
         if (shipmentsError) throw shipmentsError;
 
-        // Load PO data
-        const { data: poData, error: poError } = await projectSupabaseClient.from('purchase_orders')
-            .select('*')
-            .order('created_on', { ascending: false, nullsFirst: false });
-
-        if (poError) throw poError;
+        // Load one row per PO from the rollup table
+        const poData = await loadPOSummaries();
 
         // Load installation data from local JSON files (not migrated to Supabase yet)
         const [auditDataResp, disciplineSummaryResp] = await Promise.all([
@@ -407,7 +424,7 @@ function populatePOTable() {
         return;
     }
 
-    // Get unique POs (group by PO ID) - using Supabase field names
+    // Get unique POs (group by PO ID) - a no-op for rollup rows, needed for the PO line fallback
     const uniquePOs = {};
     poData.forEach(item => {
         const poId = item.purchase_order_id;
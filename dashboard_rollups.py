@@ -0,0 +1,320 @@
+"""
+Dashboard Rollups
+Compact aggregate tables computed at the end of each sync, so the dashboards
+read a few kilobytes instead of every row of purchase_orders and shipments:
+
+    rollup_group_counts       rows, POs and value per status/category/supplier
+    rollup_weekly_deliveries  PO lines, shipments and ready-by dates per week
+    rollup_po_status          one row per purchase order with its shipment status
+
+Source rows come from the local mirror when it holds the table (no download),
+otherwise from Supabase. Tables: supabase/dashboard_rollups_schema.sql
+
+Usage:
+    python dashboard_rollups.py
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+
+from local_mirror import LocalMirror, read_table
+from po_links import build_links, po_key, shipment_status, shipment_totals, split_po_numbers
+from supabase_rest import DEFAULT_PROJECT_ID, replace_rows
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+# Rollup table -> upsert conflict target
+ROLLUP_TABLES = {
+    'rollup_group_counts': 'project_id,dataset,dimension,value',
+    'rollup_weekly_deliveries': 'project_id,dataset,date_column,week_start',
+    'rollup_po_status': 'project_id,purchase_order_id',
+}
+
+# Columns counted per dataset in rollup_group_counts (plus a 'total' row)
+GROUP_DIMENSIONS = {
+    'purchase_orders': ('status', 'delivery_status', 'category', 'supplier'),
+    'shipments': ('status', 'category', 'supplier'),
+    'delivery_dates': ('project_phase', 'supplier_name'),
+}
+
+# Date columns bucketed by week in rollup_weekly_deliveries
+WEEKLY_COLUMNS = {
+    'purchase_orders': ('delivery_date_from',),
+    'shipments': ('rts_date', 'eta', 'delivery_date'),
+    'delivery_dates': ('delivery_date',),
+}
+
+NONE_LABEL = '(none)'
+
+
+def _frame(rows: List[Dict], text=(), numeric=(), dates=()) -> pd.DataFrame:
+    """Rows as a DataFrame with every listed column present (the mirror omits NULLs)"""
+    df = pd.DataFrame(rows)
+    df['project_id'] = df['project_id'].fillna(DEFAULT_PROJECT_ID) if 'project_id' in df.columns else DEFAULT_PROJECT_ID
+    for column in text:
+        if column not in df.columns:
+            df[column] = None
+    for column in numeric:
+        df[column] = pd.to_numeric(df[column], errors='coerce') if column in df.columns else np.nan
+    for column in dates:
+        df[column] = pd.to_datetime(df[column], errors='coerce') if column in df.columns else pd.NaT
+    return df
+
+
+def _label(series: pd.Series) -> pd.Series:
+    """Group labels with NULL and blank collapsed into NONE_LABEL"""
+    labels = series.astype('string').str.strip()
+    return labels.mask(labels.isna() | (labels == ''), NONE_LABEL)
+
+
+def _text(value) -> Optional[str]:
+    return None if pd.isna(value) else value
+
+
+def _date(value) -> Optional[str]:
+    return None if pd.isna(value) else value.strftime('%Y-%m-%d')
+
+
+def _number(value, digits: int = 2):
+    return None if pd.isna(value) else round(float(value), digits)
+
+
+def group_counts(frames: Dict[str, pd.DataFrame]) -> List[Dict]:
+    rows = []
+    for dataset, dimensions in GROUP_DIMENSIONS.items():
+        df = frames[dataset]
+        if df.empty:
+            continue
+        nan = pd.Series(np.nan, index=df.index)
+        base = pd.DataFrame({
+            'project_id': df['project_id'],
+            'po': df['purchase_order_id'] if dataset == 'purchase_orders' else df['po_key'],
+            'net_value': df.get('net_value', nan),
+            'num_pieces': df.get('num_pieces', nan),
+        })
+
+        for dimension in ('total',) + dimensions:
+            labels = 'all' if dimension == 'total' else _label(df.get(dimension, nan))
+            summary = base.assign(label=labels).groupby(['project_id', 'label'], sort=False).agg(
+                row_count=('label', 'size'),
+                po_count=('po', 'nunique'),
+                total_value=('net_value', 'sum'),
+                total_pieces=('num_pieces', 'sum'),
+            ).reset_index()
+            for record in summary.itertuples(index=False):
+                rows.append({
+                    'project_id': record.project_id,
+                    'dataset': dataset,
+                    'dimension': dimension,
+                    'value': record.label,
+                    'row_count': int(record.row_count),
+                    'po_count': int(record.po_count),
+                    'total_value': _number(record.total_value) if dataset == 'purchase_orders' else None,
+                    'total_pieces': int(record.total_pieces) if dataset == 'shipments' else None,
+                })
+    return rows
+
+
+def weekly_deliveries(frames: Dict[str, pd.DataFrame]) -> List[Dict]:
+    rows = []
+    for dataset, columns in WEEKLY_COLUMNS.items():
+        df = frames[dataset]
+        if df.empty:
+            continue
+        for column in columns:
+            dated = df[df[column].notna()]
+            if dated.empty:
+                continue
+            # Monday of the week
+            weeks = (dated[column] - pd.to_timedelta(dated[column].dt.weekday, unit='D')).dt.normalize()
+            values = dated['net_value'] if 'net_value' in dated.columns else pd.Series(np.nan, index=dated.index)
+            summary = (pd.DataFrame({'project_id': dated['project_id'], 'week_start': weeks, 'value': values})
+                       .groupby(['project_id', 'week_start'])
+                       .agg(row_count=('value', 'size'), total_value=('value', 'sum'))
+                       .reset_index())
+            for record in summary.itertuples(index=False):
+                rows.append({
+                    'project_id': record.project_id,
+                    'dataset': dataset,
+                    'date_column': column,
+                    'week_start': _date(record.week_start),
+                    'row_count': int(record.row_count),
+                    'total_value': _number(record.total_value) if dataset == 'purchase_orders' else None,
+                })
+    return rows
+
+
+def po_status(po: pd.DataFrame, totals: List[Dict]) -> List[Dict]:
+    """One row per purchase order: header fields, line totals and shipment progress (po_links totals)"""
+    if po.empty:
+        return []
+    orders = po.groupby(['project_id', 'purchase_order_id'], sort=False).agg(
+        po_description=('po_description', 'first'),
+        supplier=('supplier', 'first'),
+        category=('category', 'first'),
+        status=('status', 'first'),
+        delivery_date_from=('delivery_date_from', 'min'),
+        line_count=('purchase_order_id', 'size'),
+        net_value=('net_value', 'sum'),
+    )
+    shipped = {(t['project_id'], t['purchase_order_id']): t for t in totals if t['matched']}
+    unshipped = {'shipment_count': 0, 'delivered_shipments': 0, 'in_transit_shipments': 0,
+                 'next_eta': None, 'last_delivery_date': None, 'shipment_status': shipment_status(0, 0, 0)}
+
+    rows = []
+    for (project_id, purchase_order_id), record in zip(orders.index, orders.itertuples(index=False)):
+        total = shipped.get((project_id, purchase_order_id), unshipped)
+        rows.append({
+            'project_id': project_id,
+            'purchase_order_id': purchase_order_id,
+            'po_description': _text(record.po_description),
+            'supplier': _text(record.supplier),
+            'category': _text(record.category),
+            'status': _text(record.status),
+            'delivery_date_from': _date(record.delivery_date_from),
+            'line_count': int(record.line_count),
+            'net_value': _number(record.net_value),
+            'shipment_count': total['shipment_count'],
+            'delivered_shipments': total['delivered_shipments'],
+            'in_transit_shipments': total['in_transit_shipments'],
+            'next_eta': total['next_eta'],
+            'last_delivery_date': total['last_delivery_date'],
+            'shipment_status': total['shipment_status'],
+        })
+    return rows
+
+
+class DashboardRollups:
+    """Rebuilds the rollup_* tables from purchase_orders, shipments and delivery_dates"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 mirror=None, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            session: HTTP session for Supabase (a sync's instrumented session)
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            mirror: LocalMirror to read source tables from when it has them
+            metrics: RunMetrics to time the rollup phases into
+        """
+        self.metrics = metrics or RunMetrics('dashboard_rollups')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+        self.mirror = mirror
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def load(self, table: str) -> List[Dict]:
+        return read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers, table)
+
+    def compute(self) -> Dict[str, List[Dict]]:
+        """Rollup rows by table (without refreshed_at)"""
+        with self.metrics.phase('rollup_load'):
+            po_rows = self.load('purchase_orders')
+            ship_rows = self.load('shipments')
+            delivery_rows = self.load('delivery_dates')
+
+        with self.metrics.phase('rollup_compute'):
+            po = _frame(po_rows,
+                        text=('purchase_order_id', 'po_description', 'status', 'delivery_status',
+                              'category', 'supplier'),
+                        numeric=('net_value',), dates=('delivery_date_from',))
+            po = po[po['purchase_order_id'].notna()]
+            po = po.assign(purchase_order_id=po['purchase_order_id'].map(str))
+            shipments = _frame(ship_rows, text=('po_number', 'status', 'category', 'supplier'),
+                               numeric=('num_pieces',), dates=('rts_date', 'eta', 'delivery_date'))
+            delivery = _frame(delivery_rows, text=('po_number', 'project_phase', 'supplier_name'),
+                              dates=('delivery_date',))
+            # Distinct-PO counts use the first PO a cell names
+            shipments['po_key'] = shipments['po_number'].map(lambda value: next(iter(split_po_numbers(value)), None))
+            delivery['po_key'] = delivery['po_number'].map(po_key)
+
+            # Shipment progress per PO, with the same PO number normalization as po_links.py
+            po_ids = set(zip(po['project_id'], po['purchase_order_id']))
+            links, _ = build_links(ship_rows, po_ids)
+            totals = shipment_totals(links, ship_rows)
+
+            frames = {'purchase_orders': po, 'shipments': shipments, 'delivery_dates': delivery}
+            return {
+                'rollup_group_counts': group_counts(frames),
+                'rollup_weekly_deliveries': weekly_deliveries(frames),
+                'rollup_po_status': po_status(po, totals),
+            }
+
+    def write(self, tables: Dict[str, List[Dict]]) -> Dict:
+        """
+        Upsert each rollup table, then delete rows this refresh did not touch
+
+        Readers never see an empty table mid-refresh.
+        """
+        refreshed_at = datetime.now(timezone.utc).isoformat()
+        result = {'success': True, 'rows': {}, 'error': None}
+
+        with self.metrics.phase('rollup_write'):
+            for table, rows in tables.items():
+                written = replace_rows(self.session, self.supabase_url, self.supabase_headers, table, rows,
+                                       ROLLUP_TABLES[table], refreshed_at)
+                if not written['success']:
+                    result.update(success=False, error=f"{table}: {written['error']}")
+                    continue
+                result['rows'][table] = len(rows)
+                self.metrics.count('rollup_rows', len(rows))
+        return result
+
+    def run(self) -> Dict:
+        """
+        Recompute and write every rollup table
+
+        Returns:
+            Dictionary with 'success', 'rows' (table -> rows written) and 'error'
+        """
+        print("\nRefreshing dashboard rollups...")
+        try:
+            result = self.write(self.compute())
+        except Exception as e:
+            print(f"   Error refreshing rollups: {e}")
+            return {'success': False, 'rows': {}, 'error': str(e)}
+
+        if result['success']:
+            print("   " + ", ".join(f"{table}: {count} rows" for table, count in result['rows'].items()))
+        else:
+            print(f"   Error refreshing rollups: {result['error']}")
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the dashboard rollup tables')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Read source tables from Supabase even if the local mirror has them')
+    args = parser.parse_args(argv)
+
+    try:
+        rollups = DashboardRollups(session=requests.Session(), mirror=None if args.no_mirror else LocalMirror())
+        result = rollups.run()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+Delivery Risk Scoring
+Joins every purchase order line with the shipments that carry it and the
+ready-by dates the site needs it for, and scores how likely it is to arrive
+late. The whole pass is column-wise pandas/NumPy, so a 100k-line PO log
+scores in well under a second; the result is written to one keyed table
+(supabase/delivery_risk_schema.sql):
+
+    delivery_risk_scores  one row per open PO line with slip, lateness and risk
+
+Per line:
+    expected_date           latest linked shipment arrival (delivery date once
+                            delivered, ETA before), else the PO delivery date;
+                            never earlier than today for an undelivered line
+    slip_days               expected_date - delivery_date_from
+    days_late_vs_ready_by   expected_date - earliest ReadyByDates date for the PO
+    supplier_late_rate      share of the supplier's lines with slip_days > 0
+    risk_score              0-100 blend of the above; risk_level high/medium/low
+
+Usage:
+    python delivery_risk.py
+    python delivery_risk.py bench --lines 1000 10000 100000 --repeat 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+
+from dashboard_rollups import _frame
+from local_mirror import LocalMirror, read_table
+from po_links import DELIVERED, build_links, po_key
+from supabase_rest import replace_rows
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+RISK_TABLE = 'delivery_risk_scores'
+RISK_CONFLICT = 'project_id,purchase_order_id,purchase_order_item,item_uuid'
+
+# Days late at which the ready-by and slip components reach their full weight
+SATURATION_DAYS = 30
+# An unshipped line due within this many days (or already past due) is at risk
+LOOKAHEAD_DAYS = 14
+
+# Score components, summing to 100
+WEIGHTS = {'ready_by': 50, 'slip': 25, 'supplier': 15, 'unshipped': 10}
+# risk_level by minimum score, highest first
+RISK_LEVELS = ((60, 'high'), (30, 'medium'), (0, 'low'))
+DELIVERED_LEVEL = 'delivered'
+
+# PO lines that need no scoring
+CANCELED_STATUSES = {'canceled', 'cancelled'}
+DELIVERED_STATUSES = {'delivered', 'finished'}
+
+
+def po_keys(values: pd.Series) -> np.ndarray:
+    """po_key for a whole column, normalizing each distinct value once"""
+    codes, uniques = pd.factorize(values)
+    keys = np.array([po_key(value) for value in uniques] + [None], dtype=object)
+    # factorize gives -1 for missing values, which picks the trailing None
+    return keys[codes]
+
+
+def shipment_arrivals(ship_rows: List[Dict], po_ids) -> pd.DataFrame:
+    """
+    Per-PO arrival of the shipments that name it
+
+    Args:
+        ship_rows: Shipment rows (shipment_number, po_number, status, eta, delivery_date)
+        po_ids: (project_id, purchase_order_id) of every PO line
+
+    Returns:
+        DataFrame indexed by (project_id, purchase_order_id) with
+        shipment_count, delivered_shipments and expected_arrival
+    """
+    links, _ = build_links(ship_rows, po_ids)
+    columns = ['shipment_count', 'delivered_shipments', 'expected_arrival']
+    if not links:
+        return pd.DataFrame(columns=columns,
+                            index=pd.MultiIndex.from_tuples([], names=['project_id', 'purchase_order_id']))
+
+    shipments = _frame(ship_rows, text=('shipment_number', 'status'), dates=('eta', 'delivery_date'))
+    shipments = shipments.drop_duplicates('shipment_number').assign(
+        shipment_number=shipments['shipment_number'].astype(str))
+    delivered = shipments['status'].astype('string').str.strip().str.lower().eq(DELIVERED).fillna(False)
+    shipments = pd.DataFrame({
+        'shipment_number': shipments['shipment_number'],
+        'delivered': delivered.to_numpy(dtype=bool),
+        # A delivered shipment arrived on its delivery date; one still moving on its ETA
+        'arrival': shipments['delivery_date'].where(delivered & shipments['delivery_date'].notna(),
+                                                    shipments['eta']),
+    })
+
+    linked = pd.DataFrame(links, columns=['project_id', 'purchase_order_id', 'shipment_number', 'matched'])
+    linked = linked[linked['matched']].merge(shipments, on='shipment_number', how='inner')
+    return linked.groupby(['project_id', 'purchase_order_id']).agg(
+        shipment_count=('shipment_number', 'size'),
+        delivered_shipments=('delivered', 'sum'),
+        expected_arrival=('arrival', 'max'),
+    )
+
+
+def ready_by_dates(delivery_rows: List[Dict]) -> pd.DataFrame:
+    """Earliest ReadyByDates delivery_date per (project_id, PO key)"""
+    delivery = _frame(delivery_rows, text=('po_number',), dates=('delivery_date',))
+    delivery = delivery.assign(po_key=po_keys(delivery['po_number']))
+    delivery = delivery[delivery['po_key'].notna() & delivery['delivery_date'].notna()]
+    return (delivery.groupby(['project_id', 'po_key'])['delivery_date'].min()
+            .rename('ready_by_date').to_frame())
+
+
+def _days(delta: pd.Series) -> pd.Series:
+    return delta.dt.days.astype('float64')
+
+
+def score_lines(po_rows: List[Dict], ship_rows: List[Dict], delivery_rows: List[Dict],
+                today: Optional[date] = None) -> pd.DataFrame:
+    """
+    Score every open PO line
+
+    Args:
+        po_rows: purchase_orders rows
+        ship_rows: shipments rows
+        delivery_rows: delivery_dates rows
+        today: Scoring date (default: today, UTC)
+
+    Returns:
+        One row per PO line that is not canceled, with the delivery_risk_scores columns
+    """
+    today = pd.Timestamp(today or datetime.now(timezone.utc).date())
+
+    po = _frame(po_rows, text=('purchase_order_id', 'purchase_order_item', 'item_uuid', 'supplier',
+                               'status', 'delivery_status'),
+                dates=('delivery_date_from',))
+    po = po[po['purchase_order_id'].notna()]
+    status = po['status'].astype('string').str.strip().str.lower()
+    delivery_status = po['delivery_status'].astype('string').str.strip().str.lower()
+    lines = pd.DataFrame({
+        'project_id': po['project_id'].to_numpy(),
+        'purchase_order_id': po['purchase_order_id'].astype(str).to_numpy(),
+        # Key columns can't be NULL in the upsert target
+        'purchase_order_item': po['purchase_order_item'].astype('string').fillna('').to_numpy(dtype=object),
+        'item_uuid': po['item_uuid'].astype('string').fillna('').to_numpy(dtype=object),
+        'supplier': po['supplier'].to_numpy(dtype=object),
+        'delivery_date_from': po['delivery_date_from'].to_numpy(),
+        'canceled': status.isin(CANCELED_STATUSES).fillna(False).to_numpy(dtype=bool),
+        'line_delivered': (status.isin(DELIVERED_STATUSES) | delivery_status.isin(DELIVERED_STATUSES))
+                          .fillna(False).to_numpy(dtype=bool),
+    })
+    lines = lines[~lines['canceled']].drop_duplicates(
+        ['project_id', 'purchase_order_id', 'purchase_order_item', 'item_uuid']).reset_index(drop=True)
+    lines['po_key'] = po_keys(lines['purchase_order_id'])
+
+    # Shipments and ready-by dates onto the lines
+    arrivals = shipment_arrivals(ship_rows, set(zip(lines['project_id'], lines['purchase_order_id'])))
+    lines = lines.join(arrivals, on=['project_id', 'purchase_order_id'])
+    lines = lines.join(ready_by_dates(delivery_rows), on=['project_id', 'po_key'])
+    lines['shipment_count'] = lines['shipment_count'].fillna(0).astype(int)
+    lines['delivered_shipments'] = lines['delivered_shipments'].fillna(0).astype(int)
+    lines['expected_arrival'] = pd.to_datetime(lines['expected_arrival'])
+    lines['ready_by_date'] = pd.to_datetime(lines['ready_by_date'])
+
+    shipped_all = (lines['shipment_count'] > 0) & (lines['delivered_shipments'] == lines['shipment_count'])
+    delivered = (lines['line_delivered'] | shipped_all).to_numpy()
+
+    # When it will (or did) arrive; an undelivered line can't arrive in the past
+    expected = lines['expected_arrival'].fillna(lines['delivery_date_from'])
+    expected = expected.mask(~delivered & (expected < today), today)
+    lines['expected_date'] = expected
+    lines['slip_days'] = _days(expected - lines['delivery_date_from'])
+    lines['days_late_vs_ready_by'] = _days(expected - lines['ready_by_date'])
+
+    # Supplier track record over its lines with a known slip
+    late = (lines['slip_days'] > 0).astype('float64').where(lines['slip_days'].notna())
+    supplier = lines['supplier'].fillna('')
+    lines['supplier_late_rate'] = late.groupby([lines['project_id'], supplier]).transform('mean').fillna(0.0)
+
+    unshipped_due = (~delivered & (lines['shipment_count'] == 0).to_numpy()
+                     & (lines['delivery_date_from'] <= today + pd.Timedelta(days=LOOKAHEAD_DAYS)).to_numpy())
+    score = (WEIGHTS['ready_by'] * np.clip(lines['days_late_vs_ready_by'].fillna(0) / SATURATION_DAYS, 0, 1)
+             + WEIGHTS['slip'] * np.clip(lines['slip_days'].fillna(0) / SATURATION_DAYS, 0, 1)
+             + WEIGHTS['supplier'] * lines['supplier_late_rate']
+             + WEIGHTS['unshipped'] * unshipped_due)
+    lines['risk_score'] = np.where(delivered, 0.0, score.round(1))
+    lines['risk_level'] = np.select(
+        [delivered] + [lines['risk_score'].to_numpy() >= floor for floor, _ in RISK_LEVELS],
+        [DELIVERED_LEVEL] + [level for _, level in RISK_LEVELS],
+        default=RISK_LEVELS[-1][1],
+    )
+    lines['scored_on'] = today
+    return lines.drop(columns=['canceled', 'line_delivered', 'po_key', 'expected_arrival'])
+
+
+def risk_rows(lines: pd.DataFrame) -> List[Dict]:
+    """score_lines output as delivery_risk_scores rows (ISO dates, NULLs as None)"""
+    out = lines.copy()
+    for column in ('delivery_date_from', 'expected_date', 'ready_by_date', 'scored_on'):
+        out[column] = out[column].dt.strftime('%Y-%m-%d')
+    for column in ('slip_days', 'days_late_vs_ready_by'):
+        out[column] = out[column].astype('Int64')
+    out['supplier_late_rate'] = out['supplier_late_rate'].round(3)
+    # Every row keeps every key so bulk_write sends one column set
+    return out.astype(object).where(out.notna(), None).to_dict('records')
+
+
+class DeliveryRiskScorer:
+    """Rebuilds delivery_risk_scores from purchase_orders, shipments and delivery_dates"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 mirror=None, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            session: HTTP session for Supabase (a sync's instrumented session)
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            mirror: LocalMirror to read source tables from when it has them
+            metrics: RunMetrics to time the scoring phases into
+        """
+        self.metrics = metrics or RunMetrics('delivery_risk')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+        self.mirror = mirror
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def load(self, table: str) -> List[Dict]:
+        return read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers, table)
+
+    def run(self) -> Dict:
+        """
+        Score every open PO line and replace delivery_risk_scores in one upsert
+
+        Returns:
+            Dictionary with 'success', 'rows', 'levels' (risk_level -> lines) and 'error'
+        """
+        print("\nScoring delivery risk...")
+        try:
+            with self.metrics.phase('risk_load'):
+                po_rows = self.load('purchase_orders')
+                ship_rows = self.load('shipments')
+                delivery_rows = self.load('delivery_dates')
+
+            with self.metrics.phase('risk_score'):
+                lines = score_lines(po_rows, ship_rows, delivery_rows)
+                rows = risk_rows(lines)
+            levels = {level: int(count) for level, count in lines['risk_level'].value_counts().items()}
+
+            with self.metrics.phase('risk_write'):
+                written = replace_rows(self.session, self.supabase_url, self.supabase_headers, RISK_TABLE, rows,
+                                       RISK_CONFLICT, datetime.now(timezone.utc).isoformat())
+            self.metrics.count('risk_rows', len(rows))
+        except Exception as e:
+            print(f"   Error scoring delivery risk: {e}")
+            return {'success': False, 'rows': 0, 'levels': {}, 'error': str(e)}
+
+        if not written['success']:
+            print(f"   Error writing {RISK_TABLE}: {written['error']}")
+            return {'success': False, 'rows': 0, 'levels': levels, 'error': written['error']}
+
+        print(f"   {len(rows)} PO lines scored: " + ", ".join(f"{level} {count}" for level, count in levels.items()))
+        return {'success': True, 'rows': len(rows), 'levels': levels, 'error': None}
+
+
+def synthesize(lines: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    """
+    Mirror-shaped purchase_orders/shipments/delivery_dates rows for benchmarks
+
+    About 8 lines per PO, one shipment per 3 POs and one ready-by date per 2 POs.
+    """
+    rng = random.Random(seed)
+    start = date(2025, 6, 1)
+    suppliers = [f'Supplier {i}' for i in range(max(lines // 500, 5))]
+    statuses = ['Sent', 'Follow-Up Document Created', 'Not Yet Acknowledged', 'Finished', 'Canceled']
+
+    po_rows, ship_rows, delivery_rows = [], [], []
+    po_count = max(lines // 8, 1)
+    for i in range(lines):
+        po_id = str(10000 + i % po_count)
+        po_rows.append({
+            'purchase_order_id': po_id,
+            'purchase_order_item': str(i // po_count + 1),
+            'item_uuid': str(i),
+            'supplier': suppliers[int(po_id) % len(suppliers)],
+            'status': rng.choice(statuses),
+            'delivery_status': rng.choice(['Not Delivered', 'Not Relevant', 'Delivered']),
+            'delivery_date_from': (start + timedelta(days=rng.randrange(365))).isoformat(),
+        })
+    for n in range(0, po_count, 3):
+        shipped = start + timedelta(days=rng.randrange(365))
+        delivered = rng.random() < 0.5
+        ship_rows.append({
+            'shipment_number': f'SHP-{n}',
+            'po_number': f'PO# {10000 + n}' if n % 2 else f'{10000 + n}.0',
+            'status': 'Delivered' if delivered else 'In Transit',
+            'eta': (shipped + timedelta(days=rng.randrange(5, 40))).isoformat(),
+            'delivery_date': (shipped + timedelta(days=rng.randrange(5, 45))).isoformat() if delivered else None,
+        })
+    for n in range(0, po_count, 2):
+        delivery_rows.append({
+            'po_number': str(10000 + n),
+            'delivery_date': (start + timedelta(days=rng.randrange(365))).isoformat(),
+        })
+    return {'purchase_orders': po_rows, 'shipments': ship_rows, 'delivery_dates': delivery_rows}
+
+
+def run_benchmark(lines: int, repeat: int = 3) -> Dict:
+    """Best-of-`repeat` seconds to score a synthetic PO log and build its upsert rows"""
+    data = synthesize(lines)
+    score_times, row_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scored = score_lines(data['purchase_orders'], data['shipments'], data['delivery_dates'],
+                             today=date(2025, 12, 1))
+        score_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        risk_rows(scored)
+        row_times.append(time.perf_counter() - start)
+
+    return {
+        'lines': lines,
+        'shipments': len(data['shipments']),
+        'ready_by': len(data['delivery_dates']),
+        'scored': len(scored),
+        'score_seconds': min(score_times),
+        'rows_seconds': min(row_times),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score PO lines for delivery risk')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Read source tables from Supabase even if the local mirror has them')
+    sub = parser.add_subparsers(dest='command')
+    bench = sub.add_parser('bench', help='Time scoring on synthetic PO logs')
+    bench.add_argument('--lines', type=int, nargs='*', default=[1000, 10000, 100000],
+                       help='PO line counts to run')
+    bench.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        print("=" * 80)
+        print(f"{'Lines':>8} {'Shipments':>10} {'Ready-by':>9} {'Scored':>8} {'Score (s)':>10} {'Rows (s)':>9}")
+        print("-" * 80)
+        for count in args.lines:
+            result = run_benchmark(count, args.repeat)
+            print(f"{result['lines']:>8} {result['shipments']:>10} {result['ready_by']:>9} {result['scored']:>8} "
+                  f"{result['score_seconds']:>10.3f} {result['rows_seconds']:>9.3f}")
+        print("=" * 80)
+        sys.exit(0)
+
+    try:
+        scorer = DeliveryRiskScorer(session=requests.Session(), mirror=None if args.no_mirror else LocalMirror())
+        result = scorer.run()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == '__main__':
+    main()
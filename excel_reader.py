@@ -0,0 +1,334 @@
+"""
+Excel Reader
+One entry point for the workbook reads in the syncs, with interchangeable
+parse backends:
+
+    calamine   pandas' calamine engine (Rust); used when python-calamine is installed
+    openpyxl   openpyxl read-only, values-only row streaming into pandas' TextParser;
+               the same frame pd.read_excel builds, without a cell object per value
+    pandas     plain pd.read_excel (default openpyxl engine), kept as the baseline
+
+On top of whichever backend parses, parsed sheets are kept as a snapshot in
+logs/excel_snapshots/ (EXCEL_SNAPSHOT_DIR), keyed by the workbook's sha256.
+Re-reading an unchanged workbook (a retried sync, a dry run, the bench)
+loads the pickled frame instead of parsing the XML again.
+
+EXCEL_READER picks a backend ('auto', 'calamine', 'openpyxl', 'pandas');
+EXCEL_SNAPSHOTS=0 turns snapshots off.
+
+Usage:
+    df = read_excel('PO & Shipment Log.xlsx', sheet_name='PO Parts Log')
+    python excel_reader.py backends
+    python excel_reader.py bench                         # our workbooks, every backend
+    python excel_reader.py bench archive/*.xlsx --repeat 5
+"""
+
+import argparse
+import glob
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import pandas as pd
+
+from checkpoint import file_sha256
+
+SNAPSHOT_DIR = os.getenv('EXCEL_SNAPSHOT_DIR', str(Path(__file__).with_name('logs') / 'excel_snapshots'))
+
+# Workbooks the bench reads when none are given
+BENCH_WORKBOOKS = ['PO & Shipment Log.xlsx', 'ReadyByDates.xlsx', 'archive/*.xlsx']
+
+SheetName = Union[str, int, List[Union[str, int]], None]
+
+
+def _calamine_available() -> bool:
+    return importlib.util.find_spec('python_calamine') is not None
+
+
+def read_with_pandas(path: str, sheet_name: SheetName = 0):
+    """pd.read_excel with its default engine"""
+    return pd.read_excel(path, sheet_name=sheet_name)
+
+
+def read_with_calamine(path: str, sheet_name: SheetName = 0):
+    """pd.read_excel on the calamine engine (python-calamine)"""
+    return pd.read_excel(path, sheet_name=sheet_name, engine='calamine')
+
+
+def _sheet_rows(worksheet) -> List[list]:
+    """
+    Cell values of a read-only worksheet, shaped like pandas' openpyxl reader
+
+    Blank cells become '' (read as NaN), integral floats become ints, error
+    cells become NaN, trailing blank cells and rows are dropped and rows are
+    padded to the widest one.
+    """
+    from openpyxl.cell.cell import ERROR_CODES
+
+    errors = frozenset(ERROR_CODES)
+    nan = float('nan')
+    worksheet.reset_dimensions()
+
+    data = []
+    last_row_with_data = -1
+    for row_number, values in enumerate(worksheet.iter_rows(values_only=True)):
+        row = []
+        for value in values:
+            if value is None:
+                value = ''
+            elif type(value) is float:
+                if value.is_integer():
+                    value = int(value)
+            elif type(value) is str and value in errors:
+                value = nan
+            row.append(value)
+        while row and row[-1] == '':
+            row.pop()
+        if row:
+            last_row_with_data = row_number
+        data.append(row)
+
+    data = data[:last_row_with_data + 1]
+    if data:
+        width = max(len(row) for row in data)
+        data = [row + [''] * (width - len(row)) if len(row) < width else row for row in data]
+    return data
+
+
+def read_with_openpyxl(path: str, sheet_name: SheetName = 0):
+    """
+    Stream sheets with openpyxl in read-only, values-only mode
+
+    Every requested sheet is read from one open workbook. Rows go through
+    pandas' TextParser with header=0, so the frames (column names, dtypes,
+    NaNs) are the ones pd.read_excel would return.
+
+    Args:
+        path: Workbook path
+        sheet_name: Sheet name or index, a list of them, or None for all sheets
+
+    Returns:
+        DataFrame for a single sheet, else {sheet: DataFrame} like pd.read_excel
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    workbook = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_name is None:
+            wanted = list(workbook.sheetnames)
+        elif isinstance(sheet_name, list):
+            wanted = sheet_name
+        else:
+            wanted = [sheet_name]
+
+        frames = {}
+        for name in wanted:
+            if isinstance(name, int):
+                if not 0 <= name < len(workbook.worksheets):
+                    raise ValueError(f"Worksheet index {name} is invalid, {len(workbook.worksheets)} worksheets found")
+                worksheet = workbook.worksheets[name]
+            elif name in workbook.sheetnames:
+                worksheet = workbook[name]
+            else:
+                raise ValueError(f"Worksheet named '{name}' not found")
+
+            rows = _sheet_rows(worksheet)
+            frames[name] = TextParser(rows, header=0).read() if rows else pd.DataFrame()
+    finally:
+        workbook.close()
+
+    if sheet_name is None or isinstance(sheet_name, list):
+        return frames
+    return frames[sheet_name]
+
+
+BACKENDS: Dict[str, Callable] = {
+    'calamine': read_with_calamine,
+    'openpyxl': read_with_openpyxl,
+    'pandas': read_with_pandas,
+}
+
+
+def available_backends() -> List[str]:
+    """Backends that can run in this environment, fastest first"""
+    return [name for name in BACKENDS if name != 'calamine' or _calamine_available()]
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """
+    Resolve a backend name ('auto' or None reads EXCEL_READER, default auto)
+
+    Auto picks calamine when installed, else openpyxl streaming. Asking for
+    calamine without python-calamine falls back to auto with a warning.
+    """
+    name = (name or os.getenv('EXCEL_READER') or 'auto').lower()
+    if name not in BACKENDS and name != 'auto':
+        raise ValueError(f"Unknown Excel reader '{name}'; choose from auto, {', '.join(BACKENDS)}")
+    if name == 'calamine' and not _calamine_available():
+        print("   Warning: python-calamine is not installed, using openpyxl streaming")
+        name = 'auto'
+    if name == 'auto':
+        return 'calamine' if _calamine_available() else 'openpyxl'
+    return name
+
+
+def _snapshot_path(path: str, sheet_name: SheetName, digest: str, directory: str) -> Path:
+    if sheet_name is None:
+        sheets = 'all'
+    elif isinstance(sheet_name, list):
+        sheets = '+'.join(str(name) for name in sheet_name)
+    else:
+        sheets = str(sheet_name)
+    stem = re.sub(r'[^\w.-]+', '_', f"{Path(path).stem}.{sheets}")
+    return Path(directory) / f"{stem}.{digest[:16]}.pkl"
+
+
+def read_excel(path: str, sheet_name: SheetName = 0, backend: Optional[str] = None,
+               snapshot: Optional[bool] = None, snapshot_dir: Optional[str] = None):
+    """
+    Read a workbook sheet (or sheets) through the selected backend
+
+    Args:
+        path: Workbook path
+        sheet_name: As in pd.read_excel: name, index, list, or None for all sheets
+        backend: 'auto', 'calamine', 'openpyxl' or 'pandas' (default EXCEL_READER)
+        snapshot: Use the parsed-sheet snapshot (default: on unless EXCEL_SNAPSHOTS=0)
+        snapshot_dir: Where snapshots live (default SNAPSHOT_DIR)
+
+    Returns:
+        DataFrame, or {sheet: DataFrame} for a list or None, like pd.read_excel
+    """
+    reader = BACKENDS[select_backend(backend)]
+    if snapshot is None:
+        snapshot = os.getenv('EXCEL_SNAPSHOTS', '1') != '0'
+    if not snapshot:
+        return reader(path, sheet_name)
+
+    target = _snapshot_path(path, sheet_name, file_sha256(path), snapshot_dir or SNAPSHOT_DIR)
+    if target.exists():
+        try:
+            return pd.read_pickle(target)
+        except Exception as e:
+            # Written by another pandas version or cut short; parse again
+            print(f"   Warning: ignoring unreadable Excel snapshot {target.name}: {e}")
+
+    frames = reader(path, sheet_name)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # One snapshot per workbook and sheet: drop the ones for older contents
+        prefix = target.name.rsplit('.', 2)[0]
+        for stale in target.parent.glob(f"{glob.escape(prefix)}.*.pkl"):
+            if stale != target:
+                stale.unlink()
+        tmp_path = target.with_name(target.name + '.tmp')
+        pd.to_pickle(frames, tmp_path)
+        os.replace(tmp_path, target)
+    except OSError as e:
+        print(f"   Warning: could not write Excel snapshot: {e}")
+    return frames
+
+
+def _same_frames(left, right) -> bool:
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(_same_frames(left[k], right[k]) for k in left)
+    try:
+        pd.testing.assert_frame_equal(left, right)
+        return True
+    except AssertionError:
+        return False
+
+
+def _measure(read: Callable[[], object], repeat: int):
+    """(best wall seconds over repeat runs, peak traced MB of one more run, result)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = read()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / (1024 * 1024), result
+
+
+def run_benchmark(workbooks: Optional[List[str]] = None, repeat: int = 3) -> List[Dict]:
+    """
+    Parse every sheet of each workbook with each available backend
+
+    Time is the best of `repeat` runs; memory is the peak of Python
+    allocations during one extra run (tracemalloc does not see calamine's
+    Rust-side buffers). 'snapshot' is a warm snapshot hit. 'same' says
+    whether the frames equal the pandas baseline.
+    """
+    paths = []
+    for pattern in workbooks or BENCH_WORKBOOKS:
+        paths.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    paths = [path for path in paths if os.path.exists(path)]
+
+    results = []
+    print("=" * 80)
+    print(f"Excel reader benchmark ({repeat} run(s) each, all sheets)")
+    print("=" * 80)
+    print(f"{'Workbook':<34} {'Backend':<10} {'Seconds':>9} {'Peak MB':>9} {'Speedup':>8} {'Same':>6}")
+    print("-" * 80)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        for path in paths:
+            base_seconds, base_mb, baseline = _measure(lambda: read_with_pandas(path, None), repeat)
+            timings = [('pandas', base_seconds, base_mb, True)]
+            for name in available_backends():
+                if name == 'pandas':
+                    continue
+                seconds, mb, frames = _measure(lambda: BACKENDS[name](path, None), repeat)
+                timings.append((name, seconds, mb, _same_frames(baseline, frames)))
+
+            read_excel(path, None, snapshot=True, snapshot_dir=snapshot_dir)
+            seconds, mb, frames = _measure(
+                lambda: read_excel(path, None, snapshot=True, snapshot_dir=snapshot_dir), repeat)
+            timings.append(('snapshot', seconds, mb, _same_frames(baseline, frames)))
+
+            label = Path(path).name
+            label = label if len(label) <= 33 else label[:30] + '...'
+            for name, seconds, mb, same in timings:
+                speedup = base_seconds / seconds if seconds else float('inf')
+                print(f"{label:<34} {name:<10} {seconds:>9.3f} {mb:>9.1f} {speedup:>7.1f}x {'yes' if same else 'no':>6}")
+                results.append({'workbook': path, 'backend': name, 'seconds': seconds,
+                                'peak_mb': mb, 'speedup': speedup, 'same': same})
+                label = ''
+    print("=" * 80)
+    print(f"Selected backend here: {select_backend()}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Excel reader backends')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('backends', help='List the backends available here and the one selected')
+    bench = sub.add_parser('bench', help='Compare backends on real workbooks')
+    bench.add_argument('workbooks', nargs='*', help=f"Workbooks or globs (default: {', '.join(BENCH_WORKBOOKS)})")
+    bench.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == 'backends':
+        selected = select_backend()
+        for name in BACKENDS:
+            state = 'available' if name in available_backends() else 'not installed'
+            print(f"{name:<10} {state}{'  (selected)' if name == selected else ''}")
+        return
+
+    if not run_benchmark(args.workbooks, args.repeat):
+        print("No workbooks found")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@ import uuid
 import math
 from datetime import datetime, date, timedelta
 
+from supabase_rest import insert_bisecting
+
 # =============================================================================
 # SUPABASE CONFIGURATION
 # =============================================================================
@@ -191,7 +193,7 @@ def random_date(start: date, end: date) -> str:
 
 
 def batch_insert(table: str, records: list) -> bool:
-    """Insert records in batches. Returns True on success."""
+    """Insert records in batches, bisecting out rows Supabase rejects. Returns True on success."""
     url = f"{SUPABASE_URL}/rest/v1/{table}"
     total = len(records)
     inserted = 0
@@ -199,16 +201,17 @@ def batch_insert(table: str, records: list) -> bool:
     for i in range(0, total, BATCH_SIZE):
         batch = records[i : i + BATCH_SIZE]
         try:
-            response = requests.post(url, headers=HEADERS_INSERT, json=batch)
-            if response.status_code in [200, 201]:
-                inserted += len(batch)
-                print(f"   Batch {i // BATCH_SIZE + 1}: {inserted}/{total} records inserted")
-            else:
-                print(f"   ERROR batch {i // BATCH_SIZE + 1}: {response.status_code} - {response.text[:200]}")
-                return False
+            outcome = insert_bisecting(requests, url, HEADERS_INSERT, batch)
         except Exception as e:
             print(f"   ERROR batch {i // BATCH_SIZE + 1}: {e}")
             return False
+        inserted += outcome['inserted']
+        if not outcome['success']:
+            print(f"   ERROR batch {i // BATCH_SIZE + 1}: {outcome['error'][:200]}")
+            return False
+        for position, message in outcome['rejected']:
+            print(f"   REJECTED record {i + position + 1}: {message}")
+        print(f"   Batch {i // BATCH_SIZE + 1}: {inserted}/{total} records inserted")
 
     return True
 
@@ -0,0 +1,384 @@
+"""
+Geofence Registry & Spatial Index
+Loads site, fab shop, laydown and rail yard zones from Supabase and
+classifies tracker fixes against all of them using a uniform grid index.
+Zones are circles or polygons; classification is vectorized with NumPy and
+takes each fix's reported accuracy into account.
+"""
+
+import json
+from math import asin, cos, radians, sin, sqrt
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.32
+M_PER_DEGREE_LAT = KM_PER_DEGREE_LAT * 1000
+
+# Grid cell edge in degrees (~1.1 km north-south). Zones are registered in
+# every cell their bounding box touches, so a lookup only tests the handful
+# of zones sharing the point's cell.
+DEFAULT_CELL_DEGREES = 0.01
+
+# Zone bounding boxes are padded by this much so fixes just outside a fence
+# can still be flagged as uncertain. AT11 accuracy is rarely worse than this.
+DEFAULT_ACCURACY_MARGIN_M = 250
+
+# Grid keys pack (row, col) into one int64; columns are offset to stay positive
+_GRID_COL_OFFSET = 50_000
+_GRID_ROW_STRIDE = 100_000
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometers"""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS_KM
+
+
+def haversine_km_array(lats: np.ndarray, lons: np.ndarray, lat0: float, lon0: float) -> np.ndarray:
+    """Vectorized great-circle distance from many points to one point, in kilometers"""
+    lat1 = np.radians(lats)
+    lat2 = radians(lat0)
+    dlat = lat2 - lat1
+    dlon = radians(lon0) - np.radians(lons)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))) * EARTH_RADIUS_KM
+
+
+def points_in_polygon(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """
+    Even-odd ray casting test for many points against one polygon.
+    Loops over edges and vectorizes over points.
+
+    Args:
+        x, y: Point coordinates (same planar frame as vertices)
+        vertices: (V, 2) array of polygon vertices as (x, y)
+
+    Returns:
+        Boolean array, True where the point is inside
+    """
+    inside = np.zeros(x.shape, dtype=bool)
+    xj, yj = vertices[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for xi, yi in vertices:
+            crosses = (yi > y) != (yj > y)
+            x_intersect = (xj - xi) * (y - yi) / (yj - yi) + xi
+            inside ^= crosses & (x < x_intersect)
+            xj, yj = xi, yi
+    return inside
+
+
+def distance_to_edges(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """Shortest distance from each point to the polygon outline (planar units)"""
+    best = np.full(x.shape, np.inf)
+    xj, yj = vertices[-1]
+    for xi, yi in vertices:
+        dx = xi - xj
+        dy = yi - yj
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            t = 0.0
+        else:
+            t = np.clip(((x - xj) * dx + (y - yj) * dy) / length_sq, 0.0, 1.0)
+        best = np.minimum(best, np.hypot(x - (xj + t * dx), y - (yj + t * dy)))
+        xj, yj = xi, yi
+    return best
+
+
+def _parse_polygon(value) -> Optional[List[Tuple[float, float]]]:
+    """Accept a polygon as a JSON string, [[lat, lon], ...] or GeoJSON Polygon"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if isinstance(value, dict):
+        # GeoJSON stores the outer ring as [lon, lat]
+        return [(lat, lon) for lon, lat in value['coordinates'][0]]
+    return [(float(lat), float(lon)) for lat, lon in value]
+
+
+class Geofence:
+    """A zone defined by a circle (center + radius) or a polygon outline"""
+
+    def __init__(self, zone_id: str, name: str, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                 radius_km: Optional[float] = None, kind: str = 'site', site_name: Optional[str] = None,
+                 polygon: Optional[Sequence[Tuple[float, float]]] = None):
+        self.id = zone_id
+        self.name = name
+        self.kind = kind
+        self.site_name = site_name
+        self.radius_km = float(radius_km) if radius_km is not None else None
+        self.polygon = np.asarray(polygon, dtype=float) if polygon else None
+
+        if self.polygon is None and self.radius_km is None:
+            raise ValueError(f"Geofence {zone_id} needs either a radius or a polygon")
+
+        if latitude is None or longitude is None:
+            latitude, longitude = self.polygon.mean(axis=0)
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+
+        # Local planar frame (meters) around the zone center
+        self._m_per_degree_lon = M_PER_DEGREE_LAT * max(cos(radians(self.latitude)), 1e-6)
+        if self.polygon is not None:
+            x, y = self._to_local(self.polygon[:, 0], self.polygon[:, 1])
+            self._vertices = np.column_stack([x, y])
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'Geofence':
+        """Build a zone from a geofences table row"""
+        return cls(
+            zone_id=row['id'],
+            name=row.get('name') or row['id'],
+            latitude=row.get('center_latitude'),
+            longitude=row.get('center_longitude'),
+            radius_km=row.get('radius_km'),
+            kind=row.get('kind') or 'site',
+            site_name=row.get('site_name'),
+            polygon=_parse_polygon(row.get('polygon'))
+        )
+
+    def _to_local(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        x = (np.asarray(lons, dtype=float) - self.longitude) * self._m_per_degree_lon
+        y = (np.asarray(lats, dtype=float) - self.latitude) * M_PER_DEGREE_LAT
+        return x, y
+
+    def bounds(self, margin_km: float = 0) -> Tuple[float, float, float, float]:
+        """Bounding box as (min_lat, min_lon, max_lat, max_lon), padded by margin_km"""
+        dlat = margin_km / KM_PER_DEGREE_LAT
+        dlon = margin_km * 1000 / self._m_per_degree_lon
+        if self.polygon is not None:
+            min_lat, min_lon = self.polygon.min(axis=0)
+            max_lat, max_lon = self.polygon.max(axis=0)
+            return min_lat - dlat, min_lon - dlon, max_lat + dlat, max_lon + dlon
+
+        dlat += self.radius_km / KM_PER_DEGREE_LAT
+        dlon += self.radius_km * 1000 / self._m_per_degree_lon
+        return self.latitude - dlat, self.longitude - dlon, self.latitude + dlat, self.longitude + dlon
+
+    def signed_distance_m(self, lats, lons) -> np.ndarray:
+        """
+        Distance from each point to the fence line in meters: negative
+        inside the zone, positive outside
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        if self.polygon is None:
+            return (haversine_km_array(lats, lons, self.latitude, self.longitude) - self.radius_km) * 1000
+
+        x, y = self._to_local(lats, lons)
+        distance = distance_to_edges(x, y, self._vertices)
+        return np.where(points_in_polygon(x, y, self._vertices), -distance, distance)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Check if a coordinate falls inside the zone"""
+        return bool(self.signed_distance_m([lat], [lon])[0] <= 0)
+
+    def __repr__(self):
+        shape = f"polygon[{len(self.polygon)}]" if self.polygon is not None else f"radius_km={self.radius_km}"
+        return f"Geofence({self.id!r}, {self.kind!r}, {shape})"
+
+
+class GeofenceIndex:
+    """
+    Uniform grid over zone bounding boxes.
+
+    Points are bucketed by grid cell with one sort; each zone then pulls
+    only the points in the cells it covers and tests them as a single
+    vectorized batch. Work per point depends on the zones near it, not on
+    the total number of zones.
+    """
+
+    def __init__(self, zones: Iterable[Geofence], cell_degrees: float = DEFAULT_CELL_DEGREES,
+                 accuracy_margin_m: float = DEFAULT_ACCURACY_MARGIN_M):
+        self.zones = sorted(zones, key=lambda zone: zone.id)
+        self.cell_degrees = cell_degrees
+        self.accuracy_margin_m = accuracy_margin_m
+        self._zone_cells: List[np.ndarray] = []
+
+        for zone in self.zones:
+            min_lat, min_lon, max_lat, max_lon = zone.bounds(margin_km=accuracy_margin_m / 1000)
+            rows = np.arange(int(min_lat // cell_degrees), int(max_lat // cell_degrees) + 1)
+            cols = np.arange(int(min_lon // cell_degrees), int(max_lon // cell_degrees) + 1)
+            grid_rows, grid_cols = np.meshgrid(rows, cols, indexing='ij')
+            self._zone_cells.append(self._keys(grid_rows.ravel(), grid_cols.ravel()))
+
+    @staticmethod
+    def _keys(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return rows.astype(np.int64) * _GRID_ROW_STRIDE + (cols.astype(np.int64) + _GRID_COL_OFFSET)
+
+    def zones_at(self, lat: float, lon: float) -> List[Geofence]:
+        """Zones containing a coordinate"""
+        zone_ids = set(self.classify_arrays([lat], [lon])['zone_ids'][0])
+        return [zone for zone in self.zones if zone.id in zone_ids]
+
+    def classify_arrays(self, lats, lons, accuracies_m=None) -> Dict[str, List[List[str]]]:
+        """
+        Classify arrays of fixes against every zone
+
+        Args:
+            lats, lons: Coordinates of each fix
+            accuracies_m: Reported accuracy radius per fix (accuracyMeters); None for exact points
+
+        Returns:
+            Dictionary with one sorted list of zone IDs per fix:
+              'zone_ids'           - zones whose fence contains the fix
+              'uncertain_zone_ids' - zones whose fence lies within the fix's
+                                     accuracy radius, so the true position
+                                     could be on either side
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        count = len(lats)
+        if accuracies_m is None:
+            accuracies = np.zeros(count)
+        else:
+            accuracies = np.nan_to_num(np.asarray(accuracies_m, dtype=float), nan=0.0)
+
+        inside_ids: List[List[str]] = [[] for _ in range(count)]
+        uncertain_ids: List[List[str]] = [[] for _ in range(count)]
+
+        for zone, candidates, signed in self.zone_distances(lats, lons):
+            for idx in candidates[signed <= 0]:
+                inside_ids[idx].append(zone.id)
+            for idx in candidates[np.abs(signed) < accuracies[candidates]]:
+                uncertain_ids[idx].append(zone.id)
+
+        return {'zone_ids': inside_ids, 'uncertain_zone_ids': uncertain_ids}
+
+    def zone_distances(self, lats, lons):
+        """
+        Signed fence distances for every zone/point pair that shares a grid cell
+
+        Yields:
+            (zone, candidate_indices, signed_distance_m) for each zone with
+            nearby points. Points not yielded for a zone are farther than
+            accuracy_margin_m outside it.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if len(lats) == 0 or not self.zones:
+            return
+
+        point_keys = self._keys(np.floor(lats / self.cell_degrees), np.floor(lons / self.cell_degrees))
+        order = np.argsort(point_keys, kind='stable')
+        sorted_keys = point_keys[order]
+
+        for zone, cells in zip(self.zones, self._zone_cells):
+            starts = np.searchsorted(sorted_keys, cells, side='left')
+            ends = np.searchsorted(sorted_keys, cells, side='right')
+            spans = [order[start:end] for start, end in zip(starts, ends) if end > start]
+            if not spans:
+                continue
+
+            candidates = np.concatenate(spans)
+            yield zone, candidates, zone.signed_distance_m(lats[candidates], lons[candidates])
+
+    def classify(self, points: Iterable[Tuple[float, float]]) -> List[List[str]]:
+        """
+        Classify a batch of (lat, lon) points
+
+        Returns:
+            One sorted list of zone IDs per input point
+        """
+        points = list(points)
+        if not points:
+            return []
+        lats, lons = zip(*points)
+        return self.classify_arrays(lats, lons)['zone_ids']
+
+
+class GeofenceRegistry:
+    """Active geofences, loaded from the geofences table"""
+
+    TABLE = 'geofences'
+
+    def __init__(self, zones: Iterable[Geofence], from_database: bool = False,
+                 cell_degrees: float = DEFAULT_CELL_DEGREES, has_uncertain_column: bool = False):
+        self.zones = list(zones)
+        self.from_database = from_database
+        # uncertain_zone_ids is added by geofence_polygon_schema.sql, together
+        # with geofences.polygon; rows only carry it once that has been applied
+        self.has_uncertain_column = has_uncertain_column
+        self.index = GeofenceIndex(self.zones, cell_degrees)
+        self.site_zone_ids = {zone.id for zone in self.zones if zone.kind == 'site'}
+
+    @classmethod
+    def load(cls, session, supabase_url: str, headers: Dict, fallback: Optional[Iterable[Geofence]] = None,
+             cell_degrees: float = DEFAULT_CELL_DEGREES) -> 'GeofenceRegistry':
+        """
+        Load active zones from Supabase
+
+        Args:
+            session: requests.Session (or compatible)
+            supabase_url: Supabase project URL
+            headers: Supabase headers
+            fallback: Zones to use when the table is missing or empty
+            cell_degrees: Grid cell size for the spatial index
+
+        Returns:
+            GeofenceRegistry; `from_database` is False when the fallback was used,
+            `has_uncertain_column` is True when the rows show the polygon
+            migration (and so the uncertain_zone_ids columns) is applied
+        """
+        try:
+            response = session.get(
+                f"{supabase_url}/rest/v1/{cls.TABLE}",
+                headers=headers,
+                params={'select': '*', 'is_active': 'eq.true'}
+            )
+            rows = response.json() if response.status_code == 200 else []
+        except Exception as e:
+            print(f"   Warning: could not load geofences: {e}")
+            rows = []
+
+        zones = []
+        for row in rows:
+            try:
+                zones.append(Geofence.from_row(row))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"   Warning: skipping geofence {row.get('id')}: {e}")
+
+        if zones:
+            return cls(zones, from_database=True, cell_degrees=cell_degrees,
+                       has_uncertain_column=all('polygon' in row for row in rows))
+
+        return cls(fallback or [], from_database=False, cell_degrees=cell_degrees)
+
+    def classify(self, points: Iterable[Tuple[float, float]]) -> List[List[str]]:
+        """Zone IDs for each (lat, lon) point"""
+        return self.index.classify(points)
+
+    def annotate(self, rows: List[Dict], lat_key: str, lon_key: str, accuracy_key: Optional[str] = None,
+                 on_site_key: Optional[str] = None) -> None:
+        """
+        Classify rows in one vectorized pass and set zone_ids (and
+        uncertain_zone_ids, when that column exists) on them in place. When
+        `on_site_key` is given and the registry has site zones, that flag is
+        set from site membership. Rows without coordinates are left untouched.
+        """
+        located = [row for row in rows if row.get(lat_key) is not None and row.get(lon_key) is not None]
+        if not located:
+            return
+
+        accuracies = None
+        if accuracy_key:
+            accuracies = [row.get(accuracy_key) or 0 for row in located]
+
+        result = self.index.classify_arrays(
+            [row[lat_key] for row in located],
+            [row[lon_key] for row in located],
+            accuracies
+        )
+
+        for row, zone_ids, uncertain in zip(located, result['zone_ids'], result['uncertain_zone_ids']):
+            row['zone_ids'] = zone_ids
+            if self.has_uncertain_column:
+                row['uncertain_zone_ids'] = uncertain
+            if on_site_key and self.site_zone_ids:
+                row[on_site_key] = not self.site_zone_ids.isdisjoint(zone_ids)
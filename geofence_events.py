@@ -0,0 +1,202 @@
+"""
+Geofence Entry/Exit Events
+Runs a per-tracker, per-zone state machine over incoming fixes and emits
+compact arrival/departure events for samsara_geofence_events, so "when did
+this package arrive on site" is a single indexed lookup instead of a scan
+over samsara_location_history.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from geofence import GeofenceRegistry
+from supabase_rest import fetch_rows
+
+EVENTS_TABLE = 'samsara_geofence_events'
+PRESENCE_VIEW = 'vw_samsara_zone_presence'
+
+ARRIVAL = 'arrival'
+DEPARTURE = 'departure'
+
+# Hysteresis band around the fence line. A tracker must be this far inside
+# to arrive and this far outside to depart, so GPS jitter along the fence
+# does not produce a stream of alternating events.
+DEFAULT_ENTER_BUFFER_M = 15.0
+DEFAULT_EXIT_BUFFER_M = 30.0
+# Each fix's reported accuracy widens the band by this multiple of
+# accuracy_meters: AT11 fixes scatter by 5-250 m, and a 200 m fix 50 m
+# outside the fence says nothing about which side the tracker is on
+DEFAULT_ACCURACY_FACTOR = 1.0
+# A single stray fix never changes state
+DEFAULT_MIN_CONSECUTIVE = 2
+
+
+def _parse_time(value: str) -> datetime:
+    """
+    ISO 8601 timestamp to an aware datetime. Samsara sends '...Z' and
+    PostgREST '...+00:00' with optional microseconds, so the strings
+    themselves do not sort in time order.
+    """
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class GeofenceEventDetector:
+    """Arrival/departure detection with hysteresis and debouncing"""
+
+    def __init__(self, registry: GeofenceRegistry, enter_buffer_m: float = DEFAULT_ENTER_BUFFER_M,
+                 exit_buffer_m: float = DEFAULT_EXIT_BUFFER_M, min_consecutive: int = DEFAULT_MIN_CONSECUTIVE,
+                 accuracy_factor: float = DEFAULT_ACCURACY_FACTOR):
+        """
+        Args:
+            registry: Geofences to detect events for
+            enter_buffer_m: Distance inside the fence required to arrive
+            exit_buffer_m: Distance outside the fence required to depart
+            min_consecutive: Fixes in a row that must agree before a state change
+            accuracy_factor: Both buffers grow by this times the fix's accuracy_meters
+        """
+        self.registry = registry
+        self.enter_buffer_m = enter_buffer_m
+        self.exit_buffer_m = exit_buffer_m
+        self.min_consecutive = max(1, min_consecutive)
+        self.accuracy_factor = accuracy_factor
+
+    @staticmethod
+    def load_state(session, supabase_url: str, headers: Dict) -> Dict[Tuple[str, str], Dict]:
+        """
+        Load the last event per tracker and zone
+
+        Returns:
+            {(tracker_id, zone_id): {'state': 'inside'|'outside', 'happened_at': iso}}
+        """
+        rows = fetch_rows(session, supabase_url, headers, PRESENCE_VIEW,
+                          select='tracker_id,zone_id,event_type,happened_at', order='tracker_id,zone_id')
+        return {
+            (row['tracker_id'], row['zone_id']): {
+                'state': 'inside' if row['event_type'] == ARRIVAL else 'outside',
+                'happened_at': row['happened_at']
+            }
+            for row in rows
+        }
+
+    def detect(self, fixes: List[Dict], prior_state: Dict[Tuple[str, str], Dict] = None) -> List[Dict]:
+        """
+        Emit events for a batch of fixes
+
+        Args:
+            fixes: Rows with tracker_id, happened_at, latitude, longitude and
+                optionally accuracy_meters, for any number of trackers
+            prior_state: Output of load_state; fixes at or before a pair's
+                last event are skipped so overlapping sync windows are safe.
+                A tracker with stored events for some zones is known to be
+                outside every zone it has none for, so only trackers with no
+                events at all can produce initial arrivals
+
+        Returns:
+            samsara_geofence_events rows, ordered by tracker and time
+        """
+        prior_state = prior_state or {}
+        fixes = sorted(
+            (fix for fix in fixes if fix.get('latitude') is not None and fix.get('longitude') is not None),
+            key=lambda fix: (fix['tracker_id'], _parse_time(fix['happened_at']))
+        )
+        if not fixes:
+            return []
+
+        lats = np.array([fix['latitude'] for fix in fixes], dtype=float)
+        lons = np.array([fix['longitude'] for fix in fixes], dtype=float)
+        tracker_ids = np.array([fix['tracker_id'] for fix in fixes])
+
+        # Trackers last known inside a zone must be followed even once they
+        # are too far away to be a spatial candidate, or departures are missed
+        inside_by_zone: Dict[str, set] = {}
+        for (tracker_id, zone_id), state in prior_state.items():
+            if state['state'] == 'inside':
+                inside_by_zone.setdefault(zone_id, set()).add(tracker_id)
+
+        distances_by_zone = {
+            zone.id: (candidates, signed)
+            for zone, candidates, signed in self.registry.index.zone_distances(lats, lons)
+        }
+
+        seen_trackers = {tracker_id for tracker_id, _ in prior_state}
+
+        events = []
+        for zone in self.registry.zones:
+            candidates, signed = distances_by_zone.get(zone.id, (np.array([], dtype=int), np.array([])))
+            distance = dict(zip(candidates.tolist(), signed.tolist()))
+
+            followed = inside_by_zone.get(zone.id)
+            if followed:
+                extra = np.flatnonzero(np.isin(tracker_ids, list(followed)))
+                indices = np.union1d(candidates, extra)
+            else:
+                indices = np.sort(candidates)
+
+            events.extend(self._run_zone(zone.id, fixes, indices, distance, prior_state, seen_trackers))
+
+        events.sort(key=lambda event: (event['tracker_id'], _parse_time(event['happened_at'])))
+        return events
+
+    def _run_zone(self, zone_id: str, fixes: List[Dict], indices: np.ndarray, distance: Dict[int, float],
+                  prior_state: Dict, seen_trackers: set) -> List[Dict]:
+        """State machine over one zone's relevant fixes (already in tracker/time order)"""
+        events = []
+        tracker_id = None
+        state = since = None
+        streak_start = None
+        streak = 0
+
+        for idx in indices.tolist():
+            fix = fixes[idx]
+            if fix['tracker_id'] != tracker_id:
+                tracker_id = fix['tracker_id']
+                prior = prior_state.get((tracker_id, zone_id))
+                if prior:
+                    state, since = prior['state'], _parse_time(prior['happened_at'])
+                else:
+                    # Never arrived here, but tracked since its other events
+                    state = 'outside' if tracker_id in seen_trackers else None
+                    since = None
+                streak_start, streak = None, 0
+
+            if since and _parse_time(fix['happened_at']) <= since:
+                continue
+
+            signed = distance.get(idx, float('inf'))
+            widen = self.accuracy_factor * float(fix.get('accuracy_meters') or 0)
+            if signed <= -(self.enter_buffer_m + widen):
+                target = 'inside'
+            elif signed >= self.exit_buffer_m + widen:
+                target = 'outside'
+            else:
+                # Inside the hysteresis band - no evidence either way
+                continue
+
+            if target == state:
+                streak_start, streak = None, 0
+                continue
+
+            if streak == 0:
+                streak_start = fix
+            streak += 1
+            if streak < self.min_consecutive:
+                continue
+
+            if target == 'inside' or state == 'inside':
+                events.append({
+                    'tracker_id': tracker_id,
+                    'zone_id': zone_id,
+                    'event_type': ARRIVAL if target == 'inside' else DEPARTURE,
+                    'happened_at': streak_start['happened_at'],
+                    'latitude': streak_start['latitude'],
+                    'longitude': streak_start['longitude'],
+                    'accuracy_meters': streak_start.get('accuracy_meters'),
+                    # First sighting already inside: the real arrival predates our data
+                    'is_initial': state is None
+                })
+            state = target
+            streak_start, streak = None, 0
+
+        return events
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Invenio Sync CLI
+One entry point for every sync job. Each subcommand imports its sync module
+(and pandas/numpy with it) only when it actually runs, so --help, a missing
+workbook and an unchanged workbook all return without paying for heavy imports.
+
+Usage:
+    python invenio_sync.py po                   # PO Parts Log sheet
+    python invenio_sync.py shipments            # Shipment Log sheet
+    python invenio_sync.py delivery-dates       # ReadyByDates.xlsx
+    python invenio_sync.py samsara --full-history
+    python invenio_sync.py demo
+    python invenio_sync.py all --skip samsara  # every sync as a dependency graph
+    python invenio_sync.py po --dry-run         # diff against the local mirror only
+    python invenio_sync.py bench-startup        # cold-start latency per subcommand
+
+Excel subcommands skip the run when the workbook is unchanged since the last
+successful sync (a --no-refresh run does not count); pass --force to sync
+anyway.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from checkpoint import file_sha256
+
+# Load environment variables
+load_dotenv()
+
+ROOT = Path(__file__).resolve().parent
+
+# Mirrors EXCEL_FILE in sync_po_shipment_data.py and ReadyByDatesSync.excel_file;
+# duplicated so the early-exit checks do not import those modules (and pandas)
+PO_SHIPMENT_WORKBOOK = os.getenv('PO_SHIPMENT_EXCEL_FILE', str(ROOT / 'PO & Shipment Log.xlsx'))
+DELIVERY_DATES_WORKBOOK = 'ReadyByDates.xlsx'
+
+# Fingerprints of the workbooks as of the last successful sync, per subcommand
+STATE_FILE = os.getenv('SYNC_STATE_FILE', str(ROOT / 'logs' / 'sync_state.json'))
+
+BENCH_REPEAT = 5
+
+
+def load_state() -> dict:
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict) -> None:
+    Path(STATE_FILE).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def workbook_fingerprint(path: str, previous: dict = None) -> dict:
+    """
+    Size, mtime and content hash of a workbook
+
+    The hash is reused from `previous` when size and mtime match, so the
+    common unchanged case costs one stat() call.
+    """
+    stat = os.stat(path)
+    fingerprint = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and all(previous.get(key) == fingerprint[key] for key in ('path', 'size', 'mtime_ns')):
+        fingerprint['sha256'] = previous.get('sha256')
+    else:
+        fingerprint['sha256'] = file_sha256(path)
+    return fingerprint
+
+
+def run_excel_sync(name: str, workbook: str, force: bool, run, record: bool = True) -> int:
+    """
+    Early-exit checks shared by the Excel subcommands
+
+    Args:
+        name: State key (the subcommand name)
+        workbook: Workbook path the sync reads
+        force: Sync even if the workbook is unchanged
+        run: Callable that imports and runs the sync; returns an exit code
+        record: Mark the workbook as synced when the run succeeds
+
+    Returns:
+        Process exit code
+    """
+    if not os.path.exists(workbook):
+        print(f"Error: Excel file not found at {workbook}")
+        return 1
+
+    state = load_state()
+    previous = state.get(name)
+    fingerprint = workbook_fingerprint(workbook, previous)
+    if not force and previous and previous.get('sha256') == fingerprint['sha256']:
+        print(f"{os.path.basename(workbook)} unchanged since last {name} sync "
+              f"({previous.get('synced_at', 'unknown')}) - skipping. Use --force to sync anyway.")
+        if previous.get('mtime_ns') != fingerprint['mtime_ns']:
+            # Touched but identical: remember the new mtime so next time is a stat() only
+            state[name] = {**previous, **fingerprint}
+            save_state(state)
+        return 0
+
+    code = run()
+    if code == 0 and record:
+        state = load_state()
+        state[name] = {**fingerprint, 'synced_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        save_state(state)
+    return code
+
+
+def call_main(main, argv) -> int:
+    """Run a script's main(argv) and turn its sys.exit into a return code"""
+    try:
+        main(argv)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def cmd_po_shipments(args, only: str) -> int:
+    def run():
+        from sync_po_shipment_data import main
+        argv = ['--only', only]
+        if args.no_refresh:
+            argv.append('--no-refresh')
+        if args.profile:
+            argv.append('--profile')
+        if args.dry_run:
+            argv.append('--dry-run')
+        if args.no_mirror:
+            argv.append('--no-mirror')
+        return call_main(main, argv)
+
+    if args.dry_run:
+        # A dry run always diffs and never marks the workbook as synced
+        return run()
+    # Without the refreshes the dashboards are still stale, so the next full
+    # run must not skip this workbook as already synced
+    return run_excel_sync(args.command, PO_SHIPMENT_WORKBOOK, args.force, run, record=not args.no_refresh)
+
+
+def cmd_delivery_dates(args) -> int:
+    def run():
+        from sync_delivery_dates import main
+        argv = ['--profile'] if args.profile else []
+        if args.dry_run:
+            argv.append('--dry-run')
+        if args.no_mirror:
+            argv.append('--no-mirror')
+        return call_main(main, argv)
+
+    if args.dry_run:
+        return run()
+    return run_excel_sync(args.command, DELIVERY_DATES_WORKBOOK, args.force, run)
+
+
+def cmd_samsara(args, extra) -> int:
+    from sync_samsara_data import main
+    return call_main(main, extra)
+
+
+def cmd_all(args, extra) -> int:
+    from sync_orchestrator import main
+    return call_main(main, extra)
+
+
+def cmd_demo(args) -> int:
+    from generate_demo_data import main
+    main()
+    return 0
+
+
+def cmd_bench_startup(args) -> int:
+    """
+    Time fresh interpreter start-ups: the top-level help, each subcommand's
+    help, the unchanged-workbook skip path, and the legacy scripts' --help
+    """
+    script = str(ROOT / 'invenio_sync.py')
+    cases = [
+        ('invenio_sync --help', [script, '--help']),
+        ('invenio_sync po --help', [script, 'po', '--help']),
+        ('invenio_sync delivery-dates --help', [script, 'delivery-dates', '--help']),
+        ('invenio_sync samsara --help', [script, 'samsara', '--help']),
+        ('sync_po_shipment_data.py --help', [str(ROOT / 'sync_po_shipment_data.py'), '--help']),
+        ('sync_delivery_dates.py --help', [str(ROOT / 'sync_delivery_dates.py'), '--help']),
+        ('sync_samsara_data.py --help', [str(ROOT / 'sync_samsara_data.py'), '--help']),
+    ]
+
+    # The unchanged path needs a state file that already matches the workbook
+    bench_state = str(ROOT / 'logs' / 'bench_sync_state.json')
+    env = {**os.environ, 'SYNC_STATE_FILE': bench_state}
+    if os.path.exists(PO_SHIPMENT_WORKBOOK):
+        Path(bench_state).parent.mkdir(parents=True, exist_ok=True)
+        with open(bench_state, 'w') as f:
+            json.dump({'po': {**workbook_fingerprint(PO_SHIPMENT_WORKBOOK), 'synced_at': 'benchmark'}}, f)
+        cases.insert(2, ('invenio_sync po (unchanged workbook)', [script, 'po']))
+
+    print("=" * 80)
+    print(f"STARTUP BENCHMARK ({args.repeat} cold starts each, {sys.executable})")
+    print("=" * 80)
+    print(f"{'Command':<42} {'min ms':>8} {'median ms':>10}")
+    print("-" * 80)
+
+    for label, command in cases:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, env=env, cwd=ROOT,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<42} {min(times):8.0f} {statistics.median(times):10.0f}")
+
+    if os.path.exists(bench_state):
+        os.remove(bench_state)
+    print("=" * 80)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='invenio-sync', description='Invenio Field MSR data syncs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('po', 'Sync the PO Parts Log sheet to purchase_orders'),
+                            ('shipments', 'Sync the Shipment Log sheet to shipments')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--force', action='store_true', help='Sync even if the workbook is unchanged')
+        sub.add_argument('--no-refresh', action='store_true',
+                         help='Skip refreshing the materialized views, dashboard metrics, rollups and risk scores')
+        sub.add_argument('--profile', action='store_true', help='Run under cProfile')
+        sub.add_argument('--dry-run', action='store_true', help='Diff the workbook against the local mirror only')
+        sub.add_argument('--no-mirror', action='store_true', help='Do not update the local SQLite mirror')
+
+    sub = subparsers.add_parser('delivery-dates', help='Sync ReadyByDates.xlsx to delivery_dates')
+    sub.add_argument('--force', action='store_true', help='Sync even if the workbook is unchanged')
+    sub.add_argument('--profile', action='store_true', help='Run under cProfile')
+    sub.add_argument('--dry-run', action='store_true', help='Diff the workbook against the local mirror only')
+    sub.add_argument('--no-mirror', action='store_true', help='Do not update the local SQLite mirror')
+
+    # Options are forwarded to sync_samsara_data.py (see its --help)
+    subparsers.add_parser('samsara', help='Sync Samsara trackers (options as sync_samsara_data.py)', add_help=False)
+
+    # Options are forwarded to sync_orchestrator.py (see its --help)
+    subparsers.add_parser('all', help='Run every sync concurrently in dependency order', add_help=False)
+
+    subparsers.add_parser('demo', help='Replace Supabase data with generated demo data')
+
+    sub = subparsers.add_parser('bench-startup', help='Measure cold-start latency per subcommand')
+    sub.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+    return parser
+
+
+def main(argv=None):
+    args, extra = build_parser().parse_known_args(argv)
+
+    if args.command == 'samsara':
+        sys.exit(cmd_samsara(args, extra))
+    if args.command == 'all':
+        sys.exit(cmd_all(args, extra))
+    if extra:
+        build_parser().error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command in ('po', 'shipments'):
+        code = cmd_po_shipments(args, args.command)
+    elif args.command == 'delivery-dates':
+        code = cmd_delivery_dates(args)
+    elif args.command == 'demo':
+        code = cmd_demo(args)
+    else:
+        code = cmd_bench_startup(args)
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,12 +18,24 @@
         'purchase_orders',
         'shipments',
         'dashboard_metrics',
+        'dashboard_metrics_history',
         'material_links',
         'material_status_history',
         'samsara_trackers',
         'samsara_location_history',
+        'samsara_location_hourly',
+        'samsara_location_daily',
         'delivery_dates',
         'project_schedule',
+        'rollup_group_counts',
+        'rollup_weekly_deliveries',
+        'rollup_po_status',
+        'po_shipment_links',
+        'po_shipment_totals',
+        'delivery_risk_scores',
+        'material_link_suggestions',
+        'schedule_relationships',
+        'schedule_cpm',
         'vw_active_samsara_trackers',
         'vw_samsara_tracker_stats',
     ]);
@@ -0,0 +1,484 @@
+"""
+Local Supabase Mirror
+SQLite copy of the synced Supabase tables. The sync scripts update it from
+their own writes, and `reconcile` periodically checks it against Supabase
+with per-row checksums. Diffs, dry runs and ad-hoc reports then read the
+local file in milliseconds instead of re-downloading tables over PostgREST.
+
+Usage:
+    python local_mirror.py status
+    python local_mirror.py reconcile                  # tables due for a check
+    python local_mirror.py reconcile --table shipments --force
+    python local_mirror.py sql "SELECT supplier, COUNT(*) FROM purchase_orders GROUP BY 1"
+    python sync_po_shipment_data.py --dry-run         # diff the workbook against the mirror
+"""
+
+import argparse
+import hashlib
+import json
+import numbers
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from supabase_rest import count_rows, fetch_rows
+
+# Load environment variables
+load_dotenv()
+
+MIRROR_DB = os.getenv('SUPABASE_MIRROR_DB', str(Path(__file__).with_name('logs') / 'supabase_mirror.sqlite3'))
+
+# A full checksum reconcile is due once this old, or sooner if row counts drift
+RECONCILE_INTERVAL = timedelta(hours=float(os.getenv('MIRROR_RECONCILE_HOURS', '24')))
+
+# Filled in by Postgres (defaults and triggers), so they never match the rows we sent
+SERVER_COLUMNS = ('id', 'created_at', 'updated_at', 'synced_at', 'project_id')
+
+# Mirrored tables: identity columns (duplicates get an occurrence suffix) and
+# columns left out of the row checksum
+MIRROR_TABLES = {
+    'purchase_orders': {'key': ('purchase_order_id', 'purchase_order_item', 'item_uuid'),
+                        'ignore': SERVER_COLUMNS},
+    'shipments': {'key': ('shipment_number',), 'ignore': SERVER_COLUMNS},
+    'delivery_dates': {'key': ('po_number', 'tag_number', 'package_description'),
+                       'ignore': SERVER_COLUMNS},
+    'samsara_trackers': {'key': ('id',), 'ignore': ('created_at', 'updated_at', 'synced_at', 'project_id')},
+    'project_schedule': {'key': ('activity_id',), 'ignore': SERVER_COLUMNS},
+}
+
+TIMESTAMP_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+NUMBER_PATTERN = re.compile(r'^-?(0|[1-9]\d*)(\.\d+)?$')
+
+DIFF_SAMPLE = 5
+
+
+def canonical_value(value):
+    """
+    Normalize a value so a row we sent and the same row read back from
+    PostgREST compare equal: numbers become strings (a float sent to a TEXT
+    column comes back as text, NUMERIC 12.50 as 12.5) and timestamps UTC ISO
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if value != value or value in (float('inf'), float('-inf')):
+            return None
+        return str(int(value)) if value.is_integer() else str(round(value, 6))
+    if isinstance(value, str) and TIMESTAMP_PATTERN.match(value):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc).isoformat()
+    return value
+
+
+def canonical_row(row: Dict, ignore: Iterable[str] = ()) -> Dict:
+    """Row without server-managed columns or NULLs (absent and NULL are the same to a diff)"""
+    ignore = set(ignore)
+    canonical = {}
+    for column, value in row.items():
+        if column in ignore:
+            continue
+        value = canonical_value(value)
+        if value is not None:
+            canonical[column] = value
+    return canonical
+
+
+def row_checksum(canonical: Dict) -> str:
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def sql_value(value):
+    """SQLite column value for a canonical value (numbers typed again for reporting)"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    if isinstance(value, str) and NUMBER_PATTERN.match(value):
+        return float(value) if '.' in value else int(value)
+    return value
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def read_table(mirror, session, supabase_url: str, headers: Dict, table: str) -> List[Dict]:
+    """Rows of a table from the mirror when it holds any (no download), else from Supabase"""
+    if mirror and mirror.status().get(table, {}).get('row_count'):
+        return list(mirror.rows(table).values())
+    return fetch_rows(session, supabase_url, headers, table)
+
+
+class LocalMirror:
+    """SQLite mirror of the tables in MIRROR_TABLES"""
+
+    def __init__(self, path: str = MIRROR_DB):
+        """
+        Args:
+            path: SQLite file; ':memory:' for a throwaway mirror
+        """
+        self.path = path
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection per instance; the orchestrator gives each thread its own mirror
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS _mirror_tables (
+                name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                checksum TEXT,
+                written_at TEXT,
+                reconciled_at TEXT,
+                last_reconcile TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # Keys and storage
+    # ------------------------------------------------------------------
+    @staticmethod
+    def spec(table: str) -> Dict:
+        if table not in MIRROR_TABLES:
+            raise ValueError(f"{table} is not mirrored (expected one of {', '.join(MIRROR_TABLES)})")
+        return MIRROR_TABLES[table]
+
+    def identities(self, table: str, rows: Iterable[Dict]):
+        """
+        Yield (key, row) pairs
+
+        Repeated identities get '#2', '#3', ... in row order, which matches
+        insertion order on the server (fetches are ordered by id).
+        """
+        spec = self.spec(table)
+        seen: Dict[str, int] = {}
+        for row in rows:
+            key = '|'.join('' if row.get(column) is None else str(canonical_value(row.get(column)))
+                           for column in spec['key'])
+            seen[key] = seen.get(key, 0) + 1
+            yield (key if seen[key] == 1 else f"{key}#{seen[key]}"), row
+
+    def keyed_rows(self, table: str, rows: Iterable[Dict]) -> Dict[str, Dict]:
+        """Canonical rows by identity key"""
+        ignore = self.spec(table)['ignore']
+        return {key: canonical_row(row, ignore) for key, row in self.identities(table, rows)}
+
+    def _ensure_table(self, table: str, columns: Iterable[str]) -> None:
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {quote(table)} (
+                _key TEXT PRIMARY KEY,
+                _checksum TEXT NOT NULL,
+                _row TEXT NOT NULL
+            )
+        ''')
+        existing = {info['name'] for info in self.conn.execute(f'PRAGMA table_info({quote(table)})')}
+        for column in sorted(set(columns) - existing):
+            self.conn.execute(f'ALTER TABLE {quote(table)} ADD COLUMN {quote(column)}')
+
+    def _store(self, table: str, keyed: Dict[str, Dict]) -> None:
+        """INSERT OR REPLACE canonical rows (caller commits)"""
+        columns = sorted({column for row in keyed.values() for column in row})
+        self._ensure_table(table, columns)
+        all_columns = ['_key', '_checksum', '_row'] + columns
+        placeholders = ', '.join('?' for _ in all_columns)
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {quote(table)} ({', '.join(quote(c) for c in all_columns)}) "
+            f"VALUES ({placeholders})",
+            [
+                [key, row_checksum(row), json.dumps(row, sort_keys=True, default=str)]
+                + [sql_value(row.get(column)) for column in columns]
+                for key, row in keyed.items()
+            ]
+        )
+
+    def _update_meta(self, table: str, **fields) -> None:
+        count, checksum = self.table_checksum(table)
+        self.conn.execute(
+            'INSERT INTO _mirror_tables (name, row_count, checksum) VALUES (?, ?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET row_count = excluded.row_count, checksum = excluded.checksum',
+            (table, count, checksum)
+        )
+        for field, value in fields.items():
+            self.conn.execute(f'UPDATE _mirror_tables SET {field} = ? WHERE name = ?', (value, table))
+
+    def checksums(self, table: str) -> Dict[str, str]:
+        """Row checksum by key, as stored in the mirror"""
+        self.spec(table)
+        if not self._has_table(table):
+            return {}
+        return {row['_key']: row['_checksum']
+                for row in self.conn.execute(f'SELECT _key, _checksum FROM {quote(table)}')}
+
+    def table_checksum(self, table: str) -> tuple:
+        """(row count, checksum over every key and row checksum)"""
+        digest = hashlib.sha1()
+        checksums = self.checksums(table)
+        for key in sorted(checksums):
+            digest.update(f"{key}\t{checksums[key]}\n".encode())
+        return len(checksums), digest.hexdigest()
+
+    def _has_table(self, table: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def rows(self, table: str, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """Canonical rows by key (all rows, or just `keys`)"""
+        self.spec(table)
+        if not self._has_table(table):
+            return {}
+        if keys is None:
+            cursor = self.conn.execute(f'SELECT _key, _row FROM {quote(table)}')
+            return {row['_key']: json.loads(row['_row']) for row in cursor}
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            cursor = self.conn.execute(
+                f"SELECT _key, _row FROM {quote(table)} WHERE _key IN ({', '.join('?' for _ in chunk)})", chunk
+            )
+            found.update({row['_key']: json.loads(row['_row']) for row in cursor})
+        return found
+
+    # ------------------------------------------------------------------
+    # Updates from sync writes
+    # ------------------------------------------------------------------
+    def replace_table(self, table: str, rows: List[Dict]) -> None:
+        """Mirror a full delete-and-insert sync"""
+        keyed = self.keyed_rows(table, rows)
+        with self.conn:
+            if self._has_table(table):
+                self.conn.execute(f'DELETE FROM {quote(table)}')
+            self._store(table, keyed)
+            self._update_meta(table, written_at=datetime.now(timezone.utc).isoformat())
+
+    def upsert_rows(self, table: str, rows: List[Dict]) -> None:
+        """Mirror a merge-duplicates upsert: sent columns overwrite, others are kept"""
+        ignore = self.spec(table)['ignore']
+        sent = list(self.identities(table, rows))
+        existing = self.rows(table, [key for key, _ in sent])
+        merged = {}
+        for key, row in sent:
+            merged[key] = {**existing.get(key, {}), **canonical_row(row, ignore)}
+            # A column sent as NULL clears the stored value
+            for column, value in row.items():
+                if value is None:
+                    merged[key].pop(column, None)
+        with self.conn:
+            self._store(table, merged)
+            self._update_meta(table, written_at=datetime.now(timezone.utc).isoformat())
+
+    def record(self, table: str, rows: List[Dict], replace: bool = True) -> bool:
+        """
+        Apply a successful sync write to the mirror
+
+        A mirror problem only prints a warning; it must never fail a sync.
+        """
+        try:
+            if replace:
+                self.replace_table(table, rows)
+            else:
+                self.upsert_rows(table, rows)
+            return True
+        except sqlite3.Error as e:
+            print(f"   Warning: could not update local mirror of {table}: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Diffs
+    # ------------------------------------------------------------------
+    def diff(self, table: str, rows: List[Dict]) -> Dict:
+        """
+        Compare rows a full sync would write with the mirror
+
+        Returns:
+            Dictionary with 'added', 'removed', 'changed', 'unchanged'
+            counts, 'changed_columns' (column -> rows changed) and a few
+            sample keys per kind
+        """
+        proposed = self.keyed_rows(table, rows)
+        current = self.checksums(table)
+
+        added = [key for key in proposed if key not in current]
+        removed = [key for key in current if key not in proposed]
+        changed = [key for key, row in proposed.items()
+                   if key in current and current[key] != row_checksum(row)]
+
+        changed_columns: Dict[str, int] = {}
+        for key, old in self.rows(table, changed).items():
+            new = proposed[key]
+            for column in set(old) | set(new):
+                if old.get(column) != new.get(column):
+                    changed_columns[column] = changed_columns.get(column, 0) + 1
+
+        return {
+            'table': table,
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed),
+            'unchanged': len(proposed) - len(added) - len(changed),
+            'changed_columns': dict(sorted(changed_columns.items(), key=lambda item: -item[1])),
+            'samples': {'added': added[:DIFF_SAMPLE], 'removed': removed[:DIFF_SAMPLE],
+                        'changed': changed[:DIFF_SAMPLE]}
+        }
+
+    def print_diff(self, table: str, rows: List[Dict]) -> Dict:
+        start = time.perf_counter()
+        diff = self.diff(table, rows)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        meta = self.status().get(table)
+        print(f"   Mirror diff for {table} ({elapsed_ms:.0f} ms): +{diff['added']} added, "
+              f"-{diff['removed']} removed, ~{diff['changed']} changed, {diff['unchanged']} unchanged")
+        if diff['changed_columns']:
+            columns = ', '.join(f"{column} ({count})" for column, count in list(diff['changed_columns'].items())[:8])
+            print(f"   Changed columns: {columns}")
+        for kind, keys in diff['samples'].items():
+            if keys:
+                print(f"   e.g. {kind}: {'; '.join(keys)}")
+        if not meta:
+            print(f"   Note: the mirror has no {table} rows yet; run 'python local_mirror.py reconcile' first")
+        return diff
+
+    # ------------------------------------------------------------------
+    # Reconciliation with Supabase
+    # ------------------------------------------------------------------
+    def status(self) -> Dict[str, Dict]:
+        return {row['name']: dict(row) for row in self.conn.execute('SELECT * FROM _mirror_tables ORDER BY name')}
+
+    def reconcile_due(self, table: str, remote_count: int) -> bool:
+        """Due when never reconciled, older than RECONCILE_INTERVAL, or the row counts differ"""
+        meta = self.status().get(table)
+        if not meta or not meta['reconciled_at'] or meta['row_count'] != remote_count:
+            return True
+        reconciled_at = datetime.fromisoformat(meta['reconciled_at'])
+        return datetime.now(timezone.utc) - reconciled_at >= RECONCILE_INTERVAL
+
+    def reconcile(self, table: str, session, supabase_url: str, headers: Dict, force: bool = False) -> Dict:
+        """
+        Check the mirror of one table against Supabase and repair it
+
+        One count request decides whether a full check is due; the full
+        check downloads the table, compares row checksums and replaces the
+        mirror with the server's rows if anything differs.
+
+        Returns:
+            Dictionary with 'success', 'table', 'checked' (False if not due),
+            'rows', 'missing' (on server, not in mirror), 'extra' (in mirror,
+            not on server), 'mismatched' and 'error'
+        """
+        result = {'success': False, 'table': table, 'checked': False, 'rows': 0,
+                  'missing': 0, 'extra': 0, 'mismatched': 0, 'error': None}
+        try:
+            remote_count = count_rows(session, supabase_url, headers, table)
+            result['rows'] = remote_count
+            if not force and not self.reconcile_due(table, remote_count):
+                result['success'] = True
+                return result
+
+            remote = self.keyed_rows(table, fetch_rows(session, supabase_url, headers, table, order='id'))
+            local = self.checksums(table)
+            result['checked'] = True
+            result['rows'] = len(remote)
+            result['missing'] = sum(1 for key in remote if key not in local)
+            result['extra'] = sum(1 for key in local if key not in remote)
+            result['mismatched'] = sum(1 for key, row in remote.items()
+                                       if key in local and local[key] != row_checksum(row))
+
+            summary = json.dumps({key: result[key] for key in ('rows', 'missing', 'extra', 'mismatched')})
+            with self.conn:
+                if result['missing'] or result['extra'] or result['mismatched'] or not self._has_table(table):
+                    if self._has_table(table):
+                        self.conn.execute(f'DELETE FROM {quote(table)}')
+                    self._store(table, remote)
+                self._update_meta(table, reconciled_at=datetime.now(timezone.utc).isoformat(),
+                                  last_reconcile=summary)
+            result['success'] = True
+        except (requests.RequestException, sqlite3.Error, ValueError) as e:
+            result['error'] = str(e)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local SQLite mirror of the synced Supabase tables')
+    parser.add_argument('--db', default=MIRROR_DB, help=f'Mirror file (default: {MIRROR_DB})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='Row counts, checksums and reconcile times')
+    sub = subparsers.add_parser('reconcile', help='Check the mirror against Supabase and repair it')
+    sub.add_argument('--table', action='append', choices=list(MIRROR_TABLES),
+                     help='Table to reconcile (repeatable; default: all)')
+    sub.add_argument('--force', action='store_true', help='Run the full checksum check even if not due')
+    sub = subparsers.add_parser('sql', help='Run a read-only query against the mirror')
+    sub.add_argument('query')
+    args = parser.parse_args(argv)
+
+    mirror = LocalMirror(args.db)
+
+    if args.command == 'status':
+        print("=" * 80)
+        print(f"LOCAL MIRROR: {args.db}")
+        print("=" * 80)
+        print(f"{'Table':<18} {'Rows':>7}  {'Checksum':<12} {'Last write':<20} {'Last reconcile':<20}")
+        print("-" * 80)
+        status = mirror.status()
+        for table in MIRROR_TABLES:
+            meta = status.get(table, {})
+            print(f"{table:<18} {meta.get('row_count', 0):>7}  {(meta.get('checksum') or '-')[:12]:<12} "
+                  f"{(meta.get('written_at') or '-')[:19]:<20} {(meta.get('reconciled_at') or '-')[:19]:<20}")
+        print("=" * 80)
+        sys.exit(0)
+
+    if args.command == 'sql':
+        start = time.perf_counter()
+        cursor = mirror.conn.execute(args.query)
+        columns = [column[0] for column in cursor.description or []]
+        rows = cursor.fetchall()
+        print('\t'.join(columns))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value) for value in row))
+        print(f"({len(rows)} rows, {(time.perf_counter() - start) * 1000:.1f} ms)")
+        sys.exit(0)
+
+    supabase_url = os.getenv('SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_ANON_KEY')
+    if not supabase_url or not supabase_key:
+        print("Error: SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env")
+        sys.exit(1)
+    headers = {'apikey': supabase_key, 'Authorization': f'Bearer {supabase_key}'}
+
+    session = requests.Session()
+    failed = False
+    for table in args.table or list(MIRROR_TABLES):
+        result = mirror.reconcile(table, session, supabase_url, headers, force=args.force)
+        if not result['success']:
+            failed = True
+            print(f"{table}: reconcile failed - {result['error']}")
+        elif not result['checked']:
+            print(f"{table}: {result['rows']} rows, counts match and not due for a checksum check")
+        elif result['missing'] or result['extra'] or result['mismatched']:
+            print(f"{table}: repaired - {result['missing']} missing, {result['extra']} extra, "
+                  f"{result['mismatched']} mismatched of {result['rows']} rows")
+        else:
+            print(f"{table}: {result['rows']} rows, checksums match")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
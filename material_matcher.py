@@ -0,0 +1,468 @@
+"""
+Material Matcher
+Suggests which installation audit items (dashboard_data/audit_data.json) each
+purchase order line supplies, so material-tracking.html links are picked from
+a short ranked list instead of searched by hand.
+
+Both sides are reduced to features: uppercase word tokens, whole codes such
+as drawing and part numbers ('P02.03-CV-120-DWG-01202', 'W10X49') and, for
+words the other side never uses, character 3-grams to catch misspellings.
+Audit items go into an inverted index (feature -> items) per discipline. A
+PO line is scored only against the items that share a feature with it, in
+the disciplines its category maps to, and features common to more than
+MAX_FEATURE_SHARE of a discipline are skipped, so the work grows with the
+matches rather than with PO lines x audit items.
+
+Ranked suggestions go to one keyed table (supabase/material_matcher_schema.sql):
+
+    material_link_suggestions  top MAX_SUGGESTIONS audit items per PO line
+
+Usage:
+    python material_matcher.py
+    python material_matcher.py bench --items 1000 10000 100000
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from local_mirror import LocalMirror, read_table
+from supabase_rest import DEFAULT_PROJECT_ID, fetch_rows, replace_rows
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+AUDIT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard_data', 'audit_data.json')
+
+SUGGESTIONS_TABLE = 'material_link_suggestions'
+SUGGESTIONS_CONFLICT = 'project_id,po_id,po_line_item,install_ref'
+
+# Text that describes each side
+PO_FIELDS = ('item_description', 'manufacturer_part_number', 'supplier_part_number')
+INSTALL_FIELDS = ('DESC_', 'DWG', 'TAG_NO', 'SZE', 'CAREA', 'SYSTEM', 'CIRCUIT', 'SPOOL_FR', 'VAR2')
+
+MAX_SUGGESTIONS = 5
+MIN_SCORE = 0.2
+# Features in more of a discipline's items than this carry no signal and are not looked up
+MAX_FEATURE_SHARE = 0.05
+# ... unless the discipline is so small that the share is under this many items
+MIN_FEATURE_CAP = 25
+# A misspelled token ('Transfomer') counts this much of a whole token match ...
+NGRAM_WEIGHT = 0.5
+# ... when at least this share of its 3-grams hit the same item
+MIN_NGRAM_SHARE = 0.6
+NGRAM_SIZE = 3
+
+# Tokens: codes keep their inner '.', '-' and '/' ('P02.03-CV-120-DWG-01202', '1/2')
+TOKEN_PATTERN = re.compile(r'[A-Z0-9]+(?:[./-][A-Z0-9]+)*')
+STOPWORDS = {'THE', 'AND', 'OF', 'FOR', 'WITH', 'TO', 'IN', 'ON', 'AT', 'BY', 'EA', 'DWG', 'DRAWING', 'NA'}
+
+# PO category/sub category keyword -> audit disciplines it can supply, checked in order
+DISCIPLINE_BLOCKS = (
+    ('instrument', ('Instrumentation',)),
+    ('electrical', ('Electrical', 'Instrumentation')),
+    ('piping', ('Mechanical',)),
+    ('mechanical', ('Mechanical',)),
+    ('major equipment', ('Mechanical', 'Electrical')),
+    ('embed', ('Civil', 'Steel')),
+    ('civil', ('Civil', 'Steel')),
+    ('steel', ('Steel',)),
+)
+# Lines in these categories buy services, not installed material
+NON_MATERIAL = ('labor', 'per diem', 'expense', 'rental', 't&e', 'freight')
+
+
+def tokens(*values) -> Set[str]:
+    """Normalized word and code tokens of the given text values; a code also yields its parts"""
+    found = set()
+    for value in values:
+        if value is None:
+            continue
+        for token in TOKEN_PATTERN.findall(str(value).upper()):
+            found.add(token)
+            if not token.isalnum():
+                found.update(part for part in re.split(r'[./-]', token) if part)
+    return {token for token in found if len(token) > 1 and token not in STOPWORDS and not token.isdigit()}
+
+
+def ngrams(token: str) -> List[str]:
+    """Character 3-grams of a word token ('#' marks them apart from tokens)"""
+    if len(token) <= NGRAM_SIZE or not token.isalpha():
+        return []
+    return ['#' + token[i:i + NGRAM_SIZE] for i in range(len(token) - NGRAM_SIZE + 1)]
+
+
+def po_disciplines(category, sub_category, disciplines: Iterable[str]) -> Tuple[str, ...]:
+    """Audit disciplines a PO line can supply; () for services, every discipline when unknown"""
+    text = f"{sub_category or ''} {category or ''}".lower()
+    if any(word in text for word in NON_MATERIAL):
+        return ()
+    for keyword, blocks in DISCIPLINE_BLOCKS:
+        if keyword in text:
+            return blocks
+    return tuple(disciplines)
+
+
+def load_install_items(path: str = AUDIT_DATA) -> List[Dict]:
+    """
+    Audit items flattened the way material-tracking-supabase.js does
+
+    Returns:
+        Dicts with install_ref ('steel:12'), install_tag, install_discipline,
+        install_description, drawing and tokens
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'items' not in data:
+        groups = data.items()
+    else:
+        groups = [(None, data['items'] if isinstance(data, dict) else data)]
+
+    items = []
+    for discipline, rows in groups:
+        for position, raw in enumerate(rows):
+            row = {key.strip(): value for key, value in raw.items()}
+            name = discipline or row.get('discipline') or row.get('Discipline') or 'Unknown'
+            rec_no = row.get('REC_NO')
+            ref = int(rec_no) if isinstance(rec_no, (int, float)) and not math.isnan(rec_no) else f'row{position}'
+            sched_id = row.get('SCHED_ID')
+            items.append({
+                'install_ref': f"{name.lower()}:{ref}",
+                'install_tag': sched_id or row.get('tag'),
+                'install_discipline': name[:1].upper() + name[1:],
+                'install_description': row.get('DESC_') or row.get('TAG_NO') or row.get('description'),
+                'drawing': row.get('DWG'),
+                # '*C' / '*S' are placeholders, not identifiers
+                'tokens': tokens(*(row.get(field) for field in INSTALL_FIELDS),
+                                 sched_id if sched_id and not str(sched_id).startswith('*') else None),
+            })
+    return items
+
+
+class InstallIndex:
+    """Inverted index of audit item features, one block per discipline"""
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.postings: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        self.sizes: Dict[str, int] = defaultdict(int)
+        self.norms: List[float] = [0.0] * len(items)
+
+        for i, item in enumerate(items):
+            block = self.postings[item['install_discipline']]
+            self.sizes[item['install_discipline']] += 1
+            for token in item['tokens']:
+                block[token].append(i)
+                for gram in ngrams(token):
+                    block[gram].append(i)
+
+        # Norms over whole tokens only; 3-grams are a fallback, not part of an item's identity
+        for i, item in enumerate(items):
+            discipline = item['install_discipline']
+            self.norms[i] = math.sqrt(sum(self.idf(discipline, token) ** 2 for token in item['tokens'])) or 1.0
+
+    @property
+    def disciplines(self) -> List[str]:
+        return list(self.postings)
+
+    def idf(self, discipline: str, feature: str) -> float:
+        df = len(self.postings[discipline].get(feature, ()))
+        return math.log(1 + self.sizes[discipline] / df) if df else 0.0
+
+    def cap(self, discipline: str) -> int:
+        return max(MIN_FEATURE_CAP, int(self.sizes[discipline] * MAX_FEATURE_SHARE))
+
+    def match(self, po_tokens: Set[str], disciplines: Iterable[str], limit: int = MAX_SUGGESTIONS,
+              min_score: float = MIN_SCORE) -> Tuple[List[Tuple[float, int]], int]:
+        """
+        Best audit items for one PO line
+
+        A token the block knows scores idf^2 on every item that has it. A token
+        it doesn't know is looked up by its 3-grams and scores on an item only
+        when at least MIN_NGRAM_SHARE of them hit it. Scores are normalized by
+        both sides' token weights, so unmatched words count against a pair.
+
+        Returns:
+            ([(score, item index)] best first, number of candidate items scored)
+        """
+        best: Dict[int, float] = {}
+        for discipline in disciplines:
+            if discipline not in self.postings:
+                continue
+            block = self.postings[discipline]
+            cap = self.cap(discipline)
+            unknown_weight = math.log(1 + self.sizes[discipline])
+            po_norm = 0.0
+            block_scores: Dict[int, float] = defaultdict(float)
+
+            for token in po_tokens:
+                posting = block.get(token)
+                if posting:
+                    weight = self.idf(discipline, token)
+                    po_norm += weight * weight
+                    if len(posting) <= cap:
+                        for i in posting:
+                            block_scores[i] += weight * weight
+                    continue
+
+                po_norm += unknown_weight * unknown_weight
+                grams = ngrams(token)
+                hits: Dict[int, int] = defaultdict(int)
+                for gram in grams:
+                    posting = block.get(gram, ())
+                    if len(posting) <= cap:
+                        for i in posting:
+                            hits[i] += 1
+                for i, count in hits.items():
+                    share = count / len(grams)
+                    if share >= MIN_NGRAM_SHARE:
+                        block_scores[i] += NGRAM_WEIGHT * share * unknown_weight * unknown_weight
+
+            po_norm = math.sqrt(po_norm) or 1.0
+            for i, score in block_scores.items():
+                best[i] = min(score / (po_norm * self.norms[i]), 1.0)
+
+        if not best:
+            return [], 0
+        ranked = heapq.nlargest(limit, ((score, i) for i, score in best.items()))
+        return [(score, i) for score, i in ranked if score >= min_score], len(best)
+
+
+def suggest(po_rows: List[Dict], install_items: List[Dict], linked: Optional[Set[Tuple[str, int]]] = None,
+            limit: int = MAX_SUGGESTIONS) -> Tuple[List[Dict], Dict]:
+    """
+    Ranked suggestions for every material PO line
+
+    Args:
+        po_rows: purchase_orders rows
+        install_items: load_install_items() output
+        linked: (po_id, po_line_item) pairs that already have a material_links row; skipped
+        limit: Suggestions per PO line
+
+    Returns:
+        (material_link_suggestions rows, stats)
+    """
+    index = InstallIndex(install_items)
+    linked = linked or set()
+    rows = []
+    stats = {'po_lines': 0, 'skipped': 0, 'matched': 0, 'candidates': 0,
+             'all_pairs': len(po_rows) * len(install_items)}
+
+    for po in po_rows:
+        po_id = po.get('purchase_order_id')
+        if po_id is None:
+            continue
+        po_id = str(po_id)
+        line_item = _line_item(po.get('purchase_order_item'))
+        stats['po_lines'] += 1
+        disciplines = po_disciplines(po.get('category'), po.get('sub_category'), index.disciplines)
+        if not disciplines or (po_id, line_item) in linked:
+            stats['skipped'] += 1
+            continue
+
+        po_tokens = tokens(*(po.get(field) for field in PO_FIELDS))
+        ranked, candidates = index.match(po_tokens, disciplines, limit)
+        stats['candidates'] += candidates
+        stats['matched'] += bool(ranked)
+        for rank, (score, i) in enumerate(ranked, start=1):
+            item = install_items[i]
+            rows.append({
+                'project_id': po.get('project_id') or DEFAULT_PROJECT_ID,
+                'po_id': po_id,
+                'po_line_item': line_item,
+                'install_ref': item['install_ref'],
+                'rank': rank,
+                'score': round(score, 3),
+                'install_tag': item['install_tag'],
+                'install_discipline': item['install_discipline'],
+                'install_description': item['install_description'],
+                'drawing': item['drawing'],
+                'matched_terms': sorted(po_tokens & item['tokens'])[:10],
+            })
+    return rows, stats
+
+
+def _line_item(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MaterialMatcher:
+    """Rebuilds material_link_suggestions from purchase_orders and the audit items"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 mirror=None, metrics: Optional[RunMetrics] = None, audit_path: str = AUDIT_DATA):
+        """
+        Args:
+            session: HTTP session for Supabase
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            mirror: LocalMirror to read purchase_orders from when it has them
+            metrics: RunMetrics to time the matching phases into
+            audit_path: Installation audit JSON
+        """
+        self.metrics = metrics or RunMetrics('material_matches')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+        self.mirror = mirror
+        self.audit_path = audit_path
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def run(self) -> Dict:
+        """
+        Match every unlinked material PO line and replace the suggestions table
+
+        Returns:
+            Dictionary with 'success', 'rows', 'stats' and 'error'
+        """
+        print("\nMatching PO lines to installation items...")
+        try:
+            with self.metrics.phase('match_load'):
+                po_rows = read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers,
+                                     'purchase_orders')
+                links = fetch_rows(self.session, self.supabase_url, self.supabase_headers, 'material_links',
+                                   select='po_id,po_line_item')
+                install_items = load_install_items(self.audit_path)
+
+            with self.metrics.phase('match_score'):
+                linked = {(str(link['po_id']), _line_item(link.get('po_line_item'))) for link in links}
+                rows, stats = suggest(po_rows, install_items, linked)
+
+            with self.metrics.phase('match_write'):
+                written = replace_rows(self.session, self.supabase_url, self.supabase_headers, SUGGESTIONS_TABLE,
+                                       rows, SUGGESTIONS_CONFLICT, datetime.now(timezone.utc).isoformat())
+            self.metrics.count('match_rows', len(rows))
+        except Exception as e:
+            print(f"   Error matching materials: {e}")
+            return {'success': False, 'rows': 0, 'stats': {}, 'error': str(e)}
+
+        if not written['success']:
+            print(f"   Error writing {SUGGESTIONS_TABLE}: {written['error']}")
+            return {'success': False, 'rows': 0, 'stats': stats, 'error': written['error']}
+
+        print(f"   {len(rows)} suggestions for {stats['matched']}/{stats['po_lines']} PO lines "
+              f"({stats['skipped']} services or already linked); scored {stats['candidates']} candidate pairs "
+              f"of {stats['all_pairs']}")
+        return {'success': True, 'rows': len(rows), 'stats': stats, 'error': None}
+
+
+def synthesize(count: int, seed: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """`count` PO lines and `count` audit items sharing a synthetic vocabulary"""
+    rng = random.Random(seed)
+    vocab = [''.join(rng.choice('ABCDEFGHIKLMNOPRSTUVW') for _ in range(rng.randint(4, 9)))
+             for _ in range(max(count // 10, 200))]
+    drawings = [f'P02.03-{rng.choice(["CV", "EL", "ME", "ST"])}-120-DWG-{n:05d}' for n in range(max(count // 20, 20))]
+    categories = ['Bulks - Electrical', 'Bulks - Piping', 'Bulks - Civil (Embeds)', 'Major Equipment', 'Labor']
+    disciplines = ['Civil', 'Electrical', 'Instrumentation', 'Mechanical', 'Steel']
+
+    po_rows, install_items = [], []
+    for i in range(count):
+        words = rng.sample(vocab, 4)
+        po_rows.append({
+            'purchase_order_id': str(10000 + i // 8),
+            'purchase_order_item': str(i % 8 + 1),
+            'item_description': ' '.join(words),
+            'supplier_part_number': rng.choice(drawings) if rng.random() < 0.2 else '#',
+            'manufacturer_part_number': '#',
+            'sub_category': rng.choice(categories),
+        })
+        description = ' '.join(rng.sample(vocab, 3))
+        install_items.append({
+            'install_ref': f'synthetic:{i}',
+            'install_tag': '*C',
+            'install_discipline': rng.choice(disciplines),
+            'install_description': description,
+            'drawing': rng.choice(drawings),
+            'tokens': tokens(description, rng.choice(drawings)),
+        })
+    return po_rows, install_items
+
+
+def run_benchmark(count: int, repeat: int = 1) -> Dict:
+    """
+    Best-of-`repeat` seconds to index `count` synthetic audit items, and to
+    match `count` PO lines against them (match_seconds includes the index
+    suggest() builds)
+    """
+    po_rows, install_items = synthesize(count)
+    index_times, match_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        InstallIndex(install_items)
+        index_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        rows, stats = suggest(po_rows, install_items)
+        match_times.append(time.perf_counter() - start)
+
+    return {
+        'items': count,
+        'suggestions': len(rows),
+        'candidates': stats['candidates'],
+        'all_pairs': stats['all_pairs'],
+        'index_seconds': min(index_times),
+        'match_seconds': min(match_times),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Suggest installation items for each PO line')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Read purchase_orders from Supabase even if the local mirror has them')
+    parser.add_argument('--audit', default=AUDIT_DATA, help='Installation audit JSON')
+    sub = parser.add_subparsers(dest='command')
+    bench = sub.add_parser('bench', help='Time indexing and matching on synthetic items')
+    bench.add_argument('--items', type=int, nargs='*', default=[1000, 10000, 100000],
+                       help='Items per side to run')
+    bench.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        print("=" * 80)
+        print(f"{'Items':>8} {'Suggestions':>12} {'Scored pairs':>13} {'All pairs':>15} "
+              f"{'Index (s)':>10} {'Match (s)':>10}")
+        print("-" * 80)
+        for count in args.items:
+            result = run_benchmark(count, args.repeat)
+            print(f"{result['items']:>8} {result['suggestions']:>12} {result['candidates']:>13} "
+                  f"{result['all_pairs']:>15} {result['index_seconds']:>10.3f} {result['match_seconds']:>10.3f}")
+        print("=" * 80)
+        sys.exit(0)
+
+    try:
+        matcher = MaterialMatcher(session=requests.Session(), mirror=None if args.no_mirror else LocalMirror(),
+                                  audit_path=args.audit)
+        result = matcher.run()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == '__main__':
+    main()
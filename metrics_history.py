@@ -0,0 +1,250 @@
+"""
+Dashboard Metrics History
+dashboard_metrics keeps one row (id = 1) that refresh_dashboard_metrics()
+overwrites. After each refresh this appends a snapshot of it to
+dashboard_metrics_history (supabase/metrics_history_schema.sql), keyed by the
+sync run that triggered it (dataset + started_at, as in sync_runs).
+
+Snapshots are delta-encoded: the JSON columns are flattened to metric paths
+('procurement.total_po_value', 'status_counts.po_status.Sent') and a row
+stores only the paths whose value changed since the previous snapshot, plus
+the paths that disappeared. Every KEYFRAME_EVERY-th row stores every path,
+so the state at any point is one keyframe plus a bounded run of deltas.
+
+A metric's series is then just the rows that mention its path. The
+metric_series() RPC downsamples those into at most N time buckets, so trend
+charts never touch purchase_orders or shipments.
+
+Usage:
+    python metrics_history.py record
+    python metrics_history.py series procurement.total_po_value --days 90 --points 60
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from supabase_rest import DEFAULT_PROJECT_ID
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+HISTORY_TABLE = 'dashboard_metrics_history'
+# dashboard_metrics columns that hold metrics
+METRIC_COLUMNS = ('procurement', 'installation', 'status_counts')
+# A full snapshot every this many rows bounds how far back a reader replays
+KEYFRAME_EVERY = 50
+DEFAULT_POINTS = 200
+
+
+def flatten(value, prefix: str = '') -> Dict:
+    """Nested JSON objects as {'a.b.c': leaf}; lists and scalars are leaves"""
+    if not isinstance(value, dict):
+        return {prefix: value} if prefix else {}
+    flat = {}
+    for key, child in value.items():
+        flat.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def diff(previous: Dict, current: Dict) -> Tuple[Dict, List[str]]:
+    """(paths whose value is new or changed -> value, paths that are gone)"""
+    changes = {path: value for path, value in current.items()
+               if path not in previous or previous[path] != value}
+    removed = sorted(path for path in previous if path not in current)
+    return changes, removed
+
+
+def replay(rows: List[Dict]) -> Dict:
+    """Metric state after applying history rows oldest first (starting from a keyframe)"""
+    state: Dict = {}
+    for row in rows:
+        if row.get('is_keyframe'):
+            state = dict(row.get('changes') or {})
+            continue
+        state.update(row.get('changes') or {})
+        for path in row.get('removed') or []:
+            state.pop(path, None)
+    return state
+
+
+class MetricsHistory:
+    """Appends dashboard_metrics snapshots and reads series back"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            session: HTTP session for Supabase (a sync's instrumented session)
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            metrics: RunMetrics to time the history phases into
+        """
+        self.metrics = metrics or RunMetrics('metrics_history')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _get(self, table: str, params: Dict) -> List[Dict]:
+        response = self.session.get(f"{self.supabase_url}/rest/v1/{table}", headers=self.supabase_headers,
+                                    params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def current(self) -> Tuple[str, Dict]:
+        """(project_id, flattened metrics) of the live dashboard_metrics row"""
+        rows = self._get('dashboard_metrics', {'select': '*', 'id': 'eq.1'})
+        if not rows:
+            raise RuntimeError("dashboard_metrics has no row; run refresh_dashboard_metrics first")
+        row = rows[0]
+        flat = {}
+        for column in METRIC_COLUMNS:
+            if row.get(column) is not None:
+                flat.update(flatten(row[column], column))
+        return row.get('project_id') or DEFAULT_PROJECT_ID, flat
+
+    def tail(self, project_id: str) -> List[Dict]:
+        """History rows from the latest keyframe on, oldest first"""
+        select = 'id,is_keyframe,changes,removed'
+        keyframes = self._get(HISTORY_TABLE, {'select': 'id', 'project_id': f'eq.{project_id}',
+                                              'is_keyframe': 'is.true', 'order': 'id.desc', 'limit': 1})
+        if not keyframes:
+            return []
+        return self._get(HISTORY_TABLE, {'select': select, 'project_id': f'eq.{project_id}',
+                                         'id': f"gte.{keyframes[0]['id']}", 'order': 'id.asc'})
+
+    def record(self, run: RunMetrics) -> Dict:
+        """
+        Append a snapshot of dashboard_metrics for a sync run
+
+        Like the sync_runs ledger, a failure here only prints a warning;
+        history must never fail a sync that otherwise succeeded.
+
+        Args:
+            run: RunMetrics of the sync that refreshed the metrics
+
+        Returns:
+            Dictionary with 'success', 'keyframe', 'changed' and 'error'
+        """
+        try:
+            with self.metrics.phase('metrics_history'):
+                project_id, current = self.current()
+                tail = self.tail(project_id)
+                keyframe = not tail or len(tail) >= KEYFRAME_EVERY
+                if keyframe:
+                    changes, removed = current, []
+                else:
+                    changes, removed = diff(replay(tail), current)
+
+                response = self.session.post(
+                    f"{self.supabase_url}/rest/v1/{HISTORY_TABLE}",
+                    headers={**self.supabase_headers,
+                             'Prefer': 'return=minimal,resolution=ignore-duplicates'},
+                    params={'on_conflict': 'project_id,dataset,run_started_at'},
+                    json={
+                        'project_id': project_id,
+                        'dataset': run.dataset,
+                        'run_started_at': run.started_at.isoformat(),
+                        'is_keyframe': keyframe,
+                        'changes': changes,
+                        'removed': removed,
+                        'changed_count': len(changes) + len(removed),
+                    }
+                )
+            if response.status_code not in [200, 201, 204]:
+                raise RuntimeError(response.text)
+        except Exception as e:
+            print(f"   Warning: could not record metrics history: {e}")
+            return {'success': False, 'keyframe': False, 'changed': 0, 'error': str(e)}
+
+        print(f"   Metrics history: {'keyframe' if keyframe else 'delta'} with "
+              f"{len(changes) + len(removed)} changed path(s)")
+        return {'success': True, 'keyframe': keyframe, 'changed': len(changes) + len(removed), 'error': None}
+
+    def series(self, path: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               points: int = DEFAULT_POINTS, project_id: str = DEFAULT_PROJECT_ID) -> List[Dict]:
+        """
+        Downsampled values of one metric path (metric_series RPC)
+
+        Args:
+            path: Flattened metric path, e.g. 'procurement.total_po_value'
+            start: Series start (default: first snapshot)
+            end: Series end (default: now)
+            points: Maximum number of buckets returned
+            project_id: Project whose history to read
+
+        Returns:
+            [{'bucket_start', 'value', 'min_value', 'max_value', 'samples'}] oldest
+            first; value is the last value in the bucket and holds until the next one
+        """
+        response = self.session.post(
+            f"{self.supabase_url}/rest/v1/rpc/metric_series",
+            headers=self.supabase_headers,
+            json={
+                'p_path': path,
+                'p_from': start.isoformat() if start else None,
+                'p_to': end.isoformat() if end else None,
+                'p_points': points,
+                'p_project_id': project_id,
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record and query dashboard_metrics history')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('record', help='Append a snapshot of the current dashboard_metrics row')
+    series = sub.add_parser('series', help='Print a downsampled series for one metric path')
+    series.add_argument('path', help="e.g. procurement.total_po_value or status_counts.po_status.Sent")
+    series.add_argument('--days', type=int, default=90)
+    series.add_argument('--points', type=int, default=DEFAULT_POINTS)
+    series.add_argument('--json', action='store_true', help='Print the raw JSON rows')
+    args = parser.parse_args(argv)
+
+    try:
+        history = MetricsHistory(session=requests.Session())
+        if args.command == 'record':
+            run = RunMetrics('manual')
+            result = history.record(run)
+            sys.exit(0 if result['success'] else 1)
+
+        rows = history.series(args.path, start=datetime.now(timezone.utc) - timedelta(days=args.days),
+                              points=args.points)
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print("=" * 80)
+    print(f"{args.path} - last {args.days} days")
+    print("=" * 80)
+    print(f"{'Bucket start':<26} {'Value':>16} {'Min':>14} {'Max':>14} {'Samples':>7}")
+    print("-" * 80)
+    for row in rows:
+        print(f"{row['bucket_start'][:25]:<26} {row['value']!s:>16} {row['min_value']!s:>14} "
+              f"{row['max_value']!s:>14} {row['samples']:>7}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+PO <-> Shipment Links
+Shipments carry a free-text po_number ('15461', 15461.0, 'PO# 15461-02',
+'15461 / 15462') that has to match purchase_orders.purchase_order_id. This
+normalizes it once, during the sync, and writes two keyed tables
+(supabase/po_links_schema.sql):
+
+    po_shipment_links   one row per (purchase order, shipment) pair
+    po_shipment_totals  one row per purchase order with its shipment aggregates
+
+so correlating POs and shipments is an indexed lookup instead of a join in
+the browser.
+
+Usage:
+    python po_links.py
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from local_mirror import LocalMirror, read_table
+from supabase_rest import DEFAULT_PROJECT_ID, replace_rows
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+LINKS_TABLE = 'po_shipment_links'
+TOTALS_TABLE = 'po_shipment_totals'
+
+# Separators between POs in one cell: '15461, 15462', '15461 / 15462', '15461 & 15462'
+PO_SEPARATORS = re.compile(r'\s*(?:[,;&|/+\n]|\band\b)\s*', re.IGNORECASE)
+# 'PO', 'P.O.', 'PO#', 'PO No.', 'PO-' in front of the number
+PO_PREFIX = re.compile(r'^P\.?O\.?(?![A-Z])\s*(?:#|NO\.?|NUMBER)?\s*[:#-]?\s*', re.IGNORECASE)
+# Leading digit run; '.0' from Excel floats and any '-02'/' (partial)' suffix are dropped
+PO_DIGITS = re.compile(r'^(\d+)(?:\.0+)?(?!\d)')
+
+# A shorter number after a separator is a line or revision suffix ('15461/10'), not a PO
+MIN_PO_DIGITS = 4
+
+DELIVERED = 'delivered'
+IN_TRANSIT = 'in transit'
+
+
+def po_key(value) -> Optional[str]:
+    """
+    Canonical form of one PO number
+
+    Numeric forms are coerced like ReadyByDatesSync does for po_number:
+    15461, 15461.0, '15461.0', 'PO# 15461', 'PO-15461', '15461-02' and
+    '15461 (partial)' all give '15461'. Text without a leading number comes
+    back trimmed and upper-cased; blanks and '-' give None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+
+    text = PO_PREFIX.sub('', str(value).strip())
+    match = PO_DIGITS.match(text)
+    if match:
+        return str(int(match.group(1)))
+    text = text.strip(' -#').upper()
+    return text or None
+
+
+def split_po_numbers(value) -> List[str]:
+    """Every PO key in a cell, in order and without repeats ('15461 / 15462' -> ['15461', '15462'])"""
+    if isinstance(value, (int, float)):
+        key = po_key(value)
+        return [key] if key else []
+
+    keys = []
+    for part in PO_SEPARATORS.split(str(value or '')):
+        key = po_key(part)
+        if not key:
+            continue
+        if keys and key.isdigit() and len(key) < MIN_PO_DIGITS:
+            continue
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def shipment_status(shipment_count: int, delivered: int, in_transit: int) -> str:
+    """One status for all of a PO's shipments"""
+    if shipment_count == 0:
+        return 'Not Shipped'
+    if delivered == shipment_count:
+        return 'Delivered'
+    if delivered > 0:
+        return 'Partially Delivered'
+    if in_transit > 0:
+        return 'In Transit'
+    return 'Pending'
+
+
+def build_links(shipments: Iterable[Dict], po_ids: Iterable[Tuple[str, str]]) -> Tuple[List[Dict], Dict]:
+    """
+    Link rows for every shipment that names a PO
+
+    Args:
+        shipments: Shipment rows (shipment_number, po_number, optional project_id)
+        po_ids: (project_id, purchase_order_id) of every PO line
+
+    Returns:
+        (link rows, stats). A key that matches no purchase order is still
+        linked under its normalized form with matched = False, unless it is
+        not a number (free text such as 'RPS Asset'), which is only counted.
+    """
+    lookup = {}
+    for project_id, po_id in po_ids:
+        key = po_key(po_id)
+        if key:
+            lookup.setdefault((project_id, key), str(po_id))
+
+    links = []
+    stats = {'shipments': 0, 'linked': 0, 'multi_po': 0, 'unmatched': 0, 'unparsed': 0}
+    for shipment in shipments:
+        number = shipment.get('shipment_number')
+        if not number:
+            continue
+        stats['shipments'] += 1
+        project_id = shipment.get('project_id') or DEFAULT_PROJECT_ID
+
+        keys = split_po_numbers(shipment.get('po_number'))
+        if len(keys) > 1:
+            stats['multi_po'] += 1
+        linked = False
+        for position, key in enumerate(keys):
+            po_id = lookup.get((project_id, key))
+            if po_id is None and not key[0].isdigit():
+                stats['unparsed'] += 1
+                continue
+            if po_id is None:
+                stats['unmatched'] += 1
+            links.append({
+                'project_id': project_id,
+                'purchase_order_id': po_id or key,
+                'shipment_number': str(number),
+                'position': position,
+                'po_number_raw': str(shipment.get('po_number')),
+                'matched': po_id is not None,
+            })
+            linked = True
+        stats['linked'] += linked
+    return links, stats
+
+
+def _pieces(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def shipment_totals(links: List[Dict], shipments: Iterable[Dict]) -> List[Dict]:
+    """Per-PO shipment aggregates from link rows and the shipments they point at"""
+    by_number = {str(s['shipment_number']): s for s in shipments if s.get('shipment_number')}
+    totals: Dict[Tuple[str, str], Dict] = {}
+
+    for link in links:
+        shipment = by_number[link['shipment_number']]
+        key = (link['project_id'], link['purchase_order_id'])
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = {
+                'project_id': link['project_id'],
+                'purchase_order_id': link['purchase_order_id'],
+                'matched': link['matched'],
+                'shipment_count': 0,
+                'delivered_shipments': 0,
+                'in_transit_shipments': 0,
+                'total_pieces': 0,
+                'first_rts_date': None,
+                'next_eta': None,
+                'last_delivery_date': None,
+                'shipment_numbers': [],
+            }
+
+        status = str(shipment.get('status') or '').strip().lower()
+        total['shipment_count'] += 1
+        total['delivered_shipments'] += status == DELIVERED
+        total['in_transit_shipments'] += status == IN_TRANSIT
+        total['total_pieces'] += _pieces(shipment.get('num_pieces'))
+        total['shipment_numbers'].append(link['shipment_number'])
+
+        # Dates are ISO strings, so string comparison orders them
+        rts, eta, delivered = shipment.get('rts_date'), shipment.get('eta'), shipment.get('delivery_date')
+        if rts and (total['first_rts_date'] is None or rts < total['first_rts_date']):
+            total['first_rts_date'] = rts
+        if eta and status != DELIVERED and (total['next_eta'] is None or eta < total['next_eta']):
+            total['next_eta'] = eta
+        if delivered and (total['last_delivery_date'] is None or delivered > total['last_delivery_date']):
+            total['last_delivery_date'] = delivered
+
+    for total in totals.values():
+        total['shipment_status'] = shipment_status(
+            total['shipment_count'], total['delivered_shipments'], total['in_transit_shipments']
+        )
+    return list(totals.values())
+
+
+class POLinkSync:
+    """Rebuilds po_shipment_links and po_shipment_totals"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 mirror=None, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            session: HTTP session for Supabase (a sync's instrumented session)
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            mirror: LocalMirror to read shipments and PO lines from when it has them
+            metrics: RunMetrics to time the link phases into
+        """
+        self.metrics = metrics or RunMetrics('po_links')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+        self.mirror = mirror
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def run(self) -> Dict:
+        """
+        Normalize every shipment's PO number and rewrite both link tables
+
+        Returns:
+            Dictionary with 'success', 'links', 'pos', 'stats' and 'error'
+        """
+        print("\nLinking shipments to purchase orders...")
+        try:
+            with self.metrics.phase('po_links_load'):
+                shipments = read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers,
+                                       'shipments')
+                po_lines = read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers,
+                                      'purchase_orders')
+
+            with self.metrics.phase('po_links_build'):
+                po_ids = {(row.get('project_id') or DEFAULT_PROJECT_ID, row['purchase_order_id'])
+                          for row in po_lines if row.get('purchase_order_id') is not None}
+                links, stats = build_links(shipments, po_ids)
+                totals = shipment_totals(links, shipments)
+
+            refreshed_at = datetime.now(timezone.utc).isoformat()
+            with self.metrics.phase('po_links_write'):
+                for table, rows, conflict in ((LINKS_TABLE, links, 'project_id,purchase_order_id,shipment_number'),
+                                              (TOTALS_TABLE, totals, 'project_id,purchase_order_id')):
+                    written = replace_rows(self.session, self.supabase_url, self.supabase_headers, table, rows,
+                                           conflict, refreshed_at)
+                    if not written['success']:
+                        print(f"   Error writing {table}: {written['error']}")
+                        return {'success': False, 'links': 0, 'pos': 0, 'stats': stats,
+                                'error': f"{table}: {written['error']}"}
+        except Exception as e:
+            print(f"   Error linking shipments: {e}")
+            return {'success': False, 'links': 0, 'pos': 0, 'stats': {}, 'error': str(e)}
+
+        print(f"   {len(links)} links for {stats['linked']}/{stats['shipments']} shipments across "
+              f"{len(totals)} POs ({stats['multi_po']} multi-PO cells, {stats['unmatched']} unmatched, "
+              f"{stats['unparsed']} not a PO number)")
+        return {'success': True, 'links': len(links), 'pos': len(totals), 'stats': stats, 'error': None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the PO <-> shipment link tables')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Read shipments and PO lines from Supabase even if the local mirror has them')
+    args = parser.parse_args(argv)
+
+    try:
+        result = POLinkSync(session=requests.Session(), mirror=None if args.no_mirror else LocalMirror()).run()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == '__main__':
+    main()
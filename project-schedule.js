@@ -28,7 +28,7 @@ async function loadScheduleData() {
 
         if (error) throw error;
 
-        scheduleData = data || [];
+        scheduleData = await applyComputedCriticalPath(data || []);
         filteredData = scheduleData;
 
         console.log(`Loaded ${scheduleData.length} schedule activities`);
@@ -49,6 +49,31 @@ async function loadScheduleData() {
     }
 }
 
+// Overlay the critical path schedule_cpm.py computed from the activity logic.
+// Activities it has not scored keep their stored is_critical flag.
+async function applyComputedCriticalPath(activities) {
+    const { data, error } = await projectSupabaseClient.from('schedule_cpm')
+        .select('activity_id,total_float,free_float,is_critical,is_driving');
+
+    if (error) {
+        console.warn('schedule_cpm unavailable, using stored critical flags:', error.message);
+        return activities;
+    }
+    if (!data || data.length === 0) return activities;
+
+    const cpmById = new Map(data.map(row => [row.activity_id, row]));
+    return activities.map(activity => {
+        const cpm = cpmById.get(activity.activity_id);
+        return cpm ? {
+            ...activity,
+            is_critical: cpm.is_critical,
+            is_driving: cpm.is_driving,
+            total_float: cpm.total_float,
+            free_float: cpm.free_float
+        } : activity;
+    });
+}
+
 // Update statistics cards
 function updateStatistics() {
     const today = new Date();
@@ -930,14 +955,21 @@ async function loadIntegrationInsights() {
     try {
         console.log('Loading integration insights...');
 
-        // Load POs, Shipments, and Installation data from Supabase
-        const [posResult, shipmentsResult] = await Promise.all([
-            projectSupabaseClient.from('purchase_orders').select('*'),
-            projectSupabaseClient.from('shipments').select('*')
-        ]);
+        // PO and shipment counts from the rollup table (dashboard_rollups.py)
+        const { data: counts, error: countsError } = await projectSupabaseClient.from('rollup_group_counts')
+            .select('dataset,dimension,value,row_count,po_count')
+            .in('dataset', ['purchase_orders', 'shipments'])
+            .in('dimension', ['total', 'status']);
+
+        if (countsError) throw countsError;
 
-        const poData = posResult.data || [];
-        const shipmentData = shipmentsResult.data || [];
+        const countOf = (dataset, dimension, value, field = 'row_count') =>
+            (counts || []).find(c => c.dataset === dataset && c.dimension === dimension && c.value === value)?.[field] || 0;
+        const activePOs = countOf('purchase_orders', 'total', 'all', 'po_count');
+        const shipmentCounts = {
+            total: countOf('shipments', 'total', 'all'),
+            delivered: countOf('shipments', 'status', 'Delivered')
+        };
 
         // Also try to load installation data from JSON (fallback)
         let installationData = [];
@@ -948,8 +980,8 @@ async function loadIntegrationInsights() {
             console.log('Installation data not available');
         }
 
-        renderProcurementIntegration(poData);
-        renderTransportationIntegration(shipmentData);
+        renderProcurementIntegration(activePOs);
+        renderTransportationIntegration(shipmentCounts);
         renderInstallationIntegration(installationData);
 
     } catch (error) {
@@ -958,7 +990,7 @@ async function loadIntegrationInsights() {
 }
 
 // Render procurement integration
-function renderProcurementIntegration(poData) {
+function renderProcurementIntegration(activePOs) {
     const container = document.getElementById('procurementIntegration');
 
     // Find procurement-related activities
@@ -974,7 +1006,7 @@ function renderProcurementIntegration(poData) {
             </div>
             <div class="d-flex justify-content-between">
                 <span class="text-muted small">Active POs:</span>
-                <strong>${poData.length}</strong>
+                <strong>${activePOs}</strong>
             </div>
         </div>
         <div class="progress mb-2" style="height: 20px;">
@@ -991,7 +1023,7 @@ function renderProcurementIntegration(poData) {
 }
 
 // Render transportation integration
-function renderTransportationIntegration(shipmentData) {
+function renderTransportationIntegration(shipmentCounts) {
     const container = document.getElementById('transportationIntegration');
 
     // Find transportation-related activities
@@ -1004,7 +1036,8 @@ function renderTransportationIntegration(shipmentData) {
         ))
     );
 
-    const deliveredShipments = shipmentData.filter(s => s.status === 'Delivered').length;
+    const totalShipments = shipmentCounts.total;
+    const deliveredShipments = shipmentCounts.delivered;
 
     const html = `
         <div class="mb-2">
@@ -1014,7 +1047,7 @@ function renderTransportationIntegration(shipmentData) {
             </div>
             <div class="d-flex justify-content-between">
                 <span class="text-muted small">Tracked Shipments:</span>
-                <strong>${shipmentData.length}</strong>
+                <strong>${totalShipments}</strong>
             </div>
             <div class="d-flex justify-content-between">
                 <span class="text-muted small">Delivered:</span>
@@ -1022,12 +1055,12 @@ function renderTransportationIntegration(shipmentData) {
             </div>
         </div>
         <div class="progress mb-2" style="height: 20px;">
-            <div class="progress-bar bg-primary" style="width: ${shipmentData.length > 0 ? Math.round((deliveredShipments / shipmentData.length) * 100) : 0}%">
-                ${shipmentData.length > 0 ? Math.round((deliveredShipments / shipmentData.length) * 100) : 0}%
+            <div class="progress-bar bg-primary" style="width: ${totalShipments > 0 ? Math.round((deliveredShipments / totalShipments) * 100) : 0}%">
+                ${totalShipments > 0 ? Math.round((deliveredShipments / totalShipments) * 100) : 0}%
             </div>
         </div>
         <small class="text-muted">
-            ${deliveredShipments} of ${shipmentData.length} shipments delivered
+            ${deliveredShipments} of ${totalShipments} shipments delivered
         </small>
     `;
 
@@ -0,0 +1,401 @@
+"""
+Pre-upload Row Validation
+Checks sync rows against the column definitions in the Supabase schema files
+before they are sent, so one bad value is quarantined instead of failing a
+whole PostgREST batch (and, for a delete-and-reinsert sync, leaving the
+table cleared).
+
+Column types, lengths, NOT NULL and UNIQUE come from the CREATE TABLE and
+ALTER TABLE ... ADD COLUMN statements in SCHEMA_FILES. Each column is
+checked in one pass over the whole column with pandas, not row by row:
+
+    DATE / TIMESTAMP(TZ)       parses as a date
+    INTEGER / SMALLINT / BIGINT  whole number within the type's range
+    NUMERIC(p, s) / REAL / ...   finite number that fits p digits with s decimals
+    BOOLEAN                    bool or a Postgres boolean literal
+    TEXT / VARCHAR(n)          at most n characters, no NUL bytes
+    NOT NULL                   not null
+    UNIQUE                     no duplicates within the upload (the last one wins)
+
+Rows that fail go to logs/quarantine/<table>.json (SYNC_QUARANTINE_DIR) with
+their Excel row numbers and the problems found; the rest are uploaded.
+
+Usage:
+    result = validate_rows('shipments', records, excel_rows)
+    records, excel_rows = result['valid'], result['excel_rows']
+    write_quarantine_report('shipments', result['quarantined'])
+"""
+
+import json
+import os
+import re
+import warnings
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_DIR = Path(__file__).with_name('supabase')
+# Files that define the tables the Excel syncs write
+SCHEMA_FILES = ('po_shipment_schema.sql', 'delivery_dates_schema.sql', 'inventory_schema.sql')
+
+QUARANTINE_DIR = os.getenv('SYNC_QUARANTINE_DIR', str(Path(__file__).with_name('logs') / 'quarantine'))
+
+# Longest first so 'TIMESTAMPTZ' is not read as 'TIMESTAMP', etc.
+TYPE_PATTERNS = [
+    (r'TIMESTAMP\s+WITH(OUT)?\s+TIME\s+ZONE|TIMESTAMPTZ|TIMESTAMP', 'timestamp'),
+    (r'DATE', 'date'),
+    (r'BIGSERIAL|BIGINT|INT8', 'bigint'),
+    (r'SERIAL|INTEGER|INT4|INT', 'integer'),
+    (r'SMALLINT|INT2', 'smallint'),
+    (r'(NUMERIC|DECIMAL)\s*\(\s*(?P<precision>\d+)\s*(,\s*(?P<scale>\d+)\s*)?\)', 'numeric'),
+    (r'NUMERIC|DECIMAL|DOUBLE\s+PRECISION|REAL|FLOAT8|FLOAT4', 'numeric'),
+    (r'BOOLEAN|BOOL', 'boolean'),
+    (r'(CHARACTER\s+VARYING|VARCHAR|CHARACTER|CHAR)\s*\(\s*(?P<length>\d+)\s*\)', 'text'),
+    (r'TEXT|CHARACTER\s+VARYING|VARCHAR', 'text'),
+]
+
+INTEGER_LIMITS = {
+    'smallint': 2 ** 15 - 1,
+    'integer': 2 ** 31 - 1,
+    'bigint': 2 ** 63 - 1,
+}
+
+BOOLEAN_LITERALS = {'t', 'true', 'y', 'yes', 'on', '1', 'f', 'false', 'n', 'no', 'off', '0'}
+
+# Postgres accepts zone abbreviations after a time; pandas does not
+TRAILING_ZONE = r'(?<=\d)\s+[A-Za-z]{2,5}$'
+
+CONSTRAINT_KEYWORDS = ('PRIMARY', 'UNIQUE', 'CONSTRAINT', 'CHECK', 'FOREIGN', 'EXCLUDE')
+
+
+def _split_top_level(body: str) -> List[str]:
+    """Split a CREATE TABLE body on commas outside parentheses"""
+    parts, depth, current = [], 0, []
+    for char in body:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+
+def parse_column(definition: str) -> Optional[Dict]:
+    """
+    One column definition ('num_pieces INTEGER', 'net_price NUMERIC(15, 2)')
+
+    Returns:
+        {'name', 'type', 'precision', 'scale', 'length', 'not_null', 'unique'},
+        or None for a table constraint. Types this module does not check
+        (UUID, JSONB, arrays, ...) get type None.
+    """
+    match = re.match(r'"?(\w+)"?\s+(.*)$', definition, re.S)
+    if not match or match.group(1).upper() in CONSTRAINT_KEYWORDS:
+        return None
+    name, rest = match.group(1), match.group(2).strip()
+    upper = rest.upper()
+
+    column = {'name': name, 'type': None, 'precision': None, 'scale': None, 'length': None,
+              'not_null': bool(re.search(r'\bNOT\s+NULL\b', upper)),
+              'unique': bool(re.search(r'\b(UNIQUE|PRIMARY\s+KEY)\b', upper))}
+    if re.match(r'\w+(\s*\(.*?\))?\s*\[\]', upper):
+        return column
+    for pattern, kind in TYPE_PATTERNS:
+        type_match = re.match(rf'(?:{pattern})(?!\w)', upper)
+        if type_match:
+            groups = type_match.groupdict()
+            column['type'] = kind
+            if groups.get('precision'):
+                column['precision'] = int(groups['precision'])
+                column['scale'] = int(groups.get('scale') or 0)
+            if groups.get('length'):
+                column['length'] = int(groups['length'])
+            break
+    return column
+
+
+def parse_schema_sql(sql: str) -> Dict[str, Dict]:
+    """
+    Tables defined in a schema file
+
+    Returns:
+        {table: {'columns': {name: column}, 'unique': [[column, ...], ...]}}
+        where 'unique' holds every UNIQUE / PRIMARY KEY column set
+    """
+    sql = re.sub(r'--[^\n]*', '', sql)
+    tables: Dict[str, Dict] = {}
+
+    for match in re.finditer(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:\w+\.)?(\w+)\s*\((.*?)\)\s*;',
+                             sql, re.S | re.I):
+        table = tables.setdefault(match.group(1), {'columns': {}, 'unique': []})
+        for definition in _split_top_level(match.group(2)):
+            column = parse_column(definition)
+            if column:
+                table['columns'][column['name']] = column
+                if column['unique']:
+                    table['unique'].append([column['name']])
+                continue
+            key = re.search(r'\b(?:UNIQUE|PRIMARY\s+KEY)\s*\(([^)]*)\)', definition, re.I)
+            if key:
+                table['unique'].append([name.strip().strip('"') for name in key.group(1).split(',')])
+
+    for match in re.finditer(r'ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:\w+\.)?(\w+)\s+'
+                             r'ADD\s+COLUMN\s+(?:IF\s+NOT\s+EXISTS\s+)?([^;]*);', sql, re.S | re.I):
+        table = tables.setdefault(match.group(1), {'columns': {}, 'unique': []})
+        column = parse_column(match.group(2).strip())
+        if column:
+            table['columns'].setdefault(column['name'], column)
+            if column['unique']:
+                table['unique'].append([column['name']])
+    return tables
+
+
+@lru_cache(maxsize=None)
+def load_schemas(files: Sequence[str] = SCHEMA_FILES) -> Dict[str, Dict]:
+    """Tables from the schema files (parsed once per process)"""
+    schemas: Dict[str, Dict] = {}
+    for name in files:
+        with open(SCHEMA_DIR / name, encoding='utf-8') as f:
+            for table, spec in parse_schema_sql(f.read()).items():
+                merged = schemas.setdefault(table, {'columns': {}, 'unique': []})
+                for column_name, column in spec['columns'].items():
+                    merged['columns'].setdefault(column_name, column)
+                merged['unique'].extend(key for key in spec['unique'] if key not in merged['unique'])
+    return schemas
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Parse date/time values, NaT where Postgres would reject them
+
+    ISO strings go through one fast pass, the rest through the format pandas
+    infers from the first of them, and only what is left element by element.
+    A trailing zone abbreviation ('10/11/2025 06:56:44 CST') is dropped, as
+    Postgres accepts those.
+    """
+    text = values.astype(str)
+    parsed = pd.to_datetime(text, errors='coerce', format='ISO8601', utc=True)
+    missing = parsed.isna()
+    if missing.any():
+        text = text[missing].str.strip().str.replace(TRAILING_ZONE, '', regex=True)
+        with warnings.catch_warnings():
+            # 'Could not infer format' is expected for the leftovers
+            warnings.simplefilter('ignore', UserWarning)
+            for options in ({}, {'format': 'mixed'}):
+                retry = parsed.isna()
+                if not retry.any():
+                    break
+                parsed[retry] = pd.to_datetime(text[retry[missing]], errors='coerce', utc=True, **options)
+    return parsed
+
+
+def column_problems(values: pd.Series, column: Dict) -> pd.Series:
+    """
+    Problem text per row for one column ('' where the value is fine)
+
+    Args:
+        values: Every value of the column, in upload order
+        column: Column spec from parse_column
+
+    Returns:
+        Series of strings aligned with values
+    """
+    problems = pd.Series('', index=values.index, dtype=object)
+    present = values.notna()
+    kind = column['type']
+
+    if column['not_null']:
+        problems[~present] = 'is null but the column is NOT NULL'
+
+    if not present.any() or kind is None:
+        return problems
+
+    given = values[present]
+    if kind in ('date', 'timestamp'):
+        bad = parse_dates(given).isna()
+        problems[bad[bad].index] = f"is not a valid {kind}"
+
+    elif kind in INTEGER_LIMITS:
+        numbers = pd.to_numeric(given, errors='coerce')
+        bad = numbers.isna() | (numbers % 1 != 0) | (numbers.abs() > INTEGER_LIMITS[kind])
+        problems[bad[bad].index] = f"is not a whole number in {kind} range"
+
+    elif kind == 'numeric':
+        numbers = pd.to_numeric(given, errors='coerce').astype(float)
+        bad = numbers.isna() | ~np.isfinite(numbers)
+        if column['precision']:
+            limit = 10.0 ** (column['precision'] - column['scale'])
+            bad |= numbers.abs().round(column['scale']) >= limit
+            problems[bad[bad].index] = (f"is not a number that fits "
+                                        f"NUMERIC({column['precision']}, {column['scale']})")
+        else:
+            problems[bad[bad].index] = "is not a finite number"
+
+    elif kind == 'boolean':
+        if not pd.api.types.is_bool_dtype(given):
+            is_bool = given.map(lambda value: isinstance(value, (bool, np.bool_)))
+            literal = given.astype(str).str.strip().str.lower().isin(BOOLEAN_LITERALS)
+            bad = ~(is_bool | literal)
+            problems[bad[bad].index] = "is not a boolean"
+
+    elif kind == 'text':
+        text = given.astype(str)
+        # One scan of the joined column; the per-value check only runs on a hit
+        if '\x00' in ''.join(text):
+            bad = text.str.contains('\x00', regex=False)
+            problems[bad[bad].index] = "contains a NUL byte"
+        if column['length']:
+            too_long = text.str.len() > column['length']
+            problems[too_long[too_long].index] = f"is longer than {column['length']} characters"
+
+    return problems
+
+
+def validate_rows(table: str, records: List[Dict], excel_rows: Optional[List[int]] = None,
+                  schemas: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Split sync rows into ones the table will accept and ones it would reject
+
+    Args:
+        table: Target table (must be defined in the schema files)
+        records: Rows about to be uploaded
+        excel_rows: Excel row number of each record (default: position + 2,
+            i.e. a header row then one record per row)
+        schemas: Parsed schemas (default load_schemas())
+
+    Returns:
+        Dictionary with 'valid' (records), 'excel_rows' (of the valid records),
+        'quarantined' ([{'excel_row', 'problems', 'record'}]) and
+        'unknown_columns' (record keys the table does not have)
+    """
+    spec = (schemas or load_schemas()).get(table)
+    if spec is None:
+        raise ValueError(f"No schema found for table '{table}'")
+    if excel_rows is None:
+        excel_rows = list(range(2, len(records) + 2))
+    if not records:
+        return {'valid': [], 'excel_rows': [], 'quarantined': [], 'unknown_columns': []}
+
+    frame = pd.DataFrame.from_records(records)
+    unknown = [name for name in frame.columns if name not in spec['columns']]
+
+    problems = {}
+    for name in frame.columns:
+        if name in spec['columns']:
+            found = column_problems(frame[name], spec['columns'][name])
+            if found.ne('').any():
+                problems[name] = found
+
+    for key in spec['unique']:
+        if not all(name in frame.columns for name in key):
+            continue
+        present = frame[key].notna().all(axis=1)
+        duplicate = present & frame[key].astype(str).duplicated(keep='last')
+        if duplicate.any():
+            label = ', '.join(key)
+            found = problems.get(label, pd.Series('', index=frame.index, dtype=object))
+            found[duplicate] = "repeats a value that must be unique (a later row has it too)"
+            problems[label] = found
+
+    if problems:
+        table_problems = pd.DataFrame(problems)
+        bad_rows = table_problems.ne('').any(axis=1).to_numpy()
+    else:
+        table_problems = None
+        bad_rows = np.zeros(len(records), dtype=bool)
+
+    valid, valid_rows, quarantined = [], [], []
+    for position in np.flatnonzero(~bad_rows):
+        valid.append(records[position])
+        valid_rows.append(excel_rows[position])
+    for position in np.flatnonzero(bad_rows):
+        row_problems = table_problems.iloc[position]
+        record = records[position]
+        quarantined.append({
+            'excel_row': excel_rows[position],
+            'problems': [{'column': name, 'value': record.get(name) if name in record else None, 'problem': text}
+                         for name, text in row_problems.items() if text],
+            'record': record,
+        })
+
+    return {'valid': valid, 'excel_rows': valid_rows, 'quarantined': quarantined, 'unknown_columns': unknown}
+
+
+def write_quarantine_report(table: str, quarantined: List[Dict], directory: Optional[str] = None) -> Optional[Path]:
+    """
+    Write (or, when nothing was quarantined, remove) logs/quarantine/<table>.json
+
+    Returns:
+        Path of the report, or None when there was nothing to report
+    """
+    path = Path(directory or QUARANTINE_DIR) / f"{table}.json"
+    if not quarantined:
+        if path.exists():
+            path.unlink()
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        'table': table,
+        'written_at': datetime.now(timezone.utc).isoformat(),
+        'rows': quarantined,
+    }
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_quarantine_rows(table: str, rows: List[Dict], directory: Optional[str] = None) -> Optional[Path]:
+    """Add rows (same shape as validate_rows' 'quarantined') to the table's report"""
+    if not rows:
+        return None
+    path = Path(directory or QUARANTINE_DIR) / f"{table}.json"
+    existing = []
+    if path.exists():
+        try:
+            with open(path) as f:
+                existing = json.load(f).get('rows', [])
+        except (OSError, ValueError):
+            existing = []
+    return write_quarantine_report(table, existing + rows, directory)
+
+
+def quarantine_invalid(table: str, records: List[Dict], excel_rows: Optional[List[int]] = None,
+                       metrics=None) -> Dict:
+    """
+    validate_rows plus the report and console summary the syncs share
+
+    Args:
+        table: Target table
+        records: Rows about to be uploaded
+        excel_rows: Excel row number of each record
+        metrics: RunMetrics to count 'rows_quarantined' into
+
+    Returns:
+        The validate_rows result
+    """
+    result = validate_rows(table, records, excel_rows)
+    if result['unknown_columns']:
+        print(f"   Warning: {table} has no column(s) {', '.join(result['unknown_columns'])}; "
+              f"the upload will be rejected until the schema is updated")
+    report = write_quarantine_report(table, result['quarantined'])
+    if report:
+        print(f"   Quarantined {len(result['quarantined'])} invalid row(s) -> {report}")
+        for row in result['quarantined'][:5]:
+            first = row['problems'][0]
+            print(f"     Excel row {row['excel_row']}: {first['column']} {first['value']!r} {first['problem']}")
+        if len(result['quarantined']) > 5:
+            print(f"     ... {len(result['quarantined']) - 5} more in the report")
+    if metrics is not None:
+        metrics.count('rows_quarantined', len(result['quarantined']))
+    return result
@@ -0,0 +1,377 @@
+"""
+Samsara Cassette Recorder / Replayer
+Captures real Samsara API responses to disk and serves them back offline,
+so the tracker sync can be profiled without a live token or network.
+
+Usage:
+    python samsara_cassette.py record --hours-back 168 --out cassettes/fleet.json
+    python samsara_cassette.py synth --trackers 4000 --events-per-tracker 24 --out cassettes/synthetic.json
+    python samsara_cassette.py bench --cassette cassettes/synthetic.json --latency-ms 150 --page-size 512
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from samsara_client import SamsaraClient
+
+CASSETTE_VERSION = 1
+
+ASSETS_ENDPOINT = '/assets'
+LOCATION_STREAM_ENDPOINT = '/assets/location-and-speed/stream'
+
+# Samsara caps the location stream at 512 events per page
+DEFAULT_PAGE_SIZE = 512
+
+# Synthetic fleets are centered on the Amarillo Frame 6B site by default
+DEFAULT_SYNTH_CENTER = (35.293, -101.603)
+
+
+def _make_response(url: str, status_code: int, payload) -> requests.Response:
+    """Build a requests.Response carrying a JSON payload"""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    response.encoding = 'utf-8'
+    return response
+
+
+def _endpoint(url: str) -> str:
+    """Return the path component of a Samsara API URL"""
+    return urlparse(url).path.rstrip('/') or '/'
+
+
+def load_cassette(path: str) -> Dict:
+    """Load a cassette file from disk"""
+    with open(path, 'r', encoding='utf-8') as f:
+        cassette = json.load(f)
+
+    if cassette.get('version') != CASSETTE_VERSION:
+        raise ValueError(f"Unsupported cassette version in {path}: {cassette.get('version')}")
+
+    return cassette
+
+
+def save_cassette(cassette: Dict, path: str) -> None:
+    """Write a cassette file to disk, creating parent folders as needed"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cassette, f)
+
+
+def empty_cassette(source: str) -> Dict:
+    """Return a cassette with no recorded data"""
+    return {
+        'version': CASSETTE_VERSION,
+        'source': source,
+        'recorded_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'assets': [],
+        'location_events': []
+    }
+
+
+class RecordingSession(requests.Session):
+    """
+    requests.Session that captures Samsara asset and location responses.
+
+    Pages are stored flattened (all assets, all events) rather than as raw
+    pages, so a replay can re-paginate them with any page size.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cassette = empty_cassette('record')
+        self._seen_asset_ids = set()
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+
+        if method.upper() == 'GET' and response.status_code == 200:
+            endpoint = _endpoint(url)
+            if endpoint == ASSETS_ENDPOINT:
+                for asset in response.json().get('data', []):
+                    if asset.get('id') not in self._seen_asset_ids:
+                        self._seen_asset_ids.add(asset.get('id'))
+                        self.cassette['assets'].append(asset)
+            elif endpoint == LOCATION_STREAM_ENDPOINT:
+                self.cassette['location_events'].extend(response.json().get('data', []))
+
+        return response
+
+    def save(self, path: str) -> None:
+        """Write everything captured so far to a cassette file"""
+        save_cassette(self.cassette, path)
+
+
+class ReplaySession(requests.Session):
+    """
+    requests.Session that serves Samsara responses from a cassette.
+
+    Location events are re-paginated with `page_size` and every Samsara call
+    sleeps `latency_ms` to imitate network round-trips. Requests to any other
+    host (Supabase) are accepted and answered with an empty success response,
+    so `SamsaraSyncService.sync_trackers` can run end to end offline.
+    """
+
+    def __init__(self, cassette: Dict, latency_ms: float = 0, page_size: int = DEFAULT_PAGE_SIZE):
+        super().__init__()
+        self.cassette = cassette
+        self.latency_s = latency_ms / 1000.0
+        self.page_size = page_size
+        self.request_counts: Dict[str, int] = {}
+
+        # Index events per asset so filtering by ids is a dict lookup
+        self._events_by_asset: Dict[str, List[Dict]] = {}
+        for event in cassette.get('location_events', []):
+            asset_id = event.get('asset', {}).get('id')
+            self._events_by_asset.setdefault(asset_id, []).append(event)
+
+    def request(self, method, url, params=None, **kwargs):
+        host = urlparse(url).netloc
+        samsara_host = urlparse(SamsaraClient.BASE_URL).netloc
+        key = f"{method.upper()} {host}{_endpoint(url)}"
+        self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+        if host != samsara_host:
+            # Supabase sink - reads come back empty, writes succeed
+            if method.upper() == 'GET':
+                return _make_response(url, 200, [])
+            return _make_response(url, 201, None)
+
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+        endpoint = _endpoint(url)
+        if endpoint == ASSETS_ENDPOINT:
+            return _make_response(url, 200, {'data': self.cassette.get('assets', [])})
+        if endpoint == LOCATION_STREAM_ENDPOINT:
+            return _make_response(url, 200, self._location_page(params or {}))
+
+        return _make_response(url, 404, {'message': f'{endpoint} not in cassette'})
+
+    def _location_page(self, params: Dict) -> Dict:
+        """Serve one page of the location stream using an offset cursor"""
+        ids = [i for i in str(params.get('ids', '')).split(',') if i]
+        if ids:
+            events = [e for asset_id in ids for e in self._events_by_asset.get(asset_id, [])]
+        else:
+            events = self.cassette.get('location_events', [])
+
+        limit = min(int(params.get('limit', self.page_size)), self.page_size)
+        start = int(params.get('after') or 0)
+        end = start + limit
+        has_next = end < len(events)
+
+        return {
+            'data': events[start:end],
+            'pagination': {
+                'endCursor': str(end) if has_next else '',
+                'hasNextPage': has_next
+            }
+        }
+
+
+def replay_client(cassette: Dict, latency_ms: float = 0, page_size: int = DEFAULT_PAGE_SIZE) -> SamsaraClient:
+    """Return a SamsaraClient wired to a ReplaySession (no token required)"""
+    return SamsaraClient(api_token='replay', session=ReplaySession(cassette, latency_ms, page_size))
+
+
+def synthesize_fleet(num_trackers: int, events_per_tracker: int = 24, on_site_ratio: float = 0.6,
+                     center=DEFAULT_SYNTH_CENTER, hours_back: int = 24, seed: Optional[int] = 42) -> Dict:
+    """
+    Generate a synthetic cassette with `num_trackers` AT11 trackers.
+
+    Each tracker gets `events_per_tracker` fixes spread over `hours_back`
+    hours as a small random walk, either around the site center or
+    somewhere across TX/OK/NM for trackers in transit.
+    """
+    rng = random.Random(seed)
+    cassette = empty_cassette('synthetic')
+    now = datetime.utcnow().replace(microsecond=0)
+    center_lat, center_lon = center
+
+    for i in range(num_trackers):
+        asset_id = str(281474999387855 + i)
+        cassette['assets'].append({
+            'id': asset_id,
+            'name': f'Synthetic Tracker {i + 1:05d}',
+            'type': 'unpowered',
+            'createdAtTime': (now - timedelta(days=90)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'updatedAtTime': now.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'externalIds': {'default': f'SYN{i:08d}'}
+        })
+
+        if rng.random() < on_site_ratio:
+            lat = center_lat + rng.uniform(-0.003, 0.003)
+            lon = center_lon + rng.uniform(-0.003, 0.003)
+            step = 0.0001
+        else:
+            lat = rng.uniform(31.0, 36.5)
+            lon = rng.uniform(-106.0, -97.0)
+            step = 0.02
+
+        interval = timedelta(hours=hours_back) / max(events_per_tracker, 1)
+        happened_at = now - timedelta(hours=hours_back)
+        for _ in range(events_per_tracker):
+            happened_at += interval
+            lat += rng.uniform(-step, step)
+            lon += rng.uniform(-step, step)
+            cassette['location_events'].append({
+                'happenedAtTime': happened_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'asset': {'id': asset_id},
+                'location': {
+                    'latitude': round(lat, 6),
+                    'longitude': round(lon, 6),
+                    'headingDegrees': rng.randint(0, 359),
+                    'accuracyMeters': round(rng.uniform(5.0, 250.0), 3)
+                }
+            })
+
+    # The live API returns the stream ordered by time, not by asset
+    cassette['location_events'].sort(key=lambda e: e['happenedAtTime'])
+    return cassette
+
+
+def scale_cassette(cassette: Dict, factor: int) -> Dict:
+    """
+    Multiply a recorded fleet by `factor`, cloning each tracker and its
+    events under new asset IDs. Useful for 10x / 100x benchmarks from a
+    real recording.
+    """
+    if factor <= 1:
+        return cassette
+
+    scaled = empty_cassette(f"{cassette.get('source', 'record')}x{factor}")
+    for copy in range(factor):
+        suffix = '' if copy == 0 else f'-{copy}'
+        for asset in cassette.get('assets', []):
+            scaled['assets'].append({**asset, 'id': f"{asset['id']}{suffix}"})
+        for event in cassette.get('location_events', []):
+            asset_id = event.get('asset', {}).get('id')
+            scaled['location_events'].append({**event, 'asset': {**event.get('asset', {}), 'id': f'{asset_id}{suffix}'}})
+
+    scaled['location_events'].sort(key=lambda e: e.get('happenedAtTime', ''))
+    return scaled
+
+
+def run_benchmark(cassette: Dict, latency_ms: float = 0, page_size: int = DEFAULT_PAGE_SIZE,
+                  repeat: int = 3, include_sync: bool = True) -> Dict:
+    """
+    Time get_passive_tracker_locations (and optionally sync_trackers) against
+    a cassette. Returns best-of-`repeat` wall times in seconds plus request
+    counts from the last run.
+    """
+    # Imported here to avoid a circular import when sync_samsara_data uses cassettes
+    from sync_samsara_data import SamsaraSyncService
+
+    results = {
+        'trackers': len(cassette.get('assets', [])),
+        'events': len(cassette.get('location_events', [])),
+        'latency_ms': latency_ms,
+        'page_size': page_size,
+        'fetch_seconds': None,
+        'sync_seconds': None,
+        'requests': {}
+    }
+
+    fetch_times = []
+    sync_times = []
+    for _ in range(repeat):
+        client = replay_client(cassette, latency_ms, page_size)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.get_passive_tracker_locations(hours_back=24)
+        fetch_times.append(time.perf_counter() - start)
+
+        if include_sync:
+            client = replay_client(cassette, latency_ms, page_size)
+            service = SamsaraSyncService(
+                samsara_client=client,
+                session=client.session,
+                supabase_url='https://replay.supabase.local',
+                supabase_key='replay'
+            )
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                service.sync_trackers(hours_back=24)
+            sync_times.append(time.perf_counter() - start)
+
+        results['requests'] = dict(client.session.request_counts)
+
+    results['fetch_seconds'] = min(fetch_times)
+    if sync_times:
+        results['sync_seconds'] = min(sync_times)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record, replay and benchmark Samsara API traffic offline')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help='Capture live /assets and location stream responses')
+    record.add_argument('--hours-back', type=int, default=24)
+    record.add_argument('--out', required=True)
+
+    synth = sub.add_parser('synth', help='Generate a synthetic fleet cassette')
+    synth.add_argument('--trackers', type=int, default=400)
+    synth.add_argument('--events-per-tracker', type=int, default=24)
+    synth.add_argument('--on-site-ratio', type=float, default=0.6)
+    synth.add_argument('--seed', type=int, default=42)
+    synth.add_argument('--out', required=True)
+
+    bench = sub.add_parser('bench', help='Benchmark the Samsara path against a cassette')
+    bench.add_argument('--cassette', required=True)
+    bench.add_argument('--scale', type=int, nargs='*', default=[1], help='Fleet multipliers to run, e.g. 1 10 100')
+    bench.add_argument('--latency-ms', type=float, default=0)
+    bench.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.add_argument('--fetch-only', action='store_true', help='Skip sync_trackers')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        session = RecordingSession()
+        client = SamsaraClient(session=session)
+        trackers = client.get_passive_tracker_locations(hours_back=args.hours_back)
+        session.save(args.out)
+        print(f"Recorded {len(session.cassette['assets'])} assets, "
+              f"{len(session.cassette['location_events'])} location events "
+              f"({len(trackers)} passive trackers) to {args.out}")
+
+    elif args.command == 'synth':
+        cassette = synthesize_fleet(args.trackers, args.events_per_tracker, args.on_site_ratio, seed=args.seed)
+        save_cassette(cassette, args.out)
+        print(f"Wrote {len(cassette['assets'])} trackers, {len(cassette['location_events'])} events to {args.out}")
+
+    elif args.command == 'bench':
+        base = load_cassette(args.cassette)
+        print("=" * 80)
+        print(f"{'Scale':>6} {'Trackers':>9} {'Events':>9} {'Fetch (s)':>10} {'Sync (s)':>10} {'Requests':>9}")
+        print("-" * 80)
+        for factor in args.scale:
+            cassette = scale_cassette(base, factor)
+            result = run_benchmark(cassette, args.latency_ms, args.page_size, args.repeat,
+                                   include_sync=not args.fetch_only)
+            sync_s = f"{result['sync_seconds']:.3f}" if result['sync_seconds'] is not None else '-'
+            print(f"{factor:>5}x {result['trackers']:>9} {result['events']:>9} "
+                  f"{result['fetch_seconds']:>10.3f} {sync_s:>10} {sum(result['requests'].values()):>9}")
+        print("=" * 80)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
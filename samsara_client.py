@@ -19,12 +19,15 @@ class SamsaraClient:
     BASE_URL = "https://api.samsara.com"
     SHARE_URL_BASE = "https://cloud.samsara.com/o/4009326/fleet/viewer"
 
-    def __init__(self, api_token: Optional[str] = None):
+    def __init__(self, api_token: Optional[str] = None, session: Optional[requests.Session] = None):
         """
         Initialize Samsara client
 
         Args:
             api_token: Samsara API token. If None, reads from .env file
+            session: HTTP session to send requests through. Defaults to a new
+                requests.Session; samsara_cassette passes a recording or replay
+                session here for offline runs.
         """
         self.api_token = api_token or os.getenv('SAMSARA_API_TOKEN') or os.getenv('Samsara API Token')
 
@@ -38,6 +41,8 @@ class SamsaraClient:
             'Accept': 'application/json'
         }
 
+        self.session = session or requests.Session()
+
     def _make_request(self, method: str, endpoint: str, params: Optional[Dict] = None) -> Dict:
         """
         Make HTTP request to Samsara API
@@ -53,7 +58,7 @@ class SamsaraClient:
         url = f"{self.BASE_URL}{endpoint}"
 
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
                 headers=self.headers,
@@ -100,13 +105,15 @@ class SamsaraClient:
         print(f"Found {len(trackers)} passive trackers out of {len(all_assets)} total assets")
         return trackers
 
-    def get_location_history(self, asset_ids: List[str], hours_back: int = 24) -> List[Dict]:
+    def get_location_history(self, asset_ids: List[str], hours_back: int = 24,
+                             start_time: Optional[datetime] = None) -> List[Dict]:
         """
         Get location history for specified assets with pagination support
 
         Args:
             asset_ids: List of asset IDs to query
             hours_back: How many hours back to query (default 24)
+            start_time: Explicit UTC start time; overrides hours_back
 
         Returns:
             List of location events
@@ -115,7 +122,8 @@ class SamsaraClient:
             return []
 
         # Calculate start time
-        start_time = datetime.utcnow() - timedelta(hours=hours_back)
+        if start_time is None:
+            start_time = datetime.utcnow() - timedelta(hours=hours_back)
         start_time_iso = start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
 
         all_events = []
@@ -157,7 +165,26 @@ class SamsaraClient:
             hours_back: How many hours back to query (default 24)
 
         Returns:
-            List of tracker dictionaries with location data:
+            List of tracker dictionaries (see get_passive_tracker_snapshot)
+        """
+        return self.get_passive_tracker_snapshot(hours_back)['trackers']
+
+    def get_passive_tracker_snapshot(self, hours_back: int = 24, trackers: Optional[List[Dict]] = None,
+                                     start_time: Optional[datetime] = None) -> Dict:
+        """
+        Get latest locations for all passive trackers along with the full
+        location trail they were derived from
+
+        Args:
+            hours_back: How many hours back to query (default 24)
+            trackers: Passive tracker assets to query. If None, lists them
+                with get_passive_trackers (callers polling repeatedly can
+                pass a cached list to skip the /assets call)
+            start_time: Explicit UTC start time; overrides hours_back
+
+        Returns:
+            Dictionary with 'trackers' and 'events'. 'events' is the raw
+            location stream for every passive tracker; 'trackers' is:
             [
                 {
                     'id': '281474999387855',
@@ -174,17 +201,18 @@ class SamsaraClient:
             ]
         """
         # Get all passive trackers
-        trackers = self.get_passive_trackers()
+        if trackers is None:
+            trackers = self.get_passive_trackers()
 
         if not trackers:
             print("No passive trackers found")
-            return []
+            return {'trackers': [], 'events': []}
 
         # Get asset IDs
         asset_ids = [tracker['id'] for tracker in trackers]
 
         # Get location history
-        location_events = self.get_location_history(asset_ids, hours_back)
+        location_events = self.get_location_history(asset_ids, hours_back, start_time=start_time)
 
         # Build a map of latest location per asset
         latest_locations = {}
@@ -237,7 +265,7 @@ class SamsaraClient:
             result.append(tracker_data)
 
         print(f"Retrieved locations for {len(latest_locations)} out of {len(trackers)} trackers")
-        return result
+        return {'trackers': result, 'events': location_events}
 
     def calculate_distance_from_site(self, lat: float, lon: float, site_lat: float, site_lon: float) -> float:
         """
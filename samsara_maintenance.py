@@ -0,0 +1,153 @@
+"""
+Samsara History Maintenance
+Keeps the partitioned samsara_location_history healthy: creates upcoming
+monthly partitions, refreshes the hourly/daily rollups and drops raw
+partitions past the retention window (see supabase/samsara_history_partitioning.sql)
+
+Usage:
+    python samsara_maintenance.py
+    python samsara_maintenance.py --retain-months 6 --rollup-hours 72
+    python samsara_maintenance.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Raw fixes older than this many whole months are dropped (rollups are kept)
+RETAIN_MONTHS = int(os.getenv('SAMSARA_HISTORY_RETAIN_MONTHS', '12'))
+
+# Partitions are created this many months ahead of the current month
+MONTHS_AHEAD = 3
+
+# Rollups are recomputed over this window each run; it only needs to cover
+# the time since the previous run plus late-arriving fixes
+ROLLUP_HOURS = 48
+
+
+class SamsaraHistoryMaintenance:
+    """Calls the history maintenance functions through the Supabase RPC API"""
+
+    def __init__(self, session=None, supabase_url=None, supabase_key=None):
+        self.session = session or requests.Session()
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env or GitHub secrets")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _rpc(self, function: str, params: dict):
+        response = self.session.post(
+            f"{self.supabase_url}/rest/v1/rpc/{function}",
+            headers=self.supabase_headers,
+            json=params
+        )
+        if response.status_code not in [200, 204]:
+            raise RuntimeError(f"{function} failed: {response.text}")
+        return response.json() if response.content else None
+
+    def ensure_partitions(self, months_ahead: int = MONTHS_AHEAD) -> list:
+        """Create missing monthly partitions; returns the names created"""
+        return self._rpc('ensure_samsara_history_partitions', {'p_months_ahead': months_ahead}) or []
+
+    def refresh_rollups(self, hours_back: int = ROLLUP_HOURS) -> dict:
+        """Recompute hourly and daily rollups for the last hours_back hours"""
+        since = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+        return self._rpc('refresh_samsara_location_rollups', {'p_since': since.isoformat()}) or {}
+
+    def apply_retention(self, retain_months: int = RETAIN_MONTHS, dry_run: bool = False) -> list:
+        """Drop raw partitions older than retain_months; returns the affected partitions"""
+        return self._rpc('drop_samsara_history_partitions',
+                         {'p_retain_months': retain_months, 'p_dry_run': dry_run}) or []
+
+    def run(self, retain_months: int = RETAIN_MONTHS, rollup_hours: int = ROLLUP_HOURS,
+            months_ahead: int = MONTHS_AHEAD, dry_run: bool = False) -> dict:
+        """
+        Run all maintenance steps in order
+
+        Rollups are refreshed before retention so nothing is dropped unrolled.
+
+        Returns:
+            Dictionary with 'success', 'partitions_created', 'rollups',
+            'partitions_dropped' and 'error' (if any)
+        """
+        result = {'success': True, 'partitions_created': [], 'rollups': {}, 'partitions_dropped': [], 'error': None}
+
+        try:
+            print("\n1. Ensuring monthly partitions...")
+            if dry_run:
+                print("   Skipped (dry run)")
+            else:
+                result['partitions_created'] = self.ensure_partitions(months_ahead)
+                print(f"   Created {len(result['partitions_created'])} partitions")
+
+            print(f"\n2. Refreshing rollups (last {rollup_hours} hours)...")
+            if dry_run:
+                print("   Skipped (dry run)")
+            else:
+                result['rollups'] = self.refresh_rollups(rollup_hours)
+                print(f"   Hourly rows: {result['rollups'].get('hourly_rows', 0)}, "
+                      f"daily rows: {result['rollups'].get('daily_rows', 0)}")
+
+            print(f"\n3. Applying retention ({retain_months} months)...")
+            result['partitions_dropped'] = self.apply_retention(retain_months, dry_run=dry_run)
+            verb = 'Would drop' if dry_run else 'Dropped'
+            for partition in result['partitions_dropped']:
+                print(f"   {verb} {partition['partition_name']}")
+            if not result['partitions_dropped']:
+                print("   Nothing past retention")
+
+        except Exception as e:
+            print(f"   Error: {e}")
+            result['success'] = False
+            result['error'] = str(e)
+
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partition, roll up and expire Samsara location history')
+    parser.add_argument('--retain-months', type=int, default=RETAIN_MONTHS,
+                        help=f'Months of raw history to keep (default: {RETAIN_MONTHS})')
+    parser.add_argument('--rollup-hours', type=int, default=ROLLUP_HOURS,
+                        help=f'Hours of rollups to recompute (default: {ROLLUP_HOURS})')
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                        help=f'Future monthly partitions to keep ready (default: {MONTHS_AHEAD})')
+    parser.add_argument('--dry-run', action='store_true', help='Only report partitions past retention')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("SAMSARA HISTORY MAINTENANCE")
+    print("=" * 80)
+
+    try:
+        result = SamsaraHistoryMaintenance().run(
+            retain_months=args.retain_months,
+            rollup_hours=args.rollup_hours,
+            months_ahead=args.months_ahead,
+            dry_run=args.dry_run
+        )
+        sys.exit(0 if result['success'] else 1)
+
+    except Exception as e:
+        print(f"\nFatal error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Samsara Long-Running Poller
+Keeps one process, HTTP session and set of caches alive and polls each
+tracker on its own schedule: trackers in transit or near a fence are
+polled often, trackers parked on site rarely. All Samsara calls share a
+token-bucket budget so the poller stays inside the API rate limit.
+
+Usage:
+    python sync_samsara_data.py --daemon
+"""
+
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+from geofence import haversine_km
+from samsara_client import SamsaraClient
+from sync_metrics import RunMetrics
+from sync_samsara_data import SamsaraSyncService, empty_stats
+
+# Poll intervals per tier, in seconds
+TIER_INTERVALS = {
+    'fast': 5 * 60,      # In transit, or close to a fence line
+    'normal': 15 * 60,   # Off site and not moving, or no fix yet
+    'slow': 60 * 60      # Parked inside a zone
+}
+
+DEFAULT_CALLS_PER_MINUTE = 60
+DEFAULT_ASSET_REFRESH_S = 6 * 3600
+DEFAULT_GEOFENCE_REFRESH_S = 15 * 60
+DEFAULT_NEAR_FENCE_M = 200
+DEFAULT_MOVING_KMH = 1.0
+DEFAULT_IDS_PER_CALL = 200
+
+# Re-read this much before the last poll so late-arriving fixes are not missed
+POLL_OVERLAP = timedelta(minutes=10)
+
+# sync_runs dataset for poll cycles. Each cycle that polls anything is one
+# ledger row: a cycle is the poller's unit of work, so its duration, HTTP
+# latency and errors line up with what the .prom report shows. Idle ticks
+# are not recorded. A separate dataset keeps minute-long cycles out of the
+# percentiles of the hourly 'samsara' runs.
+POLLER_DATASET = 'samsara_poller'
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that spends one token per request from a refilling bucket"""
+
+    def __init__(self, calls_per_minute: int = DEFAULT_CALLS_PER_MINUTE):
+        super().__init__()
+        self.capacity = max(1, calls_per_minute)
+        self.refill_per_s = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.throttled_s = 0.0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, *args, **kwargs):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_s)
+            self.updated = now
+            if self.tokens < 1:
+                wait = (1 - self.tokens) / self.refill_per_s
+                time.sleep(wait)
+                self.throttled_s += wait
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1
+            self.calls += 1
+        return super().request(method, url, *args, **kwargs)
+
+
+class TrackerState:
+    """Scheduling state for one tracker"""
+
+    def __init__(self, asset: Dict):
+        self.asset = asset
+        self.tier = 'normal'
+        self.next_due = 0.0
+        self.last_polled: Optional[datetime] = None
+        self.last_fix = None  # (lat, lon, epoch seconds)
+
+
+class SamsaraPoller:
+    """Adaptive per-tracker polling on top of SamsaraSyncService"""
+
+    def __init__(self, service: SamsaraSyncService, intervals: Optional[Dict[str, int]] = None,
+                 initial_hours_back: int = 24, history_mode: Optional[str] = None,
+                 asset_refresh_s: int = DEFAULT_ASSET_REFRESH_S,
+                 geofence_refresh_s: int = DEFAULT_GEOFENCE_REFRESH_S,
+                 near_fence_m: float = DEFAULT_NEAR_FENCE_M, moving_kmh: float = DEFAULT_MOVING_KMH,
+                 ids_per_call: int = DEFAULT_IDS_PER_CALL):
+        self.service = service
+        self.samsara = service.samsara
+        self.intervals = {**TIER_INTERVALS, **(intervals or {})}
+        self.initial_hours_back = initial_hours_back
+        self.history_mode = history_mode
+        self.asset_refresh_s = asset_refresh_s
+        self.geofence_refresh_s = geofence_refresh_s
+        self.near_fence_m = near_fence_m
+        self.moving_kmh = moving_kmh
+        self.ids_per_call = ids_per_call
+
+        self.trackers: Dict[str, TrackerState] = {}
+        self._assets_loaded_at = None
+        self._geofences_loaded_at = None
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        """Ask run_forever to exit after the current cycle"""
+        self._stop.set()
+
+    def refresh_assets(self, now: float) -> None:
+        """Re-list passive trackers if the cached list is stale"""
+        if self._assets_loaded_at is not None and now - self._assets_loaded_at < self.asset_refresh_s:
+            return
+
+        assets = self.samsara.get_passive_trackers()
+        current = {asset['id'] for asset in assets}
+        for asset in assets:
+            state = self.trackers.get(asset['id'])
+            if state:
+                state.asset = asset
+            else:
+                self.trackers[asset['id']] = TrackerState(asset)
+        for tracker_id in list(self.trackers):
+            if tracker_id not in current:
+                del self.trackers[tracker_id]
+        self._assets_loaded_at = now
+
+    def refresh_geofences(self, now: float) -> None:
+        """Reload zones if the cached registry is stale"""
+        if self._geofences_loaded_at is not None and now - self._geofences_loaded_at < self.geofence_refresh_s:
+            return
+        self.service.load_geofences()
+        self._geofences_loaded_at = now
+
+    def classify(self, states: List[TrackerState], previous_fixes: List) -> None:
+        """Assign a polling tier to each tracker from its latest fix"""
+        located = [i for i, state in enumerate(states) if state.last_fix is not None]
+        for state in states:
+            if state.last_fix is None:
+                state.tier = 'normal'
+        if not located:
+            return
+
+        lats = np.array([states[i].last_fix[0] for i in located])
+        lons = np.array([states[i].last_fix[1] for i in located])
+        inside = np.zeros(len(located), dtype=bool)
+        fence_m = np.full(len(located), np.inf)
+        for _, candidates, signed in self.service.geofences.index.zone_distances(lats, lons):
+            inside[candidates[signed <= 0]] = True
+            np.minimum.at(fence_m, candidates, np.abs(signed))
+
+        for j, i in enumerate(located):
+            state = states[i]
+            moving = False
+            previous = previous_fixes[i]
+            if previous is not None and state.last_fix[2] > previous[2]:
+                hours = (state.last_fix[2] - previous[2]) / 3600
+                km = haversine_km(previous[0], previous[1], state.last_fix[0], state.last_fix[1])
+                moving = km / hours >= self.moving_kmh
+
+            if moving or fence_m[j] <= self.near_fence_m:
+                state.tier = 'fast'
+            elif inside[j]:
+                state.tier = 'slow'
+            else:
+                state.tier = 'normal'
+
+    def poll_once(self, now: Optional[float] = None) -> dict:
+        """
+        Poll every tracker that is due, in batches of ids_per_call
+
+        Returns:
+            Sync statistics for this cycle (zeroes when nothing was due)
+        """
+        now = time.time() if now is None else now
+        stats = empty_stats()
+        self.refresh_assets(now)
+        self.refresh_geofences(now)
+
+        due = [state for state in self.trackers.values() if state.next_due <= now]
+        if not due:
+            return stats
+
+        utc_now = datetime.utcnow()
+        for i in range(0, len(due), self.ids_per_call):
+            chunk = due[i:i + self.ids_per_call]
+            polled = [state.last_polled for state in chunk if state.last_polled is not None]
+            if len(polled) == len(chunk):
+                start_time = min(polled) - POLL_OVERLAP
+            else:
+                start_time = utc_now - timedelta(hours=self.initial_hours_back)
+
+            try:
+                snapshot = self.samsara.get_passive_tracker_snapshot(
+                    trackers=[state.asset for state in chunk], start_time=start_time
+                )
+            except Exception as e:
+                print(f"   Error polling {len(chunk)} trackers: {e}")
+                stats['errors'] += 1
+                # Wait a full interval before retrying rather than spend budget every tick
+                for state in chunk:
+                    state.next_due = now + self.intervals[state.tier]
+                continue
+
+            stats['trackers_fetched'] += len(snapshot['trackers'])
+            self.service.write_snapshot(snapshot, stats, self.history_mode)
+
+            previous_fixes = [state.last_fix for state in chunk]
+            by_id = {tracker['id']: tracker for tracker in snapshot['trackers']}
+            for state in chunk:
+                tracker = by_id.get(state.asset['id'])
+                if tracker and tracker['location'] and tracker['timestamp']:
+                    fix_time = datetime.fromisoformat(tracker['timestamp'].replace('Z', '+00:00')).timestamp()
+                    state.last_fix = (tracker['location']['latitude'], tracker['location']['longitude'], fix_time)
+                state.last_polled = utc_now
+
+            self.classify(chunk, previous_fixes)
+            for state in chunk:
+                state.next_due = now + self.intervals[state.tier]
+
+        return stats
+
+    def tier_counts(self) -> Dict[str, int]:
+        counts = {tier: 0 for tier in self.intervals}
+        for state in self.trackers.values():
+            counts[state.tier] += 1
+        return counts
+
+    def record_cycle(self, success: bool) -> None:
+        """Finish the cycle's metrics, refresh the .prom report and append a sync_runs row"""
+        metrics = self.service.metrics
+        metrics.finish(success=success)
+        metrics.write_report(json_report=False)
+        metrics.write_ledger(self.service.session, self.service.supabase_url, self.service.supabase_headers)
+
+    def run_forever(self, tick_s: float = 30) -> None:
+        """Poll until stopped (SIGINT/SIGTERM)"""
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        print("=" * 80)
+        print("Samsara Poller Started")
+        print(f"Intervals: {', '.join(f'{tier}={seconds}s' for tier, seconds in self.intervals.items())}")
+        print("=" * 80)
+
+        while not self._stop.is_set():
+            cycle_start = time.time()
+            metrics = self.service.metrics
+            metrics.reset()
+            try:
+                stats = self.poll_once(cycle_start)
+                if stats['trackers_fetched'] or stats['errors']:
+                    metrics.count('errors', stats['errors'])
+                    self.record_cycle(success=stats['errors'] == 0)
+                    tiers = self.tier_counts()
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
+                          f"polled {stats['trackers_fetched']} trackers, "
+                          f"{stats['locations_added']} fixes, {stats['zone_events']} events, "
+                          f"{stats['errors']} errors | tiers {tiers}")
+            except Exception as e:
+                print(f"Poll cycle failed: {e}")
+                import traceback
+                traceback.print_exc()
+                metrics.count('errors')
+                self.record_cycle(success=False)
+
+            next_due = min((state.next_due for state in self.trackers.values()), default=cycle_start + tick_s)
+            self._stop.wait(max(1.0, min(tick_s, next_due - time.time())))
+
+        print("Samsara poller stopped")
+
+
+def build_poller(calls_per_minute: int = DEFAULT_CALLS_PER_MINUTE, **kwargs) -> SamsaraPoller:
+    """Create a poller with a rate-limited Samsara client and a shared Supabase session"""
+    client = SamsaraClient(session=RateLimitedSession(calls_per_minute))
+    service = SamsaraSyncService(samsara_client=client, metrics=RunMetrics(POLLER_DATASET))
+    return SamsaraPoller(service, **kwargs)
@@ -0,0 +1,439 @@
+"""
+Schedule Critical Path (CPM)
+Computes the critical path of project_schedule from the activity logic in
+schedule_relationships instead of trusting the is_critical flag stored with
+each activity:
+
+    early/late start and finish   forward and backward pass over the network
+    total_float / free_float      days an activity can slip before it moves
+                                  the project finish / its first successor
+    is_critical                   open activity with no total float
+    is_driving                    on the chain of zero-slack links that ends
+                                  at the project finish
+
+Both passes visit every activity and relationship once (topological order,
+O(activities + relationships)), so a P6 export with tens of thousands of
+activities recomputes in about a second. Results replace schedule_cpm in one
+bulk upsert (supabase/schedule_cpm_schema.sql).
+
+Relationships come from schedule_relationships, or from a P6 export passed
+with --relationships, which also replaces that table:
+    CSV  columns Predecessor, Successor, Relationship Type, Lag (days)
+    XER  TASK and TASKPRED tables (lag hours / HOURS_PER_DAY)
+
+Durations are calendar days (the schedule carries no work calendars).
+
+Usage:
+    python schedule_cpm.py
+    python schedule_cpm.py --relationships exports/P0203-SCH.xer
+    python schedule_cpm.py bench --activities 1000 10000 50000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from local_mirror import LocalMirror, read_table
+from supabase_rest import DEFAULT_PROJECT_ID, fetch_rows, replace_rows
+from sync_metrics import InstrumentedSession, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+RELATIONSHIPS_TABLE = 'schedule_relationships'
+RELATIONSHIPS_CONFLICT = 'project_id,predecessor_id,successor_id,relationship_type'
+CPM_TABLE = 'schedule_cpm'
+CPM_CONFLICT = 'project_id,activity_id'
+
+RELATIONSHIP_TYPES = ('FS', 'SS', 'FF', 'SF')
+# P6 spells the types several ways: 'PR_FS', 'Finish to Start', 'FS'
+RELATIONSHIP_ALIASES = {
+    'FINISH TO START': 'FS', 'START TO START': 'SS', 'FINISH TO FINISH': 'FF', 'START TO FINISH': 'SF',
+}
+HOURS_PER_DAY = 8
+
+# An open activity with this much total float or less is critical
+CRITICAL_FLOAT_DAYS = 0
+COMPLETE = 'complete'
+
+
+class ScheduleCycleError(ValueError):
+    """The relationships loop back on themselves, so there is no critical path"""
+
+
+def relationship_type(value) -> str:
+    text = str(value or 'FS').strip().upper().replace('PR_', '')
+    text = RELATIONSHIP_ALIASES.get(text, text)
+    if text not in RELATIONSHIP_TYPES:
+        raise ValueError(f"Unknown relationship type: {value!r}")
+    return text
+
+
+def _lag_days(value) -> int:
+    """'5', '5d', '-2', 5.0 -> days"""
+    text = str(value or '0').strip().lower().rstrip('d').strip()
+    return int(round(float(text))) if text else 0
+
+
+def _ordinal(value) -> Optional[int]:
+    if not value:
+        return None
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def read_relationships_csv(path: str) -> List[Dict]:
+    """Relationship rows from a P6 relationship report saved as CSV"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [{
+            'predecessor_id': row['Predecessor'].strip(),
+            'successor_id': row['Successor'].strip(),
+            'relationship_type': relationship_type(row.get('Relationship Type')),
+            'lag_days': _lag_days(row.get('Lag')),
+        } for row in csv.DictReader(f) if row.get('Predecessor') and row.get('Successor')]
+
+
+def read_relationships_xer(path: str) -> List[Dict]:
+    """Relationship rows from a P6 XER export (TASKPRED, with TASK mapping task_id to activity ID)"""
+    tables: Dict[str, List[Dict]] = defaultdict(list)
+    table = fields = None
+    with open(path, 'r', encoding='cp1252', errors='replace') as f:
+        for line in f:
+            parts = line.rstrip('\r\n').split('\t')
+            if parts[0] == '%T':
+                table, fields = parts[1], None
+            elif parts[0] == '%F':
+                fields = parts[1:]
+            elif parts[0] == '%R' and table in ('TASK', 'TASKPRED') and fields:
+                tables[table].append(dict(zip(fields, parts[1:])))
+
+    codes = {task['task_id']: task['task_code'] for task in tables['TASK']}
+    relationships = []
+    for pred in tables['TASKPRED']:
+        if pred.get('task_id') in codes and pred.get('pred_task_id') in codes:
+            relationships.append({
+                'predecessor_id': codes[pred['pred_task_id']],
+                'successor_id': codes[pred['task_id']],
+                'relationship_type': relationship_type(pred.get('pred_type')),
+                'lag_days': int(round(float(pred.get('lag_hr_cnt') or 0) / HOURS_PER_DAY)),
+            })
+    return relationships
+
+
+def read_relationships(path: str) -> List[Dict]:
+    if path.lower().endswith('.xer'):
+        return read_relationships_xer(path)
+    return read_relationships_csv(path)
+
+
+def compute_cpm(activities: List[Dict], relationships: List[Dict]) -> List[Dict]:
+    """
+    Forward and backward pass over one project's network
+
+    Args:
+        activities: project_schedule rows (activity_id, start_date, finish_date,
+            remaining_duration, status)
+        relationships: schedule_relationships rows between those activities;
+            links to unknown activities are ignored
+
+    Returns:
+        One schedule_cpm row per activity (without project_id)
+
+    Raises:
+        ScheduleCycleError: if the relationships contain a loop
+    """
+    ids = list(dict.fromkeys(str(a['activity_id']) for a in activities if a.get('activity_id')))
+    index = {activity_id: i for i, activity_id in enumerate(ids)}
+    by_id = {str(a['activity_id']): a for a in activities if a.get('activity_id')}
+    n = len(ids)
+    if n == 0:
+        return []
+
+    # Durations and anchors: the imported start is a start-no-earlier-than for
+    # activities with no predecessor, and completed activities stay where they finished
+    duration = [0] * n
+    anchor = [None] * n
+    complete = [False] * n
+    for i, activity_id in enumerate(ids):
+        activity = by_id[activity_id]
+        start, finish = _ordinal(activity.get('start_date')), _ordinal(activity.get('finish_date'))
+        if start is not None and finish is not None:
+            duration[i] = max(finish - start, 0)
+        else:
+            duration[i] = int(float(activity.get('remaining_duration') or 0))
+        anchor[i] = start if start is not None else (finish - duration[i] if finish is not None else None)
+        complete[i] = str(activity.get('status') or '').strip().lower() == COMPLETE
+    known = [a for a in anchor if a is not None]
+    project_start = min(known) if known else date.today().toordinal()
+    anchor = [project_start if a is None else a for a in anchor]
+
+    preds: List[List[Tuple[int, str, int]]] = [[] for _ in range(n)]
+    succs: List[List[Tuple[int, str, int]]] = [[] for _ in range(n)]
+    for rel in relationships:
+        p, s = index.get(str(rel['predecessor_id'])), index.get(str(rel['successor_id']))
+        if p is None or s is None or p == s:
+            continue
+        kind, lag = rel.get('relationship_type') or 'FS', int(rel.get('lag_days') or 0)
+        preds[s].append((p, kind, lag))
+        succs[p].append((s, kind, lag))
+
+    # Topological order (Kahn)
+    indegree = [len(p) for p in preds]
+    order = [i for i in range(n) if indegree[i] == 0]
+    for i in order:
+        for s, _, _ in succs[i]:
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                order.append(s)
+    if len(order) < n:
+        looped = [ids[i] for i in range(n) if indegree[i] > 0]
+        raise ScheduleCycleError(f"{len(looped)} activities are in a relationship loop, e.g. {', '.join(looped[:5])}")
+
+    # Forward pass
+    es = [0] * n
+    ef = [0] * n
+    for i in order:
+        if complete[i] or not preds[i]:
+            start = anchor[i]
+        else:
+            start = project_start
+            for p, kind, lag in preds[i]:
+                if kind == 'FS':
+                    start = max(start, ef[p] + lag)
+                elif kind == 'SS':
+                    start = max(start, es[p] + lag)
+                elif kind == 'FF':
+                    start = max(start, ef[p] + lag - duration[i])
+                else:
+                    start = max(start, es[p] + lag - duration[i])
+        es[i], ef[i] = start, start + duration[i]
+
+    # Backward pass
+    project_finish = max(ef)
+    lf = [project_finish] * n
+    free = [0] * n
+    for i in reversed(order):
+        finish, slack = project_finish, project_finish - ef[i]
+        for s, kind, lag in succs[i]:
+            if kind == 'FS':
+                finish = min(finish, lf[s] - duration[s] - lag)
+                slack = min(slack, es[s] - ef[i] - lag)
+            elif kind == 'SS':
+                finish = min(finish, lf[s] - duration[s] - lag + duration[i])
+                slack = min(slack, es[s] - es[i] - lag)
+            elif kind == 'FF':
+                finish = min(finish, lf[s] - lag)
+                slack = min(slack, ef[s] - ef[i] - lag)
+            else:
+                finish = min(finish, lf[s] - lag + duration[i])
+                slack = min(slack, ef[s] - es[i] - lag)
+        lf[i], free[i] = finish, slack
+
+    # Driving path: back from the activity that finishes the project along zero-slack links
+    driving_pred: List[Optional[int]] = [None] * n
+    for i in range(n):
+        for p, kind, lag in preds[i]:
+            gap = {'FS': es[i] - ef[p] - lag, 'SS': es[i] - es[p] - lag,
+                   'FF': ef[i] - ef[p] - lag, 'SF': ef[i] - es[p] - lag}[kind]
+            if gap == 0:
+                driving_pred[i] = p
+                break
+    driving = [False] * n
+    current = max(range(n), key=lambda i: (ef[i], es[i]))
+    while current is not None and not driving[current]:
+        driving[current] = True
+        current = driving_pred[current]
+
+    rows = []
+    for i, activity_id in enumerate(ids):
+        total_float = lf[i] - ef[i]
+        rows.append({
+            'activity_id': activity_id,
+            'duration_days': duration[i],
+            'early_start': date.fromordinal(es[i]).isoformat(),
+            'early_finish': date.fromordinal(ef[i]).isoformat(),
+            'late_start': date.fromordinal(lf[i] - duration[i]).isoformat(),
+            'late_finish': date.fromordinal(lf[i]).isoformat(),
+            'total_float': total_float,
+            'free_float': free[i],
+            'is_critical': not complete[i] and total_float <= CRITICAL_FLOAT_DAYS,
+            'is_driving': driving[i],
+            'driving_predecessor': ids[driving_pred[i]] if driving_pred[i] is not None else None,
+        })
+    return rows
+
+
+def compute_projects(activities: List[Dict], relationships: List[Dict]) -> List[Dict]:
+    """compute_cpm per project_id"""
+    by_project: Dict[str, Tuple[List[Dict], List[Dict]]] = defaultdict(lambda: ([], []))
+    for activity in activities:
+        by_project[activity.get('project_id') or DEFAULT_PROJECT_ID][0].append(activity)
+    for rel in relationships:
+        by_project[rel.get('project_id') or DEFAULT_PROJECT_ID][1].append(rel)
+
+    rows = []
+    for project_id, (project_activities, project_relationships) in by_project.items():
+        for row in compute_cpm(project_activities, project_relationships):
+            rows.append({'project_id': project_id, **row})
+    return rows
+
+
+class ScheduleCPM:
+    """Recomputes schedule_cpm from project_schedule and schedule_relationships"""
+
+    def __init__(self, session=None, supabase_url: str = None, supabase_key: str = None,
+                 mirror=None, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            session: HTTP session for Supabase
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            mirror: LocalMirror to read project_schedule from when it has it
+            metrics: RunMetrics to time the CPM phases into
+        """
+        self.metrics = metrics or RunMetrics('schedule_cpm')
+        self.session = session or InstrumentedSession(self.metrics)
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
+        self.mirror = mirror
+
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+
+        self.supabase_headers = {
+            'apikey': self.supabase_key,
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def run(self, relationships_file: Optional[str] = None) -> Dict:
+        """
+        Compute the critical path and replace schedule_cpm
+
+        Args:
+            relationships_file: P6 CSV/XER export; replaces schedule_relationships first
+
+        Returns:
+            Dictionary with 'success', 'activities', 'relationships', 'critical' and 'error'
+        """
+        print("\nComputing the critical path...")
+        refreshed_at = datetime.now(timezone.utc).isoformat()
+        try:
+            with self.metrics.phase('cpm_load'):
+                activities = read_table(self.mirror, self.session, self.supabase_url, self.supabase_headers,
+                                        'project_schedule')
+                if relationships_file:
+                    relationships = read_relationships(relationships_file)
+                    written = replace_rows(self.session, self.supabase_url, self.supabase_headers,
+                                           RELATIONSHIPS_TABLE, relationships, RELATIONSHIPS_CONFLICT, refreshed_at)
+                    if not written['success']:
+                        raise RuntimeError(f"{RELATIONSHIPS_TABLE}: {written['error']}")
+                else:
+                    relationships = fetch_rows(self.session, self.supabase_url, self.supabase_headers,
+                                               RELATIONSHIPS_TABLE, order='predecessor_id')
+
+            with self.metrics.phase('cpm_compute'):
+                rows = compute_projects(activities, relationships)
+
+            with self.metrics.phase('cpm_write'):
+                written = replace_rows(self.session, self.supabase_url, self.supabase_headers, CPM_TABLE, rows,
+                                       CPM_CONFLICT, refreshed_at)
+            self.metrics.count('cpm_rows', len(rows))
+        except Exception as e:
+            print(f"   Error computing the critical path: {e}")
+            return {'success': False, 'activities': 0, 'relationships': 0, 'critical': 0, 'error': str(e)}
+
+        if not written['success']:
+            print(f"   Error writing {CPM_TABLE}: {written['error']}")
+            return {'success': False, 'activities': 0, 'relationships': len(relationships), 'critical': 0,
+                    'error': written['error']}
+
+        critical = sum(row['is_critical'] for row in rows)
+        print(f"   {len(rows)} activities, {len(relationships)} relationships: {critical} critical, "
+              f"{sum(row['is_driving'] for row in rows)} on the driving path")
+        return {'success': True, 'activities': len(rows), 'relationships': len(relationships),
+                'critical': critical, 'error': None}
+
+
+def synthesize(count: int, links_per_activity: int = 2, seed: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """A random acyclic network: each activity links to a few earlier ones"""
+    rng = random.Random(seed)
+    start = date(2025, 3, 1)
+    activities, relationships = [], []
+    for i in range(count):
+        begin = start + timedelta(days=rng.randrange(365))
+        activities.append({
+            'activity_id': f'A{i:06d}',
+            'start_date': begin.isoformat(),
+            'finish_date': (begin + timedelta(days=rng.choice([0, 5, 10, 20, 40]))).isoformat(),
+            'status': 'Not Started',
+        })
+        for _ in range(min(i, links_per_activity)):
+            relationships.append({
+                'predecessor_id': f'A{rng.randrange(max(0, i - 200), i):06d}',
+                'successor_id': f'A{i:06d}',
+                'relationship_type': rng.choice(('FS', 'FS', 'FS', 'SS', 'FF', 'SF')),
+                'lag_days': rng.choice((0, 0, 0, 2, 5)),
+            })
+    return activities, relationships
+
+
+def run_benchmark(count: int, repeat: int = 3) -> Dict:
+    """Best-of-`repeat` seconds for compute_cpm on a synthetic network"""
+    activities, relationships = synthesize(count)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = compute_cpm(activities, relationships)
+        times.append(time.perf_counter() - start)
+    return {
+        'activities': count,
+        'relationships': len(relationships),
+        'critical': sum(row['is_critical'] for row in rows),
+        'seconds': min(times),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute the critical path of project_schedule')
+    parser.add_argument('--relationships', help='P6 relationship export (.csv or .xer) to load first')
+    parser.add_argument('--use-mirror', action='store_true',
+                        help='Read project_schedule from the local mirror (only as fresh as its last reconcile)')
+    sub = parser.add_subparsers(dest='command')
+    bench = sub.add_parser('bench', help='Time the CPM passes on synthetic networks')
+    bench.add_argument('--activities', type=int, nargs='*', default=[1000, 10000, 50000],
+                       help='Activity counts to run')
+    bench.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        print("=" * 80)
+        print(f"{'Activities':>11} {'Relationships':>14} {'Critical':>9} {'CPM (s)':>9}")
+        print("-" * 80)
+        for count in args.activities:
+            result = run_benchmark(count, args.repeat)
+            print(f"{result['activities']:>11} {result['relationships']:>14} {result['critical']:>9} "
+                  f"{result['seconds']:>9.3f}")
+        print("=" * 80)
+        sys.exit(0)
+
+    try:
+        cpm = ScheduleCPM(session=requests.Session(), mirror=LocalMirror() if args.use_mirror else None)
+        result = cpm.run(args.relationships)
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == '__main__':
+    main()
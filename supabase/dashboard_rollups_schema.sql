@@ -0,0 +1,99 @@
+-- ============================================================================
+-- Dashboard Rollups
+-- ============================================================================
+-- Compact aggregate tables rebuilt by dashboard_rollups.py at the end of each
+-- PO/shipment and delivery date sync. dashboard.js and project-schedule.js
+-- read these instead of downloading every purchase_orders/shipments row.
+-- Each refresh upserts every row with a new refreshed_at, then deletes rows
+-- with an older one, so the tables are never empty while a refresh runs.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: rollup_group_counts
+-- ============================================================================
+-- One row per (dataset, dimension, value), e.g.
+-- ('shipments', 'status', 'Delivered'). dimension 'total' has value 'all'.
+CREATE TABLE IF NOT EXISTS rollup_group_counts (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    dataset TEXT NOT NULL,                   -- 'purchase_orders', 'shipments', 'delivery_dates'
+    dimension TEXT NOT NULL,                 -- 'total', 'status', 'category', 'supplier', ...
+    value TEXT NOT NULL,                     -- group label; '(none)' for NULL/blank
+
+    row_count INTEGER NOT NULL DEFAULT 0,
+    po_count INTEGER NOT NULL DEFAULT 0,     -- distinct purchase orders in the group
+    total_value NUMERIC(15, 2),              -- sum of net_value (purchase_orders only)
+    total_pieces INTEGER,                    -- sum of num_pieces (shipments only)
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, dataset, dimension, value)
+);
+
+-- ============================================================================
+-- TABLE: rollup_weekly_deliveries
+-- ============================================================================
+-- Rows per ISO week (Monday) of a date column: PO delivery_date_from,
+-- shipment rts_date/eta/delivery_date and ready-by delivery_date
+CREATE TABLE IF NOT EXISTS rollup_weekly_deliveries (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    dataset TEXT NOT NULL,
+    date_column TEXT NOT NULL,
+    week_start DATE NOT NULL,
+
+    row_count INTEGER NOT NULL DEFAULT 0,
+    total_value NUMERIC(15, 2),              -- sum of net_value (purchase_orders only)
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, dataset, date_column, week_start)
+);
+
+-- ============================================================================
+-- TABLE: rollup_po_status
+-- ============================================================================
+-- One row per purchase order: header fields, line totals and the progress of
+-- the shipments that reference it
+CREATE TABLE IF NOT EXISTS rollup_po_status (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    purchase_order_id TEXT NOT NULL,
+
+    po_description TEXT,
+    supplier TEXT,
+    category TEXT,
+    status TEXT,
+    delivery_date_from DATE,                 -- earliest line delivery date
+    line_count INTEGER NOT NULL DEFAULT 0,
+    net_value NUMERIC(15, 2),
+
+    shipment_count INTEGER NOT NULL DEFAULT 0,
+    delivered_shipments INTEGER NOT NULL DEFAULT 0,
+    in_transit_shipments INTEGER NOT NULL DEFAULT 0,
+    next_eta DATE,                           -- earliest ETA of undelivered shipments
+    last_delivery_date DATE,
+    shipment_status TEXT,                    -- 'Not Shipped', 'Pending', 'In Transit', 'Partially Delivered', 'Delivered'
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, purchase_order_id)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_rollup_group_counts_refreshed ON rollup_group_counts(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_rollup_weekly_deliveries_refreshed ON rollup_weekly_deliveries(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_rollup_po_status_refreshed ON rollup_po_status(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_rollup_po_status_shipment_status ON rollup_po_status(project_id, shipment_status);
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Dashboard Rollup Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - rollup_group_counts (counts and values per status/category/supplier)';
+    RAISE NOTICE '  - rollup_weekly_deliveries (rows per week of each delivery date)';
+    RAISE NOTICE '  - rollup_po_status (one row per purchase order with shipment progress)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Refreshed by: python dashboard_rollups.py (also run by the syncs)';
+END $$;
@@ -0,0 +1,57 @@
+-- ============================================================================
+-- Delivery Risk Scores
+-- ============================================================================
+-- One row per open purchase order line, scored by delivery_risk.py at the end
+-- of each PO/shipment and delivery date sync from purchase_orders, the
+-- shipments that name the PO and the ReadyByDates delivery_date for it.
+-- Each refresh upserts every row with a new refreshed_at, then deletes rows
+-- with an older one, so the table is never empty while a refresh runs.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: delivery_risk_scores
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS delivery_risk_scores (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    purchase_order_id TEXT NOT NULL,
+    purchase_order_item TEXT NOT NULL DEFAULT '',
+    item_uuid TEXT NOT NULL DEFAULT '',
+
+    supplier TEXT,
+    delivery_date_from DATE,                 -- date promised on the PO line
+    shipment_count INTEGER NOT NULL DEFAULT 0,
+    delivered_shipments INTEGER NOT NULL DEFAULT 0,
+    ready_by_date DATE,                      -- earliest ReadyByDates date for the PO
+    expected_date DATE,                      -- latest shipment arrival/ETA, else delivery_date_from; not before today while open
+
+    slip_days INTEGER,                       -- expected_date - delivery_date_from
+    days_late_vs_ready_by INTEGER,           -- expected_date - ready_by_date (positive = late)
+    supplier_late_rate NUMERIC(4, 3),        -- share of the supplier's lines with slip_days > 0
+    risk_score NUMERIC(4, 1) NOT NULL DEFAULT 0,   -- 0-100
+    risk_level TEXT NOT NULL,                -- 'high', 'medium', 'low', 'delivered'
+    scored_on DATE NOT NULL,
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, purchase_order_id, purchase_order_item, item_uuid)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_delivery_risk_refreshed ON delivery_risk_scores(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_delivery_risk_level_score ON delivery_risk_scores(project_id, risk_level, risk_score DESC);
+CREATE INDEX IF NOT EXISTS idx_delivery_risk_supplier ON delivery_risk_scores(project_id, supplier);
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Delivery Risk Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - delivery_risk_scores (slip, ready-by lateness and risk per PO line)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Refreshed by: python delivery_risk.py (also run by the syncs)';
+END $$;
@@ -0,0 +1,78 @@
+-- ============================================================================
+-- Geofence Arrival/Departure Events
+-- ============================================================================
+-- Compact event stream written by sync_samsara_data.py. Each row marks a
+-- tracker arriving at or departing from a geofence zone.
+-- Run this after geofence_schema.sql
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: samsara_geofence_events
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS samsara_geofence_events (
+    id BIGSERIAL PRIMARY KEY,
+    tracker_id TEXT NOT NULL REFERENCES samsara_trackers(id) ON DELETE CASCADE,
+    zone_id TEXT NOT NULL REFERENCES geofences(id) ON DELETE CASCADE,
+    event_type TEXT NOT NULL CHECK (event_type IN ('arrival', 'departure')),
+
+    -- First fix that confirmed the change
+    happened_at TIMESTAMPTZ NOT NULL,
+    latitude NUMERIC(10, 7),
+    longitude NUMERIC(10, 7),
+    accuracy_meters NUMERIC(10, 2),
+
+    -- TRUE when the tracker was already inside on its first sighting, so
+    -- the real arrival happened before we had data
+    is_initial BOOLEAN NOT NULL DEFAULT FALSE,
+
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    -- Re-running a sync window must not duplicate events
+    UNIQUE(tracker_id, zone_id, event_type, happened_at)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+-- "Latest events for this tracker" / "what arrived in this zone recently"
+CREATE INDEX IF NOT EXISTS idx_geofence_events_tracker_time
+    ON samsara_geofence_events(tracker_id, happened_at DESC);
+CREATE INDEX IF NOT EXISTS idx_geofence_events_zone_time
+    ON samsara_geofence_events(zone_id, happened_at DESC);
+CREATE INDEX IF NOT EXISTS idx_geofence_events_tracker_zone_time
+    ON samsara_geofence_events(tracker_id, zone_id, happened_at DESC);
+
+-- ============================================================================
+-- VIEW: Current presence per tracker and zone
+-- ============================================================================
+-- Latest event per (tracker, zone). The sync loads this as the starting
+-- state for its state machine; dashboards use it for "arrived at" times.
+CREATE OR REPLACE VIEW vw_samsara_zone_presence AS
+SELECT DISTINCT ON (e.tracker_id, e.zone_id)
+    e.tracker_id,
+    t.name AS tracker_name,
+    e.zone_id,
+    g.name AS zone_name,
+    g.kind AS zone_kind,
+    e.event_type,
+    e.happened_at,
+    e.is_initial,
+    (e.event_type = 'arrival') AS is_inside
+FROM samsara_geofence_events e
+JOIN samsara_trackers t ON t.id = e.tracker_id
+JOIN geofences g ON g.id = e.zone_id
+ORDER BY e.tracker_id, e.zone_id, e.happened_at DESC;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Geofence Events Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - samsara_geofence_events (arrival/departure stream)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Views created:';
+    RAISE NOTICE '  - vw_samsara_zone_presence (latest event per tracker and zone)';
+END $$;
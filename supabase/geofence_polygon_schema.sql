@@ -0,0 +1,130 @@
+-- ============================================================================
+-- Polygon Geofences
+-- ============================================================================
+-- Lets geofences be drawn as polygons instead of circles, and records which
+-- zones a fix is ambiguous for given its reported accuracy.
+-- Run this after geofence_schema.sql, then run backfill_geofences.py
+-- ============================================================================
+
+-- ============================================================================
+-- COLUMNS: polygon outline on geofences
+-- ============================================================================
+-- Outline as [[lat, lon], ...] (or a GeoJSON Polygon). Circles keep using
+-- center + radius_km; a polygon zone may leave both NULL.
+ALTER TABLE geofences ADD COLUMN IF NOT EXISTS polygon JSONB;
+ALTER TABLE geofences ALTER COLUMN radius_km DROP NOT NULL;
+ALTER TABLE geofences ALTER COLUMN center_latitude DROP NOT NULL;
+ALTER TABLE geofences ALTER COLUMN center_longitude DROP NOT NULL;
+
+ALTER TABLE geofences DROP CONSTRAINT IF EXISTS geofences_shape_check;
+ALTER TABLE geofences ADD CONSTRAINT geofences_shape_check CHECK (
+    polygon IS NOT NULL
+    OR (radius_km IS NOT NULL AND center_latitude IS NOT NULL AND center_longitude IS NOT NULL)
+);
+
+-- ============================================================================
+-- COLUMNS: accuracy-aware classification
+-- ============================================================================
+-- Zones whose fence line lies within a fix's accuracyMeters radius
+ALTER TABLE samsara_trackers ADD COLUMN IF NOT EXISTS uncertain_zone_ids TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE samsara_location_history ADD COLUMN IF NOT EXISTS uncertain_zone_ids TEXT[] NOT NULL DEFAULT '{}';
+
+-- ============================================================================
+-- FUNCTION: Point in polygon
+-- ============================================================================
+-- Even-odd ray casting, the same test as geofence.points_in_polygon. Accepts
+-- the formats geofence.py does: [[lat, lon], ...], a GeoJSON Polygon (outer
+-- ring as [lon, lat]), or either one stored as a JSON string.
+CREATE OR REPLACE FUNCTION geofence_polygon_contains(
+    p_polygon JSONB,
+    p_lat NUMERIC,
+    p_lon NUMERIC
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    ring JSONB := p_polygon;
+    lat_index INTEGER := 0;
+    lon_index INTEGER := 1;
+    vertex_count INTEGER;
+    lat_i DOUBLE PRECISION;
+    lon_i DOUBLE PRECISION;
+    lat_j DOUBLE PRECISION;
+    lon_j DOUBLE PRECISION;
+    inside BOOLEAN := FALSE;
+BEGIN
+    IF ring IS NULL OR p_lat IS NULL OR p_lon IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    IF jsonb_typeof(ring) = 'string' THEN
+        ring := (ring #>> '{}')::jsonb;
+    END IF;
+    IF jsonb_typeof(ring) = 'object' THEN
+        ring := ring -> 'coordinates' -> 0;
+        lat_index := 1;
+        lon_index := 0;
+    END IF;
+
+    vertex_count := jsonb_array_length(ring);
+    IF vertex_count < 3 THEN
+        RETURN FALSE;
+    END IF;
+
+    lat_j := (ring -> (vertex_count - 1) ->> lat_index)::double precision;
+    lon_j := (ring -> (vertex_count - 1) ->> lon_index)::double precision;
+    FOR i IN 0 .. vertex_count - 1 LOOP
+        lat_i := (ring -> i ->> lat_index)::double precision;
+        lon_i := (ring -> i ->> lon_index)::double precision;
+        IF (lat_i > p_lat) <> (lat_j > p_lat) THEN
+            IF p_lon < (lon_j - lon_i) * (p_lat - lat_i) / (lat_j - lat_i) + lon_i THEN
+                inside := NOT inside;
+            END IF;
+        END IF;
+        lat_j := lat_i;
+        lon_j := lon_i;
+    END LOOP;
+
+    RETURN inside;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- ============================================================================
+-- FUNCTION: Zones containing a point (circles and polygons)
+-- ============================================================================
+-- Replaces the circle-only version from geofence_schema.sql. As in
+-- geofence.py, a zone with a polygon is tested against the polygon and its
+-- radius is ignored.
+CREATE OR REPLACE FUNCTION geofence_zone_ids(
+    tracker_lat NUMERIC,
+    tracker_lon NUMERIC
+)
+RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(g.id ORDER BY g.id), '{}')
+    FROM geofences g
+    WHERE g.is_active
+      AND CASE
+              WHEN g.polygon IS NOT NULL THEN geofence_polygon_contains(g.polygon, tracker_lat, tracker_lon)
+              ELSE calculate_distance_from_site(tracker_lat, tracker_lon, g.center_latitude, g.center_longitude)
+                   <= g.radius_km
+          END;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Polygon Geofence Schema Applied!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Columns added:';
+    RAISE NOTICE '  - geofences.polygon';
+    RAISE NOTICE '  - samsara_trackers.uncertain_zone_ids';
+    RAISE NOTICE '  - samsara_location_history.uncertain_zone_ids';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - geofence_polygon_contains(polygon, lat, lon)';
+    RAISE NOTICE '  - geofence_zone_ids(lat, lon) now also matches polygon zones';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Next steps:';
+    RAISE NOTICE '  1. Draw site outlines into geofences.polygon';
+    RAISE NOTICE '  2. Run backfill_geofences.py to reclassify stored history';
+END $$;
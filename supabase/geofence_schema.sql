@@ -0,0 +1,101 @@
+-- ============================================================================
+-- Geofence Registry Schema
+-- ============================================================================
+-- Adds a registry of geofence zones (sites, fab shops, laydown areas, rail
+-- yards) and zone_ids columns on tracker and location history rows.
+-- Run this after samsara_schema.sql
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: geofences
+-- ============================================================================
+-- Each row is a circular zone. sync_samsara_data.py loads all active zones
+-- into an in-memory grid index and stores matching zone IDs on every fix.
+CREATE TABLE IF NOT EXISTS geofences (
+    id TEXT PRIMARY KEY,                     -- Short stable ID (e.g. 'frame-6b-site')
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'site',       -- site, fab_shop, laydown, rail_yard
+    site_name TEXT,                          -- Project site the zone belongs to
+
+    -- Circle definition
+    center_latitude NUMERIC(10, 7) NOT NULL,
+    center_longitude NUMERIC(10, 7) NOT NULL,
+    radius_km NUMERIC(10, 3) NOT NULL CHECK (radius_km > 0),
+
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+
+    -- Timestamps
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_geofences_kind ON geofences(kind);
+CREATE INDEX IF NOT EXISTS idx_geofences_active ON geofences(is_active);
+
+-- Seed the original Frame 6B site circle (matches SITE_* in sync_samsara_data.py)
+INSERT INTO geofences (id, name, kind, site_name, center_latitude, center_longitude, radius_km)
+VALUES ('frame-6b-site', 'Frame 6B Site', 'site', 'Frame 6B Power Group', 35.293, -101.603, 0.5)
+ON CONFLICT (id) DO NOTHING;
+
+-- ============================================================================
+-- COLUMNS: zone_ids on trackers and history
+-- ============================================================================
+ALTER TABLE samsara_trackers ADD COLUMN IF NOT EXISTS zone_ids TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE samsara_location_history ADD COLUMN IF NOT EXISTS zone_ids TEXT[] NOT NULL DEFAULT '{}';
+
+-- GIN indexes answer "which trackers are in zone X" with zone_ids @> '{X}'
+CREATE INDEX IF NOT EXISTS idx_samsara_trackers_zone_ids ON samsara_trackers USING GIN (zone_ids);
+CREATE INDEX IF NOT EXISTS idx_samsara_location_zone_ids ON samsara_location_history USING GIN (zone_ids);
+
+-- ============================================================================
+-- TRIGGER: Update timestamp
+-- ============================================================================
+CREATE OR REPLACE FUNCTION update_geofences_timestamp()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_geofences_timestamp ON geofences;
+CREATE TRIGGER trigger_update_geofences_timestamp
+    BEFORE UPDATE ON geofences
+    FOR EACH ROW
+    EXECUTE FUNCTION update_geofences_timestamp();
+
+-- ============================================================================
+-- FUNCTION: Zones containing a point
+-- ============================================================================
+-- Server-side equivalent of GeofenceIndex.classify for ad-hoc queries.
+-- Circles only here; geofence_polygon_schema.sql replaces it with a version
+-- that also matches polygon zones.
+CREATE OR REPLACE FUNCTION geofence_zone_ids(
+    tracker_lat NUMERIC,
+    tracker_lon NUMERIC
+)
+RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(g.id ORDER BY g.id), '{}')
+    FROM geofences g
+    WHERE g.is_active
+      AND calculate_distance_from_site(tracker_lat, tracker_lon, g.center_latitude, g.center_longitude) <= g.radius_km;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Geofence Registry Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - geofences (zone registry, seeded with frame-6b-site)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Columns added:';
+    RAISE NOTICE '  - samsara_trackers.zone_ids';
+    RAISE NOTICE '  - samsara_location_history.zone_ids';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Next steps:';
+    RAISE NOTICE '  1. Insert fab shops, laydown areas and rail yards into geofences';
+    RAISE NOTICE '  2. Run sync_samsara_data.py to classify tracker fixes';
+END $$;
@@ -0,0 +1,52 @@
+-- ============================================================================
+-- Material Link Suggestions
+-- ============================================================================
+-- Ranked installation audit items (dashboard_data/audit_data.json) for each
+-- purchase order line that has no material_links row yet, written by
+-- material_matcher.py. material-tracking.html can offer these instead of a
+-- search across every audit item.
+-- Each refresh upserts every row with a new refreshed_at, then deletes rows
+-- with an older one, so the table is never empty while a refresh runs.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: material_link_suggestions
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS material_link_suggestions (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    po_id TEXT NOT NULL,                     -- purchase_orders.purchase_order_id
+    po_line_item INTEGER NOT NULL DEFAULT 0, -- purchase_orders.purchase_order_item
+    install_ref TEXT NOT NULL,               -- '<discipline>:<REC_NO>' of the audit item
+
+    rank INTEGER NOT NULL,                   -- 1 = best match for the PO line
+    score NUMERIC(4, 3) NOT NULL,            -- 0-1, idf-weighted token overlap
+    install_tag TEXT,                        -- SCHED_ID, as material_links.install_tag
+    install_discipline TEXT,                 -- 'Civil', 'Electrical', 'Instrumentation', 'Mechanical', 'Steel'
+    install_description TEXT,
+    drawing TEXT,                            -- audit DWG
+    matched_terms TEXT[],                    -- tokens both sides share
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, po_id, po_line_item, install_ref)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_material_suggestions_refreshed ON material_link_suggestions(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_material_suggestions_po ON material_link_suggestions(project_id, po_id, po_line_item, rank);
+CREATE INDEX IF NOT EXISTS idx_material_suggestions_install ON material_link_suggestions(project_id, install_ref);
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Material Link Suggestion Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - material_link_suggestions (ranked audit items per PO line)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Refreshed by: python material_matcher.py (also run by sync_orchestrator.py)';
+END $$;
@@ -0,0 +1,321 @@
+-- ============================================================================
+-- Materialized Dashboard Views
+-- ============================================================================
+-- The hot vw_* views used to re-run their joins and sorts on every page
+-- view. Each one is now backed by an indexed mv_* materialized view that the
+-- syncs refresh right after the data under it changes, and the vw_* view is
+-- redefined as a plain read of it, so existing readers need no change:
+--
+--     vw_po_summary               <- mv_po_summary               (PO sync)
+--     vw_shipment_summary         <- mv_shipment_summary         (shipment sync)
+--     vw_recent_activity          <- mv_recent_activity          (PO + shipment syncs)
+--     vw_shipment_visibility      <- mv_shipment_visibility      (shipment sync)
+--     vw_delivery_dates_with_po   <- mv_delivery_dates_with_po   (PO + delivery date syncs)
+--     vw_active_samsara_trackers  <- mv_active_samsara_trackers  (Samsara sync)
+--
+-- refresh_materialized_views() refreshes them CONCURRENTLY (readers keep the
+-- old contents until the new ones are ready) and logs each refresh to
+-- mv_refresh_log.
+-- Run this in Supabase SQL Editor after po_shipment_schema.sql,
+-- delivery_dates_schema.sql, inventory_schema.sql, samsara_schema.sql and
+-- po_delivery_join.sql. Safe to re-run. Re-running one of those schema files
+-- puts its view back to the plain definition; run this file again afterwards.
+-- ============================================================================
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_po_summary
+-- ============================================================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_po_summary AS
+SELECT
+    COUNT(DISTINCT purchase_order_id) as total_pos,
+    SUM(net_value) as total_po_value,
+    COUNT(*) as total_line_items,
+    COUNT(DISTINCT supplier) as total_suppliers,
+    status,
+    COUNT(*) as count_by_status
+FROM purchase_orders
+GROUP BY status;
+
+-- REFRESH ... CONCURRENTLY needs a unique index covering every row
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_po_summary_status
+    ON mv_po_summary(status) NULLS NOT DISTINCT;
+
+CREATE OR REPLACE VIEW vw_po_summary AS
+SELECT total_pos, total_po_value, total_line_items, total_suppliers, status, count_by_status
+FROM mv_po_summary;
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_shipment_summary
+-- ============================================================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_shipment_summary AS
+SELECT
+    COUNT(*) as total_shipments,
+    status,
+    COUNT(*) as count_by_status,
+    category,
+    COUNT(*) as count_by_category
+FROM shipments
+GROUP BY status, category;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_shipment_summary_key
+    ON mv_shipment_summary(status, category) NULLS NOT DISTINCT;
+
+CREATE OR REPLACE VIEW vw_shipment_summary AS
+SELECT total_shipments, status, count_by_status, category, count_by_category
+FROM mv_shipment_summary;
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_recent_activity
+-- ============================================================================
+-- activity_rank keeps the original ORDER BY and gives each row a unique key
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_recent_activity AS
+SELECT
+    ROW_NUMBER() OVER (ORDER BY last_changed DESC NULLS LAST, type, identifier) AS activity_rank,
+    a.*
+FROM (
+    SELECT
+        'PO' as type,
+        purchase_order_id as identifier,
+        po_description as description,
+        status,
+        item_last_change_date_time as last_changed,
+        synced_at
+    FROM purchase_orders
+    WHERE item_last_change_date_time IS NOT NULL
+    UNION ALL
+    SELECT
+        'Shipment' as type,
+        shipment_number as identifier,
+        part_description as description,
+        status,
+        COALESCE(delivery_date, eta, rts_date)::timestamptz as last_changed,
+        synced_at
+    FROM shipments
+    ORDER BY last_changed DESC NULLS LAST
+    LIMIT 100
+) a;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_recent_activity_rank
+    ON mv_recent_activity(activity_rank);
+
+CREATE OR REPLACE VIEW vw_recent_activity AS
+SELECT type, identifier, description, status, last_changed, synced_at
+FROM mv_recent_activity
+ORDER BY activity_rank;
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_shipment_visibility
+-- ============================================================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_shipment_visibility AS
+SELECT
+    id,
+    shipment_number,
+    cargo_description,
+    mode,
+    ship_type,
+    origin,
+    destination,
+    status,
+    delivery_date AS date_delivered,
+    eta AS date_delivered_est,
+    rts_date AS date_shipped,
+    supplier,
+    category,
+    num_pieces,
+    part_description
+FROM shipments;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_shipment_visibility_id
+    ON mv_shipment_visibility(id);
+CREATE INDEX IF NOT EXISTS idx_mv_shipment_visibility_delivered
+    ON mv_shipment_visibility(date_delivered DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_mv_shipment_visibility_status
+    ON mv_shipment_visibility(status);
+
+CREATE OR REPLACE VIEW vw_shipment_visibility AS
+SELECT
+    id, shipment_number, cargo_description, mode, ship_type, origin, destination, status,
+    date_delivered, date_delivered_est, date_shipped, supplier, category, num_pieces, part_description
+FROM mv_shipment_visibility
+ORDER BY date_delivered DESC NULLS LAST;
+
+-- ============================================================================
+-- VIEW: vw_delivery_dates_with_po (mv_delivery_dates_with_po)
+-- ============================================================================
+-- The materialized view and its indexes are in po_delivery_join.sql. It has
+-- one extra column (po_line_id), so the view is dropped and recreated.
+DROP VIEW IF EXISTS vw_delivery_dates_with_po;
+CREATE VIEW vw_delivery_dates_with_po AS
+SELECT * FROM mv_delivery_dates_with_po;
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_active_samsara_trackers
+-- ============================================================================
+-- Materializes the tracker <-> material_links join. The status and
+-- hours_since_last_seen columns depend on NOW(), so vw_active_samsara_trackers
+-- still computes those per read (no join, no sort beyond the index).
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_active_samsara_trackers AS
+SELECT
+    t.id,
+    t.name,
+    t.share_link,
+    t.last_latitude,
+    t.last_longitude,
+    t.last_accuracy_meters,
+    t.last_seen_at,
+    t.is_on_site,
+    t.distance_from_site_km,
+    t.linked_material_id,
+
+    -- Material link info (if linked)
+    ml.po_id,
+    ml.install_tag,
+    ml.material_status,
+
+    t.synced_at,
+    t.updated_at
+FROM
+    samsara_trackers t
+LEFT JOIN
+    material_links ml ON t.linked_material_id = ml.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_active_samsara_trackers_id
+    ON mv_active_samsara_trackers(id);
+CREATE INDEX IF NOT EXISTS idx_mv_active_samsara_trackers_last_seen
+    ON mv_active_samsara_trackers(last_seen_at DESC NULLS LAST);
+
+CREATE OR REPLACE VIEW vw_active_samsara_trackers AS
+SELECT
+    id,
+    name,
+    share_link,
+    last_latitude,
+    last_longitude,
+    last_accuracy_meters,
+    last_seen_at,
+    is_on_site,
+    distance_from_site_km,
+    linked_material_id,
+    po_id,
+    install_tag,
+    material_status,
+
+    -- Status classification
+    CASE
+        WHEN last_seen_at IS NULL THEN 'No Data'
+        WHEN last_seen_at < NOW() - INTERVAL '7 days' THEN 'Stale'
+        WHEN is_on_site THEN 'On Site'
+        ELSE 'In Transit'
+    END as status,
+
+    -- Time since last seen
+    EXTRACT(EPOCH FROM (NOW() - last_seen_at)) / 3600 as hours_since_last_seen,
+
+    synced_at,
+    updated_at
+FROM mv_active_samsara_trackers
+ORDER BY last_seen_at DESC NULLS LAST;
+
+-- ============================================================================
+-- TABLE: mv_refresh_log
+-- ============================================================================
+-- One row per refresh of one materialized view
+CREATE TABLE IF NOT EXISTS mv_refresh_log (
+    id BIGSERIAL PRIMARY KEY,
+    view_name TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    duration_s NUMERIC(12, 3) NOT NULL,
+    row_count BIGINT,
+    success BOOLEAN NOT NULL,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_mv_refresh_log_view_started ON mv_refresh_log(view_name, started_at DESC);
+
+-- ============================================================================
+-- FUNCTION: refresh_materialized_views(p_views)
+-- ============================================================================
+-- Refreshes each named public mv_* materialized view concurrently and logs
+-- it. A view that fails to refresh is logged and skipped; the others still
+-- run. Returns {"mv_name": {"seconds": .., "rows": ..}} or, for a failed
+-- view, {"mv_name": {"seconds": .., "error": ".."}}.
+-- SECURITY DEFINER because only the owner may refresh a materialized view.
+CREATE OR REPLACE FUNCTION refresh_materialized_views(p_views TEXT[])
+RETURNS JSONB AS $$
+DECLARE
+    v_view TEXT;
+    v_started TIMESTAMPTZ;
+    v_seconds NUMERIC;
+    v_rows BIGINT;
+    v_result JSONB := '{}';
+BEGIN
+    FOREACH v_view IN ARRAY p_views LOOP
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_matviews
+            WHERE schemaname = 'public' AND matviewname = v_view AND v_view LIKE 'mv\_%'
+        ) THEN
+            v_result := v_result || jsonb_build_object(v_view, jsonb_build_object(
+                'seconds', 0, 'error', 'not a public mv_* materialized view'));
+            CONTINUE;
+        END IF;
+
+        v_started := clock_timestamp();
+        BEGIN
+            EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY public.%I', v_view);
+            EXECUTE format('SELECT COUNT(*) FROM public.%I', v_view) INTO v_rows;
+            v_seconds := ROUND(EXTRACT(EPOCH FROM clock_timestamp() - v_started)::numeric, 3);
+
+            INSERT INTO mv_refresh_log (view_name, started_at, duration_s, row_count, success)
+            VALUES (v_view, v_started, v_seconds, v_rows, TRUE);
+            v_result := v_result || jsonb_build_object(v_view, jsonb_build_object(
+                'seconds', v_seconds, 'rows', v_rows));
+        EXCEPTION WHEN OTHERS THEN
+            v_seconds := ROUND(EXTRACT(EPOCH FROM clock_timestamp() - v_started)::numeric, 3);
+            INSERT INTO mv_refresh_log (view_name, started_at, duration_s, success, error)
+            VALUES (v_view, v_started, v_seconds, FALSE, SQLERRM);
+            v_result := v_result || jsonb_build_object(v_view, jsonb_build_object(
+                'seconds', v_seconds, 'error', SQLERRM));
+        END;
+    END LOOP;
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============================================================================
+-- VIEW: Refresh duration percentiles per materialized view
+-- ============================================================================
+CREATE OR REPLACE VIEW vw_mv_refresh_percentiles AS
+SELECT
+    view_name,
+    date_trunc('week', started_at)::date AS week,
+    COUNT(*) AS refreshes,
+    COUNT(*) FILTER (WHERE NOT success) AS failed_refreshes,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_s) AS p50_s,
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_s) AS p95_s,
+    MAX(row_count) AS max_rows
+FROM mv_refresh_log
+GROUP BY view_name, date_trunc('week', started_at)::date
+ORDER BY view_name, week DESC;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Materialized Dashboard Views Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Materialized views created:';
+    RAISE NOTICE '  - mv_po_summary, mv_shipment_summary, mv_recent_activity';
+    RAISE NOTICE '  - mv_shipment_visibility, mv_active_samsara_trackers';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Views now reading them:';
+    RAISE NOTICE '  - vw_po_summary, vw_shipment_summary, vw_recent_activity';
+    RAISE NOTICE '  - vw_shipment_visibility, vw_delivery_dates_with_po, vw_active_samsara_trackers';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - mv_refresh_log (one row per refresh)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - refresh_materialized_views(p_views) (called by the syncs)';
+END $$;
@@ -0,0 +1,133 @@
+-- ============================================================================
+-- Dashboard Metrics History
+-- ============================================================================
+-- dashboard_metrics holds one row that every refresh overwrites. This keeps
+-- its history: metrics_history.py appends a row after each refresh, keyed by
+-- the sync run that triggered it (dataset + run_started_at, as in sync_runs).
+--
+-- Rows are delta-encoded. The JSONB columns of dashboard_metrics are
+-- flattened to metric paths ('procurement.total_po_value',
+-- 'status_counts.po_status.Sent'); a row stores only the paths whose value
+-- changed since the previous row, plus the paths that were removed. Every
+-- 50th row is a keyframe holding every path.
+--
+-- metric_series() returns one path downsampled to at most p_points buckets.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: dashboard_metrics_history
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS dashboard_metrics_history (
+    id BIGSERIAL PRIMARY KEY,
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    dataset TEXT NOT NULL,                   -- sync_runs.dataset of the triggering run
+    run_started_at TIMESTAMPTZ NOT NULL,     -- sync_runs.started_at of the triggering run
+    captured_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    is_keyframe BOOLEAN NOT NULL DEFAULT FALSE,
+    changes JSONB NOT NULL DEFAULT '{}',     -- {"metric.path": new value}; every path on keyframes
+    removed TEXT[] NOT NULL DEFAULT '{}',    -- paths no longer present
+    changed_count INTEGER NOT NULL DEFAULT 0,
+
+    UNIQUE (project_id, dataset, run_started_at)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_metrics_history_captured ON dashboard_metrics_history(project_id, captured_at);
+CREATE INDEX IF NOT EXISTS idx_metrics_history_keyframes ON dashboard_metrics_history(project_id, id) WHERE is_keyframe;
+-- "changes ? path" finds the rows that touch one metric
+CREATE INDEX IF NOT EXISTS idx_metrics_history_changes ON dashboard_metrics_history USING GIN (changes);
+
+-- ============================================================================
+-- FUNCTION: metric_series
+-- ============================================================================
+-- Downsampled series for one metric path between p_from and p_to (defaults:
+-- first row, now). The range is cut into p_points equal buckets; each bucket
+-- that has a change returns its last value (which holds until the next
+-- bucket), and for numeric metrics the min and max seen in it. The value in
+-- effect at p_from is carried in as the first sample, so a metric that has
+-- not changed for months still starts the chart.
+CREATE OR REPLACE FUNCTION metric_series(
+    p_path TEXT,
+    p_from TIMESTAMPTZ DEFAULT NULL,
+    p_to TIMESTAMPTZ DEFAULT NULL,
+    p_points INTEGER DEFAULT 200,
+    p_project_id UUID DEFAULT '00000000-0000-0000-0000-000000000000'
+)
+RETURNS TABLE (
+    bucket_start TIMESTAMPTZ,
+    value JSONB,
+    min_value NUMERIC,
+    max_value NUMERIC,
+    samples INTEGER
+) AS $$
+DECLARE
+    v_from TIMESTAMPTZ;
+    v_to TIMESTAMPTZ := COALESCE(p_to, NOW());
+    v_width DOUBLE PRECISION;
+BEGIN
+    v_from := COALESCE(p_from, (
+        SELECT MIN(h.captured_at) FROM dashboard_metrics_history h WHERE h.project_id = p_project_id
+    ));
+    IF v_from IS NULL OR v_from >= v_to OR p_points < 1 THEN
+        RETURN;
+    END IF;
+    v_width := EXTRACT(EPOCH FROM v_to - v_from) / p_points;
+
+    RETURN QUERY
+    WITH touched AS (
+        -- The last change before the range, clamped to its start
+        (SELECT v_from AS changed_at, h.id, h.changes -> p_path AS val
+         FROM dashboard_metrics_history h
+         WHERE h.project_id = p_project_id
+           AND h.captured_at < v_from
+           AND (h.changes ? p_path OR p_path = ANY(h.removed))
+         ORDER BY h.captured_at DESC, h.id DESC
+         LIMIT 1)
+        UNION ALL
+        SELECT h.captured_at, h.id, h.changes -> p_path
+        FROM dashboard_metrics_history h
+        WHERE h.project_id = p_project_id
+          AND h.captured_at >= v_from
+          AND h.captured_at <= v_to
+          AND (h.changes ? p_path OR p_path = ANY(h.removed))
+    ),
+    bucketed AS (
+        SELECT
+            LEAST(FLOOR(EXTRACT(EPOCH FROM t.changed_at - v_from) / v_width)::INTEGER, p_points - 1) AS bucket,
+            t.changed_at,
+            t.id,
+            t.val,
+            CASE WHEN jsonb_typeof(t.val) = 'number' THEN (t.val #>> '{}')::NUMERIC END AS num
+        FROM touched t
+    )
+    SELECT
+        v_from + make_interval(secs => b.bucket * v_width) AS bucket_start,
+        (ARRAY_AGG(b.val ORDER BY b.changed_at DESC, b.id DESC))[1] AS value,
+        MIN(b.num) AS min_value,
+        MAX(b.num) AS max_value,
+        COUNT(*)::INTEGER AS samples
+    FROM bucketed b
+    GROUP BY b.bucket
+    ORDER BY b.bucket;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Metrics History Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - dashboard_metrics_history (delta-encoded dashboard_metrics per sync run)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - metric_series(path, from, to, points)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Recorded by: python metrics_history.py record (also run after refresh_dashboard_metrics)';
+END $$;
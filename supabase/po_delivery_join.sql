@@ -0,0 +1,73 @@
+-- ============================================================================
+-- PO <-> Delivery Date Join
+-- ============================================================================
+-- Materialized copy of vw_delivery_dates_with_po, refreshed by the PO and
+-- delivery-date syncs through refresh_materialized_views()
+-- (materialized_views.sql), so readers no longer pay for the join on every
+-- query. refresh_po_delivery_join() refreshes just this view by hand.
+-- Run this in Supabase SQL Editor after po_shipment_schema.sql and
+-- delivery_dates_schema.sql. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- MATERIALIZED VIEW: mv_delivery_dates_with_po
+-- ============================================================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_delivery_dates_with_po AS
+SELECT
+    d.*,
+    COALESCE(p.id, 0) AS po_line_id,       -- 0 when no PO line matches
+    p.purchase_order_id,
+    p.po_description,
+    p.supplier AS po_supplier,
+    p.status AS po_status,
+    p.delivery_date_from AS po_delivery_date
+FROM delivery_dates d
+LEFT JOIN purchase_orders p ON d.po_number = p.purchase_order_id;
+
+-- REFRESH ... CONCURRENTLY needs a unique index covering every row
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_delivery_dates_with_po_key
+    ON mv_delivery_dates_with_po(id, po_line_id);
+CREATE INDEX IF NOT EXISTS idx_mv_delivery_dates_with_po_po_number
+    ON mv_delivery_dates_with_po(po_number);
+CREATE INDEX IF NOT EXISTS idx_mv_delivery_dates_with_po_delivery_date
+    ON mv_delivery_dates_with_po(delivery_date);
+
+-- ============================================================================
+-- FUNCTION: refresh_po_delivery_join()
+-- ============================================================================
+-- Readers keep seeing the previous contents while the refresh runs.
+-- SECURITY DEFINER because only the owner may refresh a materialized view.
+CREATE OR REPLACE FUNCTION refresh_po_delivery_join()
+RETURNS JSONB AS $$
+DECLARE
+    v_started TIMESTAMPTZ := clock_timestamp();
+    v_rows BIGINT;
+    v_matched BIGINT;
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_delivery_dates_with_po;
+
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE po_line_id <> 0)
+    INTO v_rows, v_matched
+    FROM mv_delivery_dates_with_po;
+
+    RETURN jsonb_build_object(
+        'rows', v_rows,
+        'matched_rows', v_matched,
+        'seconds', ROUND(EXTRACT(EPOCH FROM clock_timestamp() - v_started)::numeric, 3)
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ PO <-> Delivery Join Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Materialized views created:';
+    RAISE NOTICE '  - mv_delivery_dates_with_po (delivery dates joined to PO lines)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - refresh_po_delivery_join() (manual refresh of this view)';
+END $$;
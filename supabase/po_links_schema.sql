@@ -0,0 +1,77 @@
+-- ============================================================================
+-- PO <-> Shipment Links
+-- ============================================================================
+-- Written by po_links.py after each PO/shipment sync. shipments.po_number is
+-- free text ('15461', 'PO# 15461-02', '15461 / 15462'); the sync normalizes
+-- it once and stores the result here, so pages look up a PO's shipments (or a
+-- shipment's POs) through an index instead of joining and normalizing in the
+-- browser. Each refresh upserts with a new refreshed_at and then deletes rows
+-- with an older one, so the tables are never empty mid-refresh.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: po_shipment_links
+-- ============================================================================
+-- One row per (purchase order, shipment) pair. A multi-PO cell gives one row
+-- per PO, numbered by position. purchase_order_id is the purchase_orders
+-- value when matched, else the normalized number from the shipment.
+CREATE TABLE IF NOT EXISTS po_shipment_links (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    purchase_order_id TEXT NOT NULL,
+    shipment_number TEXT NOT NULL,
+
+    position INTEGER NOT NULL DEFAULT 0,     -- order of the PO within the shipment's cell
+    po_number_raw TEXT,                      -- shipments.po_number as written in the log
+    matched BOOLEAN NOT NULL DEFAULT FALSE,  -- TRUE when a purchase_orders line has this PO
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, purchase_order_id, shipment_number)
+);
+
+-- ============================================================================
+-- TABLE: po_shipment_totals
+-- ============================================================================
+-- One row per linked purchase order with the aggregates of its shipments
+CREATE TABLE IF NOT EXISTS po_shipment_totals (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    purchase_order_id TEXT NOT NULL,
+    matched BOOLEAN NOT NULL DEFAULT FALSE,
+
+    shipment_count INTEGER NOT NULL DEFAULT 0,
+    delivered_shipments INTEGER NOT NULL DEFAULT 0,
+    in_transit_shipments INTEGER NOT NULL DEFAULT 0,
+    total_pieces INTEGER NOT NULL DEFAULT 0,
+    first_rts_date DATE,
+    next_eta DATE,                           -- earliest ETA of undelivered shipments
+    last_delivery_date DATE,
+    shipment_status TEXT,                    -- 'Pending', 'In Transit', 'Partially Delivered', 'Delivered'
+    shipment_numbers TEXT[] NOT NULL DEFAULT '{}',
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, purchase_order_id)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+-- PO -> shipments uses the primary key; shipment -> POs uses this one
+CREATE INDEX IF NOT EXISTS idx_po_shipment_links_shipment ON po_shipment_links(project_id, shipment_number);
+CREATE INDEX IF NOT EXISTS idx_po_shipment_links_unmatched ON po_shipment_links(project_id) WHERE NOT matched;
+CREATE INDEX IF NOT EXISTS idx_po_shipment_links_refreshed ON po_shipment_links(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_po_shipment_totals_refreshed ON po_shipment_totals(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_po_shipment_totals_status ON po_shipment_totals(project_id, shipment_status);
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ PO <-> Shipment Link Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - po_shipment_links (one row per PO/shipment pair)';
+    RAISE NOTICE '  - po_shipment_totals (shipment aggregates per PO)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Refreshed by: python po_links.py (also run by the PO/shipment sync)';
+END $$;
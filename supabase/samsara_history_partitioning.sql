@@ -0,0 +1,456 @@
+-- ============================================================================
+-- Samsara Location History Partitioning & Rollups
+-- ============================================================================
+-- Converts samsara_location_history into a table range-partitioned by month
+-- on happened_at, and adds hourly/daily rollup tables so dashboards never
+-- have to scan raw fixes. Old raw partitions can then be dropped in O(1)
+-- without losing the rollups.
+--
+-- Maintenance (partition creation, rollup refresh, retention) is driven from
+-- Python: python samsara_maintenance.py (or sync_samsara_data.py --maintenance)
+--
+-- Run this after geofence_polygon_schema.sql. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- STEP 1: Convert samsara_location_history to a partitioned table
+-- ============================================================================
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'samsara_location_history'
+    ) THEN
+        RAISE NOTICE 'samsara_location_history is already partitioned';
+        RETURN;
+    END IF;
+
+    ALTER TABLE samsara_location_history RENAME TO samsara_location_history_legacy;
+    ALTER TABLE samsara_location_history_legacy RENAME CONSTRAINT samsara_location_history_pkey
+        TO samsara_location_history_legacy_pkey;
+    ALTER TABLE samsara_location_history_legacy RENAME CONSTRAINT samsara_location_history_tracker_id_happened_at_key
+        TO samsara_location_history_legacy_tracker_id_happened_at_key;
+    DROP INDEX IF EXISTS idx_samsara_location_tracker;
+    DROP INDEX IF EXISTS idx_samsara_location_time;
+    DROP INDEX IF EXISTS idx_samsara_location_on_site;
+    DROP INDEX IF EXISTS idx_samsara_location_zone_ids;
+
+    -- The partition key must be part of every unique constraint, so the
+    -- primary key becomes (id, happened_at). UNIQUE(tracker_id, happened_at)
+    -- already includes it and keeps the sync's upsert target unchanged.
+    CREATE TABLE samsara_location_history (
+        id BIGINT NOT NULL DEFAULT nextval('samsara_location_history_id_seq'),
+        project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+        tracker_id TEXT NOT NULL REFERENCES samsara_trackers(id) ON DELETE CASCADE,
+
+        -- Location data
+        latitude NUMERIC(10, 7) NOT NULL,
+        longitude NUMERIC(10, 7) NOT NULL,
+        accuracy_meters NUMERIC(10, 2),
+        heading_degrees INTEGER,
+
+        -- Timing
+        happened_at TIMESTAMPTZ NOT NULL,
+        received_at TIMESTAMPTZ DEFAULT NOW(),
+
+        -- Calculated fields
+        is_on_site BOOLEAN DEFAULT FALSE,
+        distance_from_site_km NUMERIC(10, 2),
+        zone_ids TEXT[] NOT NULL DEFAULT '{}',
+        uncertain_zone_ids TEXT[] NOT NULL DEFAULT '{}',
+
+        PRIMARY KEY (id, happened_at),
+        UNIQUE (tracker_id, happened_at)
+    ) PARTITION BY RANGE (happened_at);
+
+    ALTER SEQUENCE samsara_location_history_id_seq OWNED BY samsara_location_history.id;
+
+    -- Catches fixes outside every monthly partition (e.g. very old backfills);
+    -- ensure_samsara_history_partitions() moves them out when their month is created
+    CREATE TABLE samsara_location_history_default PARTITION OF samsara_location_history DEFAULT;
+END $$;
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+-- Latest fixes per tracker / trail for one tracker over a time window
+CREATE INDEX IF NOT EXISTS idx_samsara_location_tracker_time
+    ON samsara_location_history(tracker_id, happened_at DESC);
+
+-- Fixes arrive in time order, so a BRIN index covers fleet-wide time range
+-- scans inside a partition at a tiny fraction of a B-tree's size
+CREATE INDEX IF NOT EXISTS idx_samsara_location_time_brin
+    ON samsara_location_history USING BRIN (happened_at);
+
+-- Project-scoped reads from the dashboard (scopeSelect adds project_id=eq.)
+CREATE INDEX IF NOT EXISTS idx_samsara_location_project_time
+    ON samsara_location_history(project_id, happened_at DESC);
+
+-- "Which trackers were in zone X" with zone_ids @> '{X}'
+CREATE INDEX IF NOT EXISTS idx_samsara_location_zone_ids
+    ON samsara_location_history USING GIN (zone_ids);
+
+-- ============================================================================
+-- FUNCTION: Create monthly partitions
+-- ============================================================================
+-- Creates samsara_location_history_yYYYYmMM partitions from p_from through
+-- p_months_ahead months past the current month. Rows already sitting in the
+-- default partition for a new month are moved into it. Runs as the owner
+-- (like refresh_materialized_views) because samsara_maintenance.py calls it
+-- over RPC with the anon key, which cannot run DDL.
+CREATE OR REPLACE FUNCTION ensure_samsara_history_partitions(
+    p_months_ahead INTEGER DEFAULT 3,
+    p_from TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TEXT[] AS $$
+DECLARE
+    month_start TIMESTAMPTZ;
+    month_end TIMESTAMPTZ;
+    last_month TIMESTAMPTZ;
+    partition_name TEXT;
+    created TEXT[] := '{}';
+BEGIN
+    month_start := date_trunc('month', COALESCE(p_from, NOW()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    last_month := date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        + make_interval(months => p_months_ahead);
+
+    WHILE month_start <= last_month LOOP
+        month_end := month_start + INTERVAL '1 month';
+        partition_name := 'samsara_location_history_' || to_char(month_start AT TIME ZONE 'UTC', '"y"YYYY"m"MM');
+
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE samsara_location_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                partition_name
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM samsara_location_history_default
+                                WHERE happened_at >= %L AND happened_at < %L RETURNING *)
+                 INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE samsara_location_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_end
+            );
+            created := created || partition_name;
+        END IF;
+
+        month_start := month_end;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============================================================================
+-- STEP 2: Copy legacy rows into the partitioned table
+-- ============================================================================
+DO $$
+DECLARE
+    oldest TIMESTAMPTZ;
+    copied BIGINT;
+    -- Expression for each copied row's project_id
+    legacy_project TEXT := '''00000000-0000-0000-0000-000000000000''::uuid';
+BEGIN
+    IF to_regclass('samsara_location_history_legacy') IS NULL THEN
+        PERFORM ensure_samsara_history_partitions(3);
+        RETURN;
+    END IF;
+
+    SELECT MIN(happened_at) INTO oldest FROM samsara_location_history_legacy;
+    PERFORM ensure_samsara_history_partitions(3, oldest);
+
+    -- Keep each row's project when the old table was already project-scoped
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND table_name = 'samsara_location_history_legacy'
+          AND column_name = 'project_id'
+    ) THEN
+        legacy_project := 'COALESCE(project_id, ' || legacy_project || ')';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO samsara_location_history (
+            id, project_id, tracker_id, latitude, longitude, accuracy_meters, heading_degrees,
+            happened_at, received_at, is_on_site, distance_from_site_km, zone_ids, uncertain_zone_ids
+        )
+        SELECT
+            id, %s, tracker_id, latitude, longitude, accuracy_meters, heading_degrees,
+            happened_at, received_at, is_on_site, distance_from_site_km, zone_ids, uncertain_zone_ids
+        FROM samsara_location_history_legacy',
+        legacy_project
+    );
+    GET DIAGNOSTICS copied = ROW_COUNT;
+
+    DROP TABLE samsara_location_history_legacy;
+    RAISE NOTICE 'Copied % rows into partitioned samsara_location_history', copied;
+END $$;
+
+-- Rollups are derived data: tables left by a version of this script without
+-- project_id are dropped and rebuilt by the backfill below
+DO $$
+BEGIN
+    IF to_regclass('samsara_location_hourly') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'samsara_location_hourly' AND column_name = 'project_id'
+    ) THEN
+        DROP TABLE samsara_location_hourly;
+        DROP TABLE IF EXISTS samsara_location_daily;
+        RAISE NOTICE 'Dropped rollups without project_id; run the backfill at the end of this script';
+    END IF;
+END $$;
+
+-- ============================================================================
+-- TABLE: samsara_location_hourly
+-- ============================================================================
+-- One row per tracker per UTC hour with at least one fix
+CREATE TABLE IF NOT EXISTS samsara_location_hourly (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    tracker_id TEXT NOT NULL REFERENCES samsara_trackers(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMPTZ NOT NULL,
+
+    fix_count INTEGER NOT NULL,
+    on_site_fix_count INTEGER NOT NULL,
+    first_fix_at TIMESTAMPTZ NOT NULL,
+    last_fix_at TIMESTAMPTZ NOT NULL,
+    last_latitude NUMERIC(10, 7),
+    last_longitude NUMERIC(10, 7),
+    min_distance_from_site_km NUMERIC(10, 2),
+    zone_ids TEXT[] NOT NULL DEFAULT '{}',   -- Every zone seen during the hour
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, tracker_id, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_samsara_location_hourly_bucket
+    ON samsara_location_hourly(project_id, bucket_start DESC);
+
+-- ============================================================================
+-- TABLE: samsara_location_daily
+-- ============================================================================
+-- One row per tracker per site-local (America/Chicago) day
+CREATE TABLE IF NOT EXISTS samsara_location_daily (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    tracker_id TEXT NOT NULL REFERENCES samsara_trackers(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+
+    fix_count INTEGER NOT NULL,
+    on_site_fix_count INTEGER NOT NULL,
+    on_site_hours INTEGER NOT NULL,          -- Hours with at least one on-site fix
+    was_on_site BOOLEAN NOT NULL,
+    first_fix_at TIMESTAMPTZ NOT NULL,
+    last_fix_at TIMESTAMPTZ NOT NULL,
+    last_latitude NUMERIC(10, 7),
+    last_longitude NUMERIC(10, 7),
+    min_distance_from_site_km NUMERIC(10, 2),
+    zone_ids TEXT[] NOT NULL DEFAULT '{}',
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, tracker_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_samsara_location_daily_day
+    ON samsara_location_daily(project_id, day DESC);
+CREATE INDEX IF NOT EXISTS idx_samsara_location_daily_on_site
+    ON samsara_location_daily(project_id, day DESC) WHERE was_on_site;
+
+-- ============================================================================
+-- FUNCTION: Refresh rollups
+-- ============================================================================
+-- Recomputes every hourly bucket at or after p_since, then every local day
+-- touched by those buckets. Idempotent, so overlapping windows are safe.
+CREATE OR REPLACE FUNCTION refresh_samsara_location_rollups(
+    p_since TIMESTAMPTZ DEFAULT NOW() - INTERVAL '48 hours'
+)
+RETURNS JSONB AS $$
+DECLARE
+    bucket_from TIMESTAMPTZ := date_trunc('hour', p_since);
+    day_from DATE := (bucket_from AT TIME ZONE 'America/Chicago')::date;
+    hourly_rows BIGINT;
+    daily_rows BIGINT;
+BEGIN
+    WITH buckets AS (
+        SELECT
+            h.project_id,
+            h.tracker_id,
+            date_trunc('hour', h.happened_at) AS bucket_start,
+            COUNT(*) AS fix_count,
+            COUNT(*) FILTER (WHERE h.is_on_site) AS on_site_fix_count,
+            MIN(h.happened_at) AS first_fix_at,
+            MAX(h.happened_at) AS last_fix_at,
+            (array_agg(h.latitude ORDER BY h.happened_at DESC))[1] AS last_latitude,
+            (array_agg(h.longitude ORDER BY h.happened_at DESC))[1] AS last_longitude,
+            MIN(h.distance_from_site_km) AS min_distance_from_site_km
+        FROM samsara_location_history h
+        WHERE h.happened_at >= bucket_from
+        GROUP BY h.project_id, h.tracker_id, date_trunc('hour', h.happened_at)
+    ),
+    zones AS (
+        SELECT
+            h.project_id,
+            h.tracker_id,
+            date_trunc('hour', h.happened_at) AS bucket_start,
+            array_agg(DISTINCT z.zone_id ORDER BY z.zone_id) AS zone_ids
+        FROM samsara_location_history h
+        CROSS JOIN LATERAL unnest(h.zone_ids) AS z(zone_id)
+        WHERE h.happened_at >= bucket_from
+        GROUP BY h.project_id, h.tracker_id, date_trunc('hour', h.happened_at)
+    )
+    INSERT INTO samsara_location_hourly AS r (
+        project_id, tracker_id, bucket_start, fix_count, on_site_fix_count, first_fix_at, last_fix_at,
+        last_latitude, last_longitude, min_distance_from_site_km, zone_ids, refreshed_at
+    )
+    SELECT
+        b.project_id, b.tracker_id, b.bucket_start, b.fix_count, b.on_site_fix_count, b.first_fix_at, b.last_fix_at,
+        b.last_latitude, b.last_longitude, b.min_distance_from_site_km, COALESCE(z.zone_ids, '{}'), NOW()
+    FROM buckets b
+    LEFT JOIN zones z
+        ON z.project_id = b.project_id AND z.tracker_id = b.tracker_id AND z.bucket_start = b.bucket_start
+    ON CONFLICT (project_id, tracker_id, bucket_start) DO UPDATE SET
+        fix_count = EXCLUDED.fix_count,
+        on_site_fix_count = EXCLUDED.on_site_fix_count,
+        first_fix_at = EXCLUDED.first_fix_at,
+        last_fix_at = EXCLUDED.last_fix_at,
+        last_latitude = EXCLUDED.last_latitude,
+        last_longitude = EXCLUDED.last_longitude,
+        min_distance_from_site_km = EXCLUDED.min_distance_from_site_km,
+        zone_ids = EXCLUDED.zone_ids,
+        refreshed_at = EXCLUDED.refreshed_at;
+    GET DIAGNOSTICS hourly_rows = ROW_COUNT;
+
+    -- Days are rebuilt from the hourly table (not raw history), so a day whose
+    -- raw partition was already dropped keeps its totals
+    WITH days AS (
+        SELECT
+            r.project_id,
+            r.tracker_id,
+            (r.bucket_start AT TIME ZONE 'America/Chicago')::date AS day,
+            SUM(r.fix_count) AS fix_count,
+            SUM(r.on_site_fix_count) AS on_site_fix_count,
+            COUNT(*) FILTER (WHERE r.on_site_fix_count > 0) AS on_site_hours,
+            MIN(r.first_fix_at) AS first_fix_at,
+            MAX(r.last_fix_at) AS last_fix_at,
+            (array_agg(r.last_latitude ORDER BY r.bucket_start DESC))[1] AS last_latitude,
+            (array_agg(r.last_longitude ORDER BY r.bucket_start DESC))[1] AS last_longitude,
+            MIN(r.min_distance_from_site_km) AS min_distance_from_site_km
+        FROM samsara_location_hourly r
+        WHERE (r.bucket_start AT TIME ZONE 'America/Chicago')::date >= day_from
+        GROUP BY r.project_id, r.tracker_id, (r.bucket_start AT TIME ZONE 'America/Chicago')::date
+    ),
+    zones AS (
+        SELECT
+            r.project_id,
+            r.tracker_id,
+            (r.bucket_start AT TIME ZONE 'America/Chicago')::date AS day,
+            array_agg(DISTINCT z.zone_id ORDER BY z.zone_id) AS zone_ids
+        FROM samsara_location_hourly r
+        CROSS JOIN LATERAL unnest(r.zone_ids) AS z(zone_id)
+        WHERE (r.bucket_start AT TIME ZONE 'America/Chicago')::date >= day_from
+        GROUP BY r.project_id, r.tracker_id, (r.bucket_start AT TIME ZONE 'America/Chicago')::date
+    )
+    INSERT INTO samsara_location_daily AS d (
+        project_id, tracker_id, day, fix_count, on_site_fix_count, on_site_hours, was_on_site, first_fix_at, last_fix_at,
+        last_latitude, last_longitude, min_distance_from_site_km, zone_ids, refreshed_at
+    )
+    SELECT
+        x.project_id, x.tracker_id, x.day, x.fix_count, x.on_site_fix_count, x.on_site_hours, x.on_site_hours > 0,
+        x.first_fix_at, x.last_fix_at, x.last_latitude, x.last_longitude, x.min_distance_from_site_km,
+        COALESCE(z.zone_ids, '{}'), NOW()
+    FROM days x
+    LEFT JOIN zones z ON z.project_id = x.project_id AND z.tracker_id = x.tracker_id AND z.day = x.day
+    ON CONFLICT (project_id, tracker_id, day) DO UPDATE SET
+        fix_count = EXCLUDED.fix_count,
+        on_site_fix_count = EXCLUDED.on_site_fix_count,
+        on_site_hours = EXCLUDED.on_site_hours,
+        was_on_site = EXCLUDED.was_on_site,
+        first_fix_at = EXCLUDED.first_fix_at,
+        last_fix_at = EXCLUDED.last_fix_at,
+        last_latitude = EXCLUDED.last_latitude,
+        last_longitude = EXCLUDED.last_longitude,
+        min_distance_from_site_km = EXCLUDED.min_distance_from_site_km,
+        zone_ids = EXCLUDED.zone_ids,
+        refreshed_at = EXCLUDED.refreshed_at;
+    GET DIAGNOSTICS daily_rows = ROW_COUNT;
+
+    RETURN jsonb_build_object('hourly_rows', hourly_rows, 'daily_rows', daily_rows);
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- FUNCTION: Drop raw partitions past retention
+-- ============================================================================
+-- Drops monthly partitions that end at or before the start of the month
+-- p_retain_months ago. Rollup rows are kept. Refresh rollups over the
+-- affected range before calling this so no data is lost. Runs as the owner
+-- for the same reason as ensure_samsara_history_partitions.
+CREATE OR REPLACE FUNCTION drop_samsara_history_partitions(
+    p_retain_months INTEGER DEFAULT 12,
+    p_dry_run BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE(partition_name TEXT, month_start DATE, dropped BOOLEAN) AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', NOW() AT TIME ZONE 'UTC') - make_interval(months => p_retain_months))::date;
+    part RECORD;
+BEGIN
+    IF p_retain_months < 1 THEN
+        RAISE EXCEPTION 'p_retain_months must be at least 1';
+    END IF;
+
+    FOR part IN
+        SELECT c.relname,
+               to_date(substring(c.relname FROM 'y(\d{4})m(\d{2})$') || '01', 'YYYYMMDD') AS starts
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'samsara_location_history'
+          AND c.relname ~ '_y\d{4}m\d{2}$'
+        ORDER BY c.relname
+    LOOP
+        IF (part.starts + INTERVAL '1 month')::date <= cutoff THEN
+            IF NOT p_dry_run THEN
+                EXECUTE format('DROP TABLE %I', part.relname);
+            END IF;
+            partition_name := part.relname;
+            month_start := part.starts;
+            dropped := NOT p_dry_run;
+            RETURN NEXT;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============================================================================
+-- OPTIONAL: Backfill rollups for history already stored
+-- ============================================================================
+-- The scheduled maintenance only refreshes the last 48 hours. Rolling up
+-- everything scans all of history, so it is left out of the migration; run
+-- it once on its own when convenient (or a month at a time on big tables):
+-- SELECT refresh_samsara_location_rollups('-infinity');
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Samsara History Partitioning Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables changed:';
+    RAISE NOTICE '  - samsara_location_history (monthly range partitions on happened_at)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - samsara_location_hourly (per tracker per hour)';
+    RAISE NOTICE '  - samsara_location_daily (per tracker per site-local day)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - ensure_samsara_history_partitions(months_ahead, from)';
+    RAISE NOTICE '  - refresh_samsara_location_rollups(since)';
+    RAISE NOTICE '  - drop_samsara_history_partitions(retain_months, dry_run)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Next steps:';
+    RAISE NOTICE '  1. Schedule python samsara_maintenance.py daily';
+    RAISE NOTICE '  2. Optionally backfill rollups: SELECT refresh_samsara_location_rollups(''-infinity'');';
+    RAISE NOTICE '  3. Point daily on-site reports at samsara_location_daily';
+END $$;
@@ -0,0 +1,50 @@
+-- ============================================================================
+-- Samsara Trail Anchors
+-- ============================================================================
+-- Trail compression in sync_samsara_data.py starts each tracker's new fixes
+-- from its most recent stored fix. latest_samsara_fixes() returns exactly
+-- that row per tracker, one index probe each on (tracker_id, happened_at),
+-- instead of the sync reading recent history back.
+--
+-- Rows are returned as JSON so the function does not depend on which
+-- optional columns (zone_ids) the history table has; plpgsql also keeps it
+-- working after samsara_history_partitioning.sql recreates the table.
+-- Run this after samsara_schema.sql. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- FUNCTION: Latest stored fix per tracker
+-- ============================================================================
+CREATE OR REPLACE FUNCTION latest_samsara_fixes(p_tracker_ids TEXT[])
+RETURNS SETOF JSONB AS $$
+BEGIN
+    RETURN QUERY
+    SELECT jsonb_build_object(
+        'tracker_id', h.tracker_id,
+        'latitude', h.latitude,
+        'longitude', h.longitude,
+        'happened_at', h.happened_at,
+        'is_on_site', h.is_on_site,
+        'zone_ids', to_jsonb(h) -> 'zone_ids'
+    )
+    FROM unnest(p_tracker_ids) AS t(tracker_id)
+    CROSS JOIN LATERAL (
+        SELECT *
+        FROM samsara_location_history l
+        WHERE l.tracker_id = t.tracker_id
+        ORDER BY l.happened_at DESC
+        LIMIT 1
+    ) h;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Samsara Trail Anchors Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Functions created:';
+    RAISE NOTICE '  - latest_samsara_fixes(tracker_ids)';
+END $$;
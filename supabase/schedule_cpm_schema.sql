@@ -0,0 +1,96 @@
+-- ============================================================================
+-- Schedule Critical Path (CPM)
+-- ============================================================================
+-- Activity logic for project_schedule and the critical path schedule_cpm.py
+-- computes from it. Load relationships with
+--     python schedule_cpm.py --relationships <P6 export .csv/.xer>
+-- and rerun after every schedule import. vw_critical_activities then reads
+-- the computed criticality instead of the stored is_critical flag.
+-- Both tables are replaced by upserting every row with a new refreshed_at
+-- and deleting rows with an older one, so they are never empty mid-refresh.
+-- Run this in Supabase SQL Editor after project_schedule_schema.sql. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: schedule_relationships
+-- ============================================================================
+-- One row per predecessor -> successor link, by project_schedule.activity_id
+CREATE TABLE IF NOT EXISTS schedule_relationships (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    predecessor_id TEXT NOT NULL,
+    successor_id TEXT NOT NULL,
+    relationship_type TEXT NOT NULL DEFAULT 'FS' CHECK (relationship_type IN ('FS', 'SS', 'FF', 'SF')),
+    lag_days INTEGER NOT NULL DEFAULT 0,
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, predecessor_id, successor_id, relationship_type)
+);
+
+-- ============================================================================
+-- TABLE: schedule_cpm
+-- ============================================================================
+-- One row per activity: CPM dates, float and criticality (calendar days)
+CREATE TABLE IF NOT EXISTS schedule_cpm (
+    project_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    activity_id TEXT NOT NULL,
+
+    duration_days INTEGER NOT NULL DEFAULT 0,
+    early_start DATE,
+    early_finish DATE,
+    late_start DATE,
+    late_finish DATE,
+    total_float INTEGER,                     -- late_finish - early_finish
+    free_float INTEGER,                      -- slip before the first successor moves
+    is_critical BOOLEAN NOT NULL DEFAULT FALSE,    -- open activity with total_float <= 0
+    is_driving BOOLEAN NOT NULL DEFAULT FALSE,     -- on the zero-slack chain to the project finish
+    driving_predecessor TEXT,                -- predecessor that sets early_start
+
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, activity_id)
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_schedule_relationships_successor ON schedule_relationships(project_id, successor_id);
+CREATE INDEX IF NOT EXISTS idx_schedule_relationships_refreshed ON schedule_relationships(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_schedule_cpm_refreshed ON schedule_cpm(refreshed_at);
+CREATE INDEX IF NOT EXISTS idx_schedule_cpm_critical ON schedule_cpm(project_id, is_critical, total_float);
+
+-- ============================================================================
+-- VIEW: Critical path activities
+-- ============================================================================
+-- Computed criticality where schedule_cpm has the activity, else the stored flag
+DROP VIEW IF EXISTS vw_critical_activities;
+CREATE VIEW vw_critical_activities AS
+SELECT
+    s.*,
+    c.early_start,
+    c.early_finish,
+    c.late_start,
+    c.late_finish,
+    c.total_float,
+    c.free_float,
+    c.is_driving
+FROM project_schedule s
+LEFT JOIN schedule_cpm c
+    ON c.project_id = s.project_id AND c.activity_id = s.activity_id
+WHERE COALESCE(c.is_critical, s.is_critical) = TRUE
+ORDER BY c.total_float ASC NULLS LAST, s.start_date ASC NULLS LAST;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Schedule CPM Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - schedule_relationships (predecessor -> successor logic)';
+    RAISE NOTICE '  - schedule_cpm (early/late dates, float, critical and driving path)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Views updated:';
+    RAISE NOTICE '  - vw_critical_activities (computed criticality)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Refreshed by: python schedule_cpm.py [--relationships export.xer]';
+END $$;
@@ -0,0 +1,102 @@
+-- ============================================================================
+-- Sync Run Ledger
+-- ============================================================================
+-- One row per run of sync_po_shipment_data.py, sync_delivery_dates.py and
+-- sync_samsara_data.py, written in a single request at the end of the run
+-- from its RunMetrics (sync_metrics.py). Used to spot regressions and plan
+-- capacity as projects grow.
+-- Run this in Supabase SQL Editor. Safe to re-run.
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: sync_runs
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id BIGSERIAL PRIMARY KEY,
+    dataset TEXT NOT NULL,                   -- 'po_shipments', 'delivery_dates', 'samsara', 'samsara_poller'
+
+    -- Timing
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    duration_s NUMERIC(12, 3) NOT NULL,
+    phases JSONB NOT NULL DEFAULT '{}',      -- {"read_po_excel": 1.234, "upload_po": 4.567, ...}
+
+    -- Volume
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    rows_skipped INTEGER NOT NULL DEFAULT 0,
+    bytes_sent BIGINT NOT NULL DEFAULT 0,
+    http_requests INTEGER NOT NULL DEFAULT 0,
+    http_p50_ms NUMERIC(12, 1),
+    http_p95_ms NUMERIC(12, 1),
+
+    -- Outcome
+    success BOOLEAN NOT NULL,
+    error_count INTEGER NOT NULL DEFAULT 0,   -- Failures the sync reported (not raw HTTP errors)
+
+    -- Where it ran (workstation name, GitHub runner, ...)
+    host TEXT,
+
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_sync_runs_dataset_started ON sync_runs(dataset, started_at DESC);
+
+-- ============================================================================
+-- VIEW: Daily duration percentiles per dataset
+-- ============================================================================
+CREATE OR REPLACE VIEW vw_sync_run_percentiles AS
+SELECT
+    dataset,
+    date_trunc('day', started_at)::date AS day,
+    COUNT(*) AS runs,
+    COUNT(*) FILTER (WHERE NOT success) AS failed_runs,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_s) AS duration_p50_s,
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_s) AS duration_p95_s,
+    MAX(duration_s) AS duration_max_s,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY http_p95_ms) AS http_p95_ms_median,
+    ROUND(AVG(rows_read)) AS avg_rows_read,
+    ROUND(AVG(rows_written)) AS avg_rows_written,
+    ROUND(AVG(bytes_sent)) AS avg_bytes_sent,
+    SUM(error_count) AS errors
+FROM sync_runs
+GROUP BY dataset, date_trunc('day', started_at)::date
+ORDER BY dataset, day DESC;
+
+-- ============================================================================
+-- VIEW: Weekly phase duration percentiles per dataset
+-- ============================================================================
+-- Shows which phase (Excel read, upload, RPC refresh, ...) is driving a slowdown
+CREATE OR REPLACE VIEW vw_sync_phase_percentiles AS
+SELECT
+    r.dataset,
+    p.phase,
+    date_trunc('week', r.started_at)::date AS week,
+    COUNT(*) AS runs,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY p.seconds) AS p50_s,
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY p.seconds) AS p95_s
+FROM sync_runs r
+CROSS JOIN LATERAL (
+    SELECT key AS phase, value::numeric AS seconds
+    FROM jsonb_each_text(r.phases)
+) p
+GROUP BY r.dataset, p.phase, date_trunc('week', r.started_at)::date
+ORDER BY r.dataset, week DESC, p50_s DESC;
+
+-- ============================================================================
+-- SUCCESS MESSAGE
+-- ============================================================================
+DO $$
+BEGIN
+    RAISE NOTICE '✓ Sync Run Ledger Schema Created Successfully!';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Tables created:';
+    RAISE NOTICE '  - sync_runs (one row per sync run)';
+    RAISE NOTICE '';
+    RAISE NOTICE 'Views created:';
+    RAISE NOTICE '  - vw_sync_run_percentiles (daily p50/p95 duration per dataset)';
+    RAISE NOTICE '  - vw_sync_phase_percentiles (weekly p50/p95 per phase)';
+END $$;
@@ -0,0 +1,295 @@
+"""
+Supabase REST Helpers
+Shared batched read/write helpers for the Python sync scripts (PostgREST API)
+"""
+
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
+
+# Supabase caps responses at 1000 rows per request by default
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 500
+
+# project_id the database gives rows the Python syncs write (they never set it)
+DEFAULT_PROJECT_ID = '00000000-0000-0000-0000-000000000000'
+
+# Statuses PostgREST answers with when Postgres rejects the rows themselves
+# (bad value, NOT NULL, unique/foreign key). Anything else fails the request
+# as a whole and is not worth splitting.
+DATA_REJECTION_STATUSES = (400, 409)
+# SQLSTATE classes of row-level errors: 22 data exception, 23 integrity
+# constraint violation. PGRST* codes (unknown column, missing table) and
+# permission errors are about the request, not a row.
+ROW_ERROR_CLASSES = ('22', '23')
+
+# Materialized views (supabase/materialized_views.sql) to refresh after a
+# sync changes a table
+MATERIALIZED_VIEWS = {
+    'purchase_orders': ('mv_po_summary', 'mv_recent_activity', 'mv_delivery_dates_with_po'),
+    'shipments': ('mv_shipment_summary', 'mv_recent_activity', 'mv_shipment_visibility'),
+    'delivery_dates': ('mv_delivery_dates_with_po',),
+    'samsara_trackers': ('mv_active_samsara_trackers',),
+}
+
+
+def _affected_rows(response, fallback: int) -> int:
+    """Read the affected row count from a Content-Range header (count=exact)"""
+    content_range = response.headers.get('Content-Range', '')
+    total = content_range.rsplit('/', 1)[-1] if '/' in content_range else ''
+    return int(total) if total.isdigit() else fallback
+
+
+def group_by_columns(rows: Iterable[Dict]) -> List[List[Dict]]:
+    """
+    Split rows into groups that share the same set of keys.
+
+    PostgREST bulk inserts use one column list for the whole payload, so a
+    row missing a key would have that column written as NULL. Grouping keeps
+    partial rows (e.g. trackers without a location) from clearing data.
+    """
+    groups: Dict[tuple, List[Dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+    return list(groups.values())
+
+
+def fetch_rows(session, supabase_url: str, headers: Dict, table: str, select: str = '*',
+               order: str = 'id', params: Optional[Dict] = None, page_size: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+    """Fetch every matching row of a table or view, paging past the server row limit"""
+    url = f"{supabase_url}/rest/v1/{table}"
+    rows = []
+    offset = 0
+
+    while True:
+        response = session.get(
+            url,
+            headers=headers,
+            params={**(params or {}), 'select': select, 'order': order, 'limit': page_size, 'offset': offset}
+        )
+        response.raise_for_status()
+        page = response.json()
+        rows.extend(page)
+
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+
+def count_rows(session, supabase_url: str, headers: Dict, table: str, params: Optional[Dict] = None) -> int:
+    """Exact row count of a table or view from the Content-Range header, without fetching rows"""
+    response = session.get(
+        f"{supabase_url}/rest/v1/{table}",
+        headers={**headers, 'Prefer': 'count=exact'},
+        params={**(params or {}), 'select': '*', 'limit': 1}
+    )
+    response.raise_for_status()
+    return _affected_rows(response, len(response.json()))
+
+
+def fetch_column(session, supabase_url: str, headers: Dict, table: str, column: str,
+                 page_size: int = DEFAULT_PAGE_SIZE) -> List:
+    """Fetch every value of one column, paging past the server row limit"""
+    rows = fetch_rows(session, supabase_url, headers, table, select=column, order=column, page_size=page_size)
+    return [row[column] for row in rows]
+
+
+def bulk_write(session, supabase_url: str, headers: Dict, table: str, rows: List[Dict],
+               batch_size: int = DEFAULT_BATCH_SIZE, on_conflict: Optional[str] = None,
+               resolution: Optional[str] = None) -> Dict:
+    """
+    Insert or upsert rows in batches with return=minimal.
+
+    Args:
+        session: requests.Session (or compatible) to send through
+        supabase_url: Supabase project URL
+        headers: Base Supabase headers (apikey/Authorization)
+        table: Target table
+        rows: Row dictionaries; grouped by key set before sending
+        batch_size: Rows per request
+        on_conflict: Comma-separated conflict target columns for upserts
+        resolution: 'merge-duplicates' or 'ignore-duplicates' for upserts
+
+    Returns:
+        Dictionary with 'written' (rows affected), 'requests', 'errors' and
+        'error' (last error text, if any)
+    """
+    url = f"{supabase_url}/rest/v1/{table}"
+    prefer = ['return=minimal', 'count=exact']
+    if resolution:
+        prefer.insert(0, f'resolution={resolution}')
+    write_headers = {**headers, 'Prefer': ','.join(prefer)}
+    params = {'on_conflict': on_conflict} if on_conflict else None
+
+    result = {'written': 0, 'requests': 0, 'errors': 0, 'error': None}
+
+    for group in group_by_columns(rows):
+        for i in range(0, len(group), batch_size):
+            batch = group[i:i + batch_size]
+            response = session.post(url, headers=write_headers, params=params, json=batch)
+            result['requests'] += 1
+
+            if response.status_code in [200, 201, 204]:
+                result['written'] += _affected_rows(response, len(batch))
+            else:
+                result['errors'] += 1
+                result['error'] = response.text
+
+    return result
+
+
+def _error_body(response) -> Dict:
+    """PostgREST's JSON error body, or {} when the body is not a JSON object"""
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def rejection_message(response) -> str:
+    """PostgREST's error message for a rejected request, else the raw body"""
+    body = _error_body(response)
+    if body.get('message'):
+        details = body.get('details')
+        return f"{body['message']} ({details})" if details else body['message']
+    return response.text[:200]
+
+
+def is_row_rejection(response) -> bool:
+    """Whether Postgres refused the request for the data in its rows (SQLSTATE 22xxx/23xxx)"""
+    code = str(_error_body(response).get('code') or '')
+    return response.status_code in DATA_REJECTION_STATUSES and code[:2] in ROW_ERROR_CLASSES
+
+
+def insert_bisecting(session, url: str, headers: Dict, rows: List[Dict]) -> Dict:
+    """
+    POST rows; if PostgREST rejects them for their data, bisect to the bad rows
+
+    A request Postgres rejects with a row-level error (SQLSTATE 22xxx/23xxx)
+    is split in half and each half is sent again, down to single rows, so
+    the good rows are inserted and only the offending ones are left out. One
+    bad row costs about 2 * log2(len(rows)) extra requests. Any other
+    failure (schema errors such as PGRST204, permissions, 5xx, network)
+    stops at once, as does a batch in which every row is rejected, which
+    points at the request rather than the data. Halves that were already
+    inserted stay in the table.
+
+    Args:
+        session: requests.Session (or compatible) to send through
+        url: Table endpoint (.../rest/v1/<table>)
+        headers: Request headers, including any Prefer
+        rows: Row dictionaries, sent in order
+
+    Returns:
+        Dictionary with 'success', 'inserted', 'rejected' ([(position in rows,
+        message)] in row order), 'requests' and 'error' (why it stopped)
+    """
+    result = {'success': True, 'inserted': 0, 'rejected': [], 'requests': 0, 'error': None}
+    pending = [(0, len(rows))] if rows else []
+
+    while pending:
+        start, end = pending.pop()
+        response = session.post(url, headers=headers, json=rows[start:end])
+        result['requests'] += 1
+
+        if response.status_code in [200, 201, 204]:
+            result['inserted'] += end - start
+        elif not is_row_rejection(response):
+            result['success'] = False
+            result['error'] = response.text
+            break
+        elif end - start == 1:
+            result['rejected'].append((start, rejection_message(response)))
+        else:
+            middle = (start + end) // 2
+            # Right half first on the stack so the left half is sent first
+            pending.append((middle, end))
+            pending.append((start, middle))
+
+    if result['success'] and len(rows) > 1 and len(result['rejected']) == len(rows):
+        result['success'] = False
+        result['error'] = f"every row was rejected, last with: {result['rejected'][-1][1]}"
+    return result
+
+
+def replace_rows(session, supabase_url: str, headers: Dict, table: str, rows: List[Dict], on_conflict: str,
+                 refreshed_at: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Replace a derived table's contents without ever leaving it empty.
+
+    Upserts every row stamped with refreshed_at, then deletes the rows an
+    earlier refresh wrote (refreshed_at older than this one). The table needs
+    a refreshed_at column and a unique key matching on_conflict.
+
+    Returns:
+        Dictionary with 'success', 'written' and 'error'
+    """
+    rows = [{**row, 'refreshed_at': refreshed_at} for row in rows]
+    written = bulk_write(session, supabase_url, headers, table, rows, batch_size=batch_size,
+                         on_conflict=on_conflict, resolution='merge-duplicates')
+    if written['errors']:
+        return {'success': False, 'written': written['written'], 'error': written['error']}
+
+    response = session.delete(
+        f"{supabase_url}/rest/v1/{table}",
+        headers={**headers, 'Prefer': 'return=minimal'},
+        params={'refreshed_at': f'lt.{refreshed_at}'}
+    )
+    if response.status_code not in [200, 204]:
+        return {'success': False, 'written': written['written'], 'error': response.text}
+    return {'success': True, 'written': written['written'], 'error': None}
+
+
+def refresh_materialized_views(session, supabase_url: str, headers: Dict, tables: Iterable[str]) -> Dict:
+    """
+    Concurrently refresh the materialized views that read the given tables.
+
+    Each view is refreshed once even if several tables feed it. The server
+    logs every refresh to mv_refresh_log.
+
+    Returns:
+        Dictionary with 'success', 'views' (view -> {'seconds', 'rows'} or
+        {'seconds', 'error'}) and 'error'
+    """
+    views = list(dict.fromkeys(view for table in tables for view in MATERIALIZED_VIEWS.get(table, ())))
+    if not views:
+        return {'success': True, 'views': {}, 'error': None}
+
+    response = session.post(
+        f"{supabase_url}/rest/v1/rpc/refresh_materialized_views",
+        headers={**headers, 'Prefer': 'return=representation'},
+        json={'p_views': views}
+    )
+    if response.status_code != 200:
+        return {'success': False, 'views': {}, 'error': response.text}
+
+    refreshed = response.json() or {}
+    errors = [f"{view}: {info['error']}" for view, info in refreshed.items() if info.get('error')]
+    return {'success': not errors, 'views': refreshed, 'error': '; '.join(errors) or None}
+
+
+def refresh_views(session, supabase_url: str, headers: Dict, tables: Iterable[str], metrics=None) -> Dict:
+    """
+    refresh_materialized_views for a sync, printing each view's outcome
+
+    Args:
+        tables: Tables the sync changed
+        metrics: RunMetrics to time the 'refresh_views' phase into
+
+    Returns:
+        The refresh_materialized_views result; a failed RPC call is
+        returned as an error rather than raised
+    """
+    print("\nRefreshing materialized views...")
+    try:
+        with metrics.phase('refresh_views') if metrics else nullcontext():
+            result = refresh_materialized_views(session, supabase_url, headers, tables)
+    except Exception as e:
+        result = {'success': False, 'views': {}, 'error': str(e)}
+
+    for view, info in result['views'].items():
+        detail = info['error'] if info.get('error') else f"{info.get('rows', 0)} rows"
+        print(f"   {view}: {detail} ({info.get('seconds', 0)}s)")
+    if not result['success']:
+        print(f"   Error refreshing views: {result['error']}")
+    return result
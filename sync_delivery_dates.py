@@ -3,18 +3,34 @@ Sync Delivery Dates data from Excel to Supabase
 Reads ReadyByDates.xlsx and uploads to delivery_dates table
 """
 
+import argparse
 import os
 import sys
 import pandas as pd
 import requests
 from datetime import datetime
 from dotenv import load_dotenv
+from checkpoint import UploadCheckpoint, file_sha256, upload_batches
+from dashboard_rollups import DashboardRollups
+from delivery_risk import DeliveryRiskScorer
+from excel_reader import read_excel
+from local_mirror import LocalMirror
+from row_validation import quarantine_invalid
+from supabase_rest import refresh_views
+from sync_metrics import InstrumentedSession, RunMetrics
 
 # Load environment variables
 load_dotenv()
 
 class ReadyByDatesSync:
-    def __init__(self):
+    def __init__(self, session=None, metrics=None, mirror=None, dry_run=False):
+        self.metrics = metrics or RunMetrics('delivery_dates')
+        # LocalMirror kept in step with each upload; dry runs only diff against it
+        self.mirror = mirror
+        self.dry_run = dry_run
+        # Excel row number of each record read (for quarantine and upload logs)
+        self.excel_rows = None
+        self.session = InstrumentedSession(self.metrics, session or requests.Session())
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
         self.excel_file = 'ReadyByDates.xlsx'
@@ -65,36 +81,32 @@ class ReadyByDatesSync:
 
         return None, value_str
 
-    def sync_ready_dates(self):
-        """Sync ready by dates data to Supabase"""
-        print("\n" + "="*80)
-        print("READY BY DATES SYNC")
-        print("="*80)
-        print(f"Excel file: {os.path.abspath(self.excel_file)}")
-        print(f"Supabase URL: {self.supabase_url}")
-        print("="*80)
-
-        try:
-            # Read Excel file
-            print("\n1. Reading Delivery Dates data from Excel...")
-            df = pd.read_excel(self.excel_file)
-            print(f"   Found {len(df)} records")
-
-            # Clean data
+    def read_records(self):
+        """Read ReadyByDates.xlsx into delivery_dates rows"""
+        # Read Excel file
+        print("\n1. Reading Delivery Dates data from Excel...")
+        with self.metrics.phase('read_excel'):
+            df = read_excel(self.excel_file)
+        self.metrics.count('rows_read', len(df))
+        print(f"   Found {len(df)} records")
+
+        # Clean data
+        with self.metrics.phase('clean'):
             df = self.clean_dataframe(df)
 
-            # Map columns
-            column_mapping = {
-                'Project Phase ': 'project_phase',
-                'Package Description': 'package_description',
-                'Tag #': 'tag_number',
-                'Supplier Name': 'supplier_name',
-                'PO #': 'po_number',
-                'Ready to Ship Date': 'delivery_date'  # Changed from 'Delivery Date'
-            }
-
-            # Prepare records
-            print("   Processing records...")
+        # Map columns
+        column_mapping = {
+            'Project Phase ': 'project_phase',
+            'Package Description': 'package_description',
+            'Tag #': 'tag_number',
+            'Supplier Name': 'supplier_name',
+            'PO #': 'po_number',
+            'Ready to Ship Date': 'delivery_date'  # Changed from 'Delivery Date'
+        }
+
+        # Prepare records
+        print("   Processing records...")
+        with self.metrics.phase('map_records'):
             records = []
             for _, row in df.iterrows():
                 record = {}
@@ -130,49 +142,85 @@ class ReadyByDatesSync:
                 record['synced_at'] = datetime.now(datetime.UTC).isoformat() if hasattr(datetime, 'UTC') else datetime.utcnow().isoformat()
                 records.append(record)
 
-            print(f"   Prepared {len(records)} records for upload")
+        # Header is row 1, so DataFrame row i is Excel row i + 2
+        self.excel_rows = [int(index) + 2 for index in df.index]
+        print(f"   Prepared {len(records)} records for upload")
+        return records
+
+    def sync_ready_dates(self):
+        """Sync ready by dates data to Supabase"""
+        print("\n" + "="*80)
+        print("READY BY DATES SYNC")
+        print("="*80)
+        print(f"Excel file: {os.path.abspath(self.excel_file)}")
+        print(f"Supabase URL: {self.supabase_url}")
+        print("="*80)
+
+        try:
+            # An unfinished upload of this same workbook resumes from its cached rows
+            workbook_hash = file_sha256(self.excel_file)
+            checkpoint = None if self.dry_run else UploadCheckpoint.load('delivery_dates', workbook_hash)
+            if checkpoint:
+                print(f"\nResuming sync {checkpoint.sync_id[:8]} at batch {checkpoint.committed + 1}/"
+                      f"{checkpoint.batch_count} ({checkpoint.remaining_rows} records left)")
+                records = checkpoint.rows
+            else:
+                records = self.read_records()
+                with self.metrics.phase('validate'):
+                    validation = quarantine_invalid('delivery_dates', records, self.excel_rows, self.metrics)
+                if records and not validation['valid']:
+                    return {'success': False, 'error': 'Every row failed validation; see the quarantine report'}
+                records = validation['valid']
+                self.excel_rows = validation['excel_rows']
+
+                if self.mirror:
+                    with self.metrics.phase('mirror_diff'):
+                        self.mirror.print_diff('delivery_dates', records)
+                if self.dry_run:
+                    print("   Dry run: Supabase not changed")
+                    return {'success': True, 'count': len(records), 'dry_run': True}
+
+                checkpoint = UploadCheckpoint.start('delivery_dates', workbook_hash, records,
+                                                    excel_rows=self.excel_rows)
 
             # Upload to Supabase
             print("\n2. Uploading to Supabase...")
 
-            # Clear existing data
-            delete_url = f"{self.supabase_url}/rest/v1/delivery_dates"
-            delete_response = requests.delete(
-                delete_url,
-                headers={**self.supabase_headers, 'Prefer': 'return=minimal'},
-                params={'id': 'gte.0'}
-            )
-
-            if delete_response.status_code in [200, 204]:
-                print("   Cleared old data")
-
-            # Insert new data in batches
-            batch_size = 100
-            total_inserted = 0
-
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-
-                insert_url = f"{self.supabase_url}/rest/v1/delivery_dates"
-                insert_response = requests.post(
-                    insert_url,
-                    headers=self.supabase_headers,
-                    json=batch
-                )
-
-                if insert_response.status_code in [200, 201]:
-                    total_inserted += len(batch)
-                    print(f"   Inserted batch {(i//batch_size)+1}: {total_inserted}/{len(records)} records")
-                else:
-                    print(f"   Error inserting batch: {insert_response.text}")
-                    return {'success': False, 'error': insert_response.text}
+            # Clear existing data (once per sync; a resume continues where it stopped)
+            if not checkpoint.cleared:
+                delete_url = f"{self.supabase_url}/rest/v1/delivery_dates"
+                with self.metrics.phase('delete'):
+                    delete_response = self.session.delete(
+                        delete_url,
+                        headers={**self.supabase_headers, 'Prefer': 'return=minimal'},
+                        params={'id': 'gte.0'}
+                    )
+
+                if delete_response.status_code in [200, 204]:
+                    print("   Cleared old data")
+                checkpoint.mark_cleared()
+
+            # Insert new data in batches, checkpointing each one
+            with self.metrics.phase('upload'):
+                upload = upload_batches(self.session, self.supabase_url, self.supabase_headers, checkpoint,
+                                        metrics=self.metrics)
+            if not upload['success']:
+                return {'success': False, 'error': upload['error']}
+            if upload['rejected']:
+                rejected = set(upload['rejected'])
+                records = [record for i, record in enumerate(records) if i not in rejected]
+            total_inserted = len(records)
 
             print(f"   Successfully synced {total_inserted} ready date records")
+            if self.mirror:
+                with self.metrics.phase('mirror'):
+                    self.mirror.record('delivery_dates', records)
 
             print("\n" + "="*80)
             print("SYNC COMPLETED SUCCESSFULLY")
             print("="*80)
             print(f"Ready date records synced: {total_inserted}")
+            self.metrics.print_summary()
             print("="*80)
 
             return {'success': True, 'count': total_inserted}
@@ -187,10 +235,48 @@ class ReadyByDatesSync:
             traceback.print_exc()
             return {'success': False, 'error': str(e)}
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync ReadyByDates.xlsx to Supabase')
+    parser.add_argument('--profile', action='store_true',
+                        help='Run the sync under cProfile and write a .prof file next to the metrics report')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Parse the workbook and diff it against the local mirror without writing to Supabase')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Do not update the local SQLite mirror')
+    parser.add_argument('--no-rollups', action='store_true',
+                        help='Skip rebuilding the dashboard rollup and delivery risk tables')
+    args = parser.parse_args(argv)
+    if args.dry_run and args.no_mirror:
+        parser.error('--dry-run needs the local mirror')
+
     try:
-        sync = ReadyByDatesSync()
-        result = sync.sync_ready_dates()
+        sync = ReadyByDatesSync(mirror=None if args.no_mirror else LocalMirror(), dry_run=args.dry_run)
+        with sync.metrics.profile(args.profile):
+            result = sync.sync_ready_dates()
+            if result['success'] and not args.dry_run:
+                if not refresh_views(sync.session, sync.supabase_url, sync.supabase_headers, ['delivery_dates'],
+                                     sync.metrics)['success']:
+                    sync.metrics.count('errors')
+            if result['success'] and not args.dry_run and not args.no_rollups:
+                rollups = DashboardRollups(sync.session, sync.supabase_url, sync.supabase_key,
+                                           mirror=sync.mirror, metrics=sync.metrics).run()
+                if not rollups['success']:
+                    sync.metrics.count('errors')
+                risk = DeliveryRiskScorer(sync.session, sync.supabase_url, sync.supabase_key,
+                                          mirror=sync.mirror, metrics=sync.metrics).run()
+                if not risk['success']:
+                    sync.metrics.count('errors')
+
+        if args.dry_run:
+            # Nothing was written, so there is no run to record in the ledger
+            sys.exit(0 if result['success'] else 1)
+
+        if not result['success']:
+            sync.metrics.count('errors')
+        sync.metrics.finish(success=result['success'])
+        report = sync.metrics.write_report()
+        sync.metrics.write_ledger(sync.session, sync.supabase_url, sync.supabase_headers)
+        print(f"Metrics report: {report['json']}")
 
         if not result['success']:
             sys.exit(1)
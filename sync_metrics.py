@@ -0,0 +1,407 @@
+"""
+Sync Run Metrics
+Lightweight instrumentation shared by the sync scripts: phase timers,
+row/byte/retry counters and HTTP latency percentiles, exported as a JSON
+run report and a Prometheus textfile (node_exporter textfile collector)
+
+Usage:
+    metrics = RunMetrics('po_shipments')
+    with metrics.phase('read_excel'):
+        df = pd.read_excel(...)
+    metrics.count('rows_read', len(df))
+    session = InstrumentedSession(metrics)     # times every HTTP call
+    ...
+    metrics.finish(success=True)
+    metrics.write_report()
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+# Reports go here unless SYNC_METRICS_DIR is set
+METRICS_DIR = os.getenv('SYNC_METRICS_DIR', str(Path(__file__).with_name('logs') / 'metrics'))
+
+# Counters every report carries, even when zero
+STANDARD_COUNTERS = ('rows_read', 'rows_written', 'rows_skipped', 'bytes_sent', 'bytes_received',
+                     'http_requests', 'http_errors', 'retries', 'errors')
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Functions listed when --profile prints its summary
+PROFILE_TOP_N = 25
+
+LEDGER_TABLE = 'sync_runs'
+
+# Transient failures InstrumentedSession retries, with exponential backoff
+# (or the server's Retry-After). Only idempotent reads are retried; writes
+# are left to the upload paths, which checkpoint and bisect failed batches.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD')
+MAX_RETRIES = int(os.getenv('SYNC_HTTP_RETRIES', '3'))
+RETRY_BACKOFF_S = 1.0
+RETRY_MAX_DELAY_S = 30.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def request_target(url: str) -> str:
+    """Short label for a request: the table/RPC for Supabase, else the URL path"""
+    path = urlparse(url).path
+    if '/rest/v1/' in path:
+        return path.split('/rest/v1/', 1)[1]
+    return path or url
+
+
+def run_host() -> str:
+    """GitHub Actions run id when running in CI, else the machine name"""
+    run_id = os.getenv('GITHUB_RUN_ID')
+    return f"github-actions/{run_id}" if run_id else socket.gethostname()
+
+
+class RunMetrics:
+    """Timers and counters for one sync run"""
+
+    def __init__(self, dataset: str):
+        """
+        Args:
+            dataset: Short name for the data being synced (e.g. 'samsara');
+                used in file names and as the Prometheus 'dataset' label
+        """
+        self.dataset = dataset
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new run in place (long-running pollers reuse one instance)"""
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.success = None
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {name: 0 for name in STANDARD_COUNTERS}
+        self.requests: List[Dict] = []
+        self._start = time.perf_counter()
+        self._duration = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block; repeated phases with the same name accumulate"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_request(self, method: str, url: str, status: Optional[int], seconds: float,
+                       bytes_sent: int = 0, bytes_received: int = 0, retried: bool = False) -> None:
+        """
+        Record one HTTP call (status None means it raised before a response).
+        A failed attempt that is about to be retried is timed but not counted
+        in http_errors, which counts final failures only.
+        """
+        self.requests.append({
+            'method': method.upper(),
+            'target': request_target(url),
+            'status': status,
+            'seconds': seconds
+        })
+        self.count('http_requests')
+        self.count('bytes_sent', bytes_sent)
+        self.count('bytes_received', bytes_received)
+        if not retried and (status is None or status >= 400):
+            self.count('http_errors')
+
+    @property
+    def duration(self) -> float:
+        return self._duration if self._duration is not None else time.perf_counter() - self._start
+
+    def finish(self, success: bool = True) -> None:
+        self.success = success
+        self.finished_at = datetime.now(timezone.utc)
+        self._duration = time.perf_counter() - self._start
+
+    @staticmethod
+    def _latency_summary(seconds: List[float]) -> Dict:
+        ordered = sorted(seconds)
+        summary = {'count': len(ordered), 'total_s': sum(ordered), 'max_s': ordered[-1] if ordered else None}
+        for pct in PERCENTILES:
+            summary[f'p{pct}_s'] = percentile(ordered, pct)
+        return summary
+
+    def http_summary(self) -> Dict:
+        """Latency percentiles overall and per method + target"""
+        by_target: Dict[str, List[float]] = {}
+        for request in self.requests:
+            by_target.setdefault(f"{request['method']} {request['target']}", []).append(request['seconds'])
+
+        return {
+            'all': self._latency_summary([request['seconds'] for request in self.requests]),
+            'by_target': {key: self._latency_summary(values) for key, values in sorted(by_target.items())}
+        }
+
+    def report(self) -> Dict:
+        """JSON-serializable run report"""
+        return {
+            'dataset': self.dataset,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'success': self.success,
+            'duration_s': round(self.duration, 4),
+            'phases_s': {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            'counters': dict(self.counters),
+            'http': self.http_summary()
+        }
+
+    def ledger_row(self) -> Dict:
+        """sync_runs row for this run (call after finish)"""
+        http = self.http_summary()['all']
+        return {
+            'dataset': self.dataset,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': (self.finished_at or datetime.now(timezone.utc)).isoformat(),
+            'duration_s': round(self.duration, 3),
+            'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'rows_read': self.counters['rows_read'],
+            'rows_written': self.counters['rows_written'],
+            'rows_skipped': self.counters['rows_skipped'],
+            'bytes_sent': self.counters['bytes_sent'],
+            'http_requests': self.counters['http_requests'],
+            'http_p50_ms': round(http['p50_s'] * 1000, 1) if http['count'] else None,
+            'http_p95_ms': round(http['p95_s'] * 1000, 1) if http['count'] else None,
+            'success': bool(self.success),
+            # Failures the sync itself reported. http_errors is left out: it also
+            # counts the 400s of poison-row bisection in runs that succeeded
+            'error_count': self.counters['errors'],
+            'host': run_host()
+        }
+
+    def write_ledger(self, session, supabase_url: str, headers: Dict) -> bool:
+        """
+        Append this run to sync_runs in one request
+
+        A missing table or failed write only prints a warning; the ledger
+        must never fail a sync that otherwise succeeded.
+        """
+        try:
+            response = session.post(
+                f"{supabase_url}/rest/v1/{LEDGER_TABLE}",
+                headers={**headers, 'Prefer': 'return=minimal'},
+                json=self.ledger_row()
+            )
+        except Exception as e:
+            print(f"   Warning: could not record sync run: {e}")
+            return False
+
+        if response.status_code not in [200, 201, 204]:
+            print(f"   Warning: could not record sync run: {response.text}")
+            return False
+        return True
+
+    def prometheus_text(self) -> str:
+        """Render the run in the Prometheus text exposition format"""
+        label = f'dataset="{self.dataset}"'
+        http = self.http_summary()['all']
+        lines = [
+            '# HELP invenio_sync_last_run_timestamp_seconds Unix time the last sync run finished',
+            '# TYPE invenio_sync_last_run_timestamp_seconds gauge',
+            f'invenio_sync_last_run_timestamp_seconds{{{label}}} '
+            f'{(self.finished_at or datetime.now(timezone.utc)).timestamp():.0f}',
+            '# HELP invenio_sync_success 1 if the last sync run succeeded',
+            '# TYPE invenio_sync_success gauge',
+            f'invenio_sync_success{{{label}}} {1 if self.success else 0}',
+            '# HELP invenio_sync_duration_seconds Wall time of the last sync run',
+            '# TYPE invenio_sync_duration_seconds gauge',
+            f'invenio_sync_duration_seconds{{{label}}} {self.duration:.4f}',
+            '# HELP invenio_sync_phase_seconds Wall time per phase of the last sync run',
+            '# TYPE invenio_sync_phase_seconds gauge'
+        ]
+        for name, seconds in self.phases.items():
+            lines.append(f'invenio_sync_phase_seconds{{{label},phase="{name}"}} {seconds:.4f}')
+
+        lines += [
+            '# HELP invenio_sync_count Rows, bytes, requests and retries in the last sync run',
+            '# TYPE invenio_sync_count gauge'
+        ]
+        for name, value in self.counters.items():
+            lines.append(f'invenio_sync_count{{{label},name="{name}"}} {value}')
+
+        lines += [
+            '# HELP invenio_sync_http_request_seconds HTTP latency percentiles for the last sync run',
+            '# TYPE invenio_sync_http_request_seconds summary'
+        ]
+        for pct in PERCENTILES:
+            value = http[f'p{pct}_s']
+            if value is not None:
+                lines.append(f'invenio_sync_http_request_seconds{{{label},quantile="{pct / 100:g}"}} {value:.4f}')
+        lines.append(f'invenio_sync_http_request_seconds_sum{{{label}}} {http["total_s"]:.4f}')
+        lines.append(f'invenio_sync_http_request_seconds_count{{{label}}} {http["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, directory: Optional[str] = None, json_report: bool = True) -> Dict[str, str]:
+        """
+        Write <dataset>_<timestamp>.json and <dataset>.prom
+
+        The .prom file is overwritten each run and replaced atomically so a
+        scraping collector never reads a half-written file.
+
+        Args:
+            directory: Output directory. Defaults to METRICS_DIR
+            json_report: False writes only the .prom file (per-cycle poller updates)
+
+        Returns:
+            Dictionary with the 'json' (None if skipped) and 'prometheus' paths
+        """
+        directory = Path(directory or METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = self.started_at.strftime('%Y%m%d_%H%M%S')
+
+        json_path = None
+        if json_report:
+            json_path = directory / f"{self.dataset}_{stamp}.json"
+            json_path.write_text(json.dumps(self.report(), indent=2))
+
+        prom_path = directory / f"{self.dataset}.prom"
+        tmp_path = prom_path.with_suffix('.prom.tmp')
+        tmp_path.write_text(self.prometheus_text())
+        os.replace(tmp_path, prom_path)
+
+        return {'json': str(json_path) if json_path else None, 'prometheus': str(prom_path)}
+
+    def print_summary(self) -> None:
+        """Print phase timings and HTTP percentiles below the sync banner"""
+        http = self.http_summary()['all']
+        print(f"Run time:          {self.duration:.2f}s")
+        for name, seconds in self.phases.items():
+            print(f"  {name:<22} {seconds:8.2f}s")
+        if http['count']:
+            print(f"HTTP requests:     {http['count']} "
+                  f"(p50 {http['p50_s'] * 1000:.0f} ms, p95 {http['p95_s'] * 1000:.0f} ms, "
+                  f"max {http['max_s'] * 1000:.0f} ms, {self.counters['bytes_sent'] / 1024:.0f} KiB sent)")
+
+    @contextmanager
+    def profile(self, enabled: bool = True, directory: Optional[str] = None):
+        """
+        cProfile the enclosed block when enabled; writes <dataset>_<timestamp>.prof
+        and prints the top functions by cumulative time
+        """
+        if not enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            directory = Path(directory or METRICS_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{self.dataset}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.prof"
+            profiler.dump_stats(str(path))
+
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+            print(f"\nProfile written to {path}")
+            print(output.getvalue())
+
+
+class InstrumentedSession:
+    """
+    Wraps a requests.Session (or the cassette record/replay sessions) and
+    records the latency and size of every call into a RunMetrics. Idempotent
+    reads that hit a transient failure are retried and counted as 'retries'.
+    """
+
+    def __init__(self, metrics: RunMetrics, session=None, max_retries: int = MAX_RETRIES,
+                 backoff_s: float = RETRY_BACKOFF_S):
+        self.metrics = metrics
+        self.session = session or requests.Session()
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+
+    def __getattr__(self, name):
+        # headers, request_counts, close() etc. come from the wrapped session
+        return getattr(self.session, name)
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        """Seconds to wait before retry number attempt + 1"""
+        retry_after = (getattr(response, 'headers', None) or {}).get('Retry-After')
+        if retry_after and str(retry_after).isdigit():
+            return min(float(retry_after), RETRY_MAX_DELAY_S)
+        return min(self.backoff_s * 2 ** attempt, RETRY_MAX_DELAY_S)
+
+    def request(self, method, url, *args, **kwargs):
+        retryable = method.upper() in RETRY_METHODS
+        attempt = 0
+        while True:
+            may_retry = retryable and attempt < self.max_retries
+            try:
+                response = self._send(method, url, may_retry, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not may_retry:
+                    raise
+                delay = self._retry_delay(attempt)
+            else:
+                if not may_retry or response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._retry_delay(attempt, response)
+
+            self.metrics.count('retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, method, url, may_retry, *args, **kwargs):
+        """One HTTP call, recorded into the metrics"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, *args, **kwargs)
+        except Exception as e:
+            retried = may_retry and isinstance(e, (requests.ConnectionError, requests.Timeout))
+            self.metrics.record_request(method, url, None, time.perf_counter() - start, retried=retried)
+            raise
+
+        body = response.request.body if response.request is not None else None
+        if body is None and kwargs.get('json') is not None:
+            # Synthetic responses (cassette replay) carry no prepared request
+            body = json.dumps(kwargs['json'])
+        bytes_sent = len(body.encode('utf-8') if isinstance(body, str) else body or b'')
+
+        self.metrics.record_request(
+            method, url, response.status_code, time.perf_counter() - start,
+            bytes_sent=bytes_sent, bytes_received=len(response.content or b''),
+            retried=may_retry and response.status_code in RETRY_STATUSES
+        )
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
@@ -0,0 +1,396 @@
+"""
+Sync Orchestrator
+Runs the sync jobs as a dependency graph instead of one after another:
+
+    po ─────────────┬─> refresh_metrics     (refresh_dashboard_metrics RPC)
+    shipments ──────┴─> po_links            (po_links.py)
+    po ───────────────> material_matches    (material_matcher.py)
+    po, shipments, delivery_dates ─┬─> rollups        (dashboard_rollups.py)
+                                   └─> delivery_risk  (delivery_risk.py)
+    samsara                                 (independent)
+
+The po, shipments and delivery_dates nodes refresh the materialized views
+over their own table as soon as their upload succeeds
+(supabase/materialized_views.sql); samsara refreshes its own after the
+tracker upsert.
+
+A node starts on the thread pool as soon as all of its dependencies have
+succeeded, so an end-to-end refresh takes as long as the longest chain
+rather than the sum of every job. Each node has its own timeout; a node that
+fails or times out only skips the nodes downstream of it.
+
+Usage:
+    python sync_orchestrator.py
+    python sync_orchestrator.py --skip samsara
+    python sync_orchestrator.py --timeout po=300 --timeout samsara=600
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+import requests
+from dotenv import load_dotenv
+
+from local_mirror import LocalMirror
+from material_matcher import MaterialMatcher
+from supabase_rest import refresh_views
+from sync_delivery_dates import ReadyByDatesSync
+from sync_metrics import RunMetrics
+from sync_po_shipment_data import POShipmentSyncService
+from sync_samsara_data import SamsaraSyncService
+
+# Load environment variables
+load_dotenv()
+
+# Per-node timeouts in seconds (override with --timeout NODE=SECONDS)
+DEFAULT_TIMEOUTS = {
+    'po': 600,
+    'shipments': 600,
+    'delivery_dates': 600,
+    'samsara': 900,
+    'refresh_metrics': 120,
+    'po_links': 300,
+    'rollups': 300,
+    'delivery_risk': 300,
+    'material_matches': 300,
+}
+
+
+class SyncNode:
+    """One job in the graph"""
+
+    def __init__(self, name: str, func: Callable[[], Dict], depends_on: Sequence[str] = (),
+                 timeout_s: float = 600):
+        """
+        Args:
+            name: Node name, as used in depends_on and --skip
+            func: Runs the job and returns a result dict with a 'success' key
+            depends_on: Nodes that must succeed before this one starts
+            timeout_s: Seconds after start before the node counts as timed out
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout_s = timeout_s
+
+
+class SyncOrchestrator:
+    """Runs SyncNodes concurrently in dependency order"""
+
+    def __init__(self, nodes: List[SyncNode], max_workers: Optional[int] = None):
+        self.nodes = {node.name: node for node in nodes}
+        self.max_workers = max_workers or max(len(nodes), 1)
+        # Timed-out nodes whose threads are still running (Python threads cannot be killed)
+        self.abandoned: List[str] = []
+        self._check_graph()
+
+    def _check_graph(self) -> None:
+        """Reject unknown dependencies and cycles up front"""
+        for node in self.nodes.values():
+            unknown = [dep for dep in node.depends_on if dep not in self.nodes]
+            if unknown:
+                raise ValueError(f"Node '{node.name}' depends on unknown node(s): {', '.join(unknown)}")
+
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dep in self.nodes[name].depends_on:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.nodes:
+            visit(name, [])
+
+    @staticmethod
+    def _outcome(status: str, started: float, finished: float, result=None, error=None) -> Dict:
+        return {
+            'status': status,
+            'started_s': started,
+            'seconds': finished - started,
+            'result': result,
+            'error': error
+        }
+
+    def run(self) -> Dict[str, Dict]:
+        """
+        Run every node once
+
+        Returns:
+            Dictionary of node name -> {'status', 'started_s', 'seconds',
+            'result', 'error'}; status is 'success', 'failed', 'timeout' or
+            'skipped' and started_s is the offset from the start of the run
+        """
+        results: Dict[str, Dict] = {}
+        pending = dict(self.nodes)
+        running = {}  # future -> (node, start offset)
+        run_start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync')
+
+        try:
+            while pending or running:
+                now = time.perf_counter() - run_start
+
+                # Skip nodes behind a failure, start nodes whose dependencies all succeeded.
+                # Loop until nothing changes so skips cascade down the graph.
+                changed = True
+                while changed:
+                    changed = False
+                    for name, node in list(pending.items()):
+                        statuses = {dep: results[dep]['status'] for dep in node.depends_on if dep in results}
+                        blocked = [dep for dep, status in statuses.items() if status != 'success']
+                        if blocked:
+                            print(f"[orchestrator] Skipping {name}: {', '.join(blocked)} did not succeed")
+                            results[name] = self._outcome('skipped', now, now,
+                                                          error=f"upstream {', '.join(blocked)} did not succeed")
+                            del pending[name]
+                            changed = True
+                        elif len(statuses) == len(node.depends_on):
+                            print(f"[orchestrator] Starting {name}")
+                            running[executor.submit(node.func)] = (node, now)
+                            del pending[name]
+
+                if not running:
+                    continue
+
+                deadline = min(started + node.timeout_s for node, started in running.values())
+                done, _ = wait(list(running), timeout=max(deadline - now, 0), return_when=FIRST_COMPLETED)
+                now = time.perf_counter() - run_start
+
+                for future in done:
+                    node, started = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        results[node.name] = self._outcome('failed', started, now, error=f"{type(e).__name__}: {e}")
+                    else:
+                        success = bool(result and result.get('success'))
+                        results[node.name] = self._outcome(
+                            'success' if success else 'failed', started, now,
+                            result=result, error=None if success else (result or {}).get('error')
+                        )
+                    print(f"[orchestrator] {node.name}: {results[node.name]['status']} "
+                          f"({results[node.name]['seconds']:.1f}s)")
+
+                for future, (node, started) in list(running.items()):
+                    if now - started >= node.timeout_s:
+                        future.cancel()
+                        running.pop(future)
+                        self.abandoned.append(node.name)
+                        results[node.name] = self._outcome('timeout', started, now,
+                                                           error=f"no result after {node.timeout_s:g}s")
+                        print(f"[orchestrator] {node.name}: timed out after {node.timeout_s:g}s")
+        finally:
+            # Do not wait for abandoned threads; main() exits without joining them
+            executor.shutdown(wait=not self.abandoned, cancel_futures=True)
+
+        return results
+
+    def critical_path(self, results: Dict[str, Dict]) -> List[str]:
+        """Chain of nodes that ended last, following the latest-finishing dependency"""
+        finished = {name: outcome['started_s'] + outcome['seconds'] for name, outcome in results.items()}
+        if not finished:
+            return []
+        path = [max(finished, key=finished.get)]
+        while True:
+            deps = [dep for dep in self.nodes[path[-1]].depends_on if dep in finished]
+            if not deps:
+                break
+            path.append(max(deps, key=finished.get))
+        return list(reversed(path))
+
+
+def finish_run(service, result: Dict) -> Dict:
+    """Close out a node's RunMetrics the way the standalone scripts do"""
+    if not result['success']:
+        service.metrics.count('errors')
+    service.metrics.finish(success=result['success'])
+    service.metrics.write_report()
+    service.metrics.write_ledger(service.session, service.supabase_url, service.supabase_headers)
+    return result
+
+
+def build_nodes(session_factory: Callable = requests.Session, samsara_hours_back: int = 24,
+                timeouts: Optional[Dict[str, float]] = None) -> List[SyncNode]:
+    """
+    The standard sync graph
+
+    Every node builds its own service, HTTP session, RunMetrics and mirror
+    connection, so nodes share no state across threads and each writes its
+    own sync_runs row.
+
+    Args:
+        session_factory: Returns a new requests.Session-like object per node
+        samsara_hours_back: Hours of location history the samsara node fetches
+        timeouts: Per-node timeout overrides in seconds
+    """
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+
+    def po():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('purchase_orders'),
+                                        mirror=LocalMirror())
+        return finish_run(service, with_views(service, service.sync_purchase_orders(), 'purchase_orders'))
+
+    def shipments():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('shipments'),
+                                        mirror=LocalMirror())
+        return finish_run(service, with_views(service, service.sync_shipments(), 'shipments'))
+
+    def delivery_dates():
+        service = ReadyByDatesSync(session=session_factory(), mirror=LocalMirror())
+        return finish_run(service, with_views(service, service.sync_ready_dates(), 'delivery_dates'))
+
+    def samsara():
+        service = SamsaraSyncService(session=session_factory(), mirror=LocalMirror())
+        stats = service.sync_trackers(hours_back=samsara_hours_back)
+        service.metrics.count('errors', stats['errors'])
+        result = {'success': stats['errors'] == 0, 'count': stats['trackers_fetched'], 'stats': stats}
+        if not result['success']:
+            result['error'] = f"{stats['errors']} error(s)"
+        service.metrics.finish(success=result['success'])
+        service.metrics.write_report()
+        service.metrics.write_ledger(service.session, service.supabase_url, service.supabase_headers)
+        return result
+
+    def refresh_metrics():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('dashboard_metrics'))
+        return finish_run(service, service.refresh_metrics())
+
+    def po_links():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('po_links'),
+                                        mirror=LocalMirror())
+        return finish_run(service, service.refresh_po_links())
+
+    def rollups():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('dashboard_rollups'),
+                                        mirror=LocalMirror())
+        return finish_run(service, service.refresh_rollups())
+
+    def delivery_risk():
+        service = POShipmentSyncService(session=session_factory(), metrics=RunMetrics('delivery_risk'),
+                                        mirror=LocalMirror())
+        return finish_run(service, service.refresh_delivery_risk())
+
+    def material_matches():
+        matcher = MaterialMatcher(session=session_factory(), mirror=LocalMirror())
+        return finish_run(matcher, matcher.run())
+
+    return [
+        SyncNode('po', po, timeout_s=timeouts['po']),
+        SyncNode('shipments', shipments, timeout_s=timeouts['shipments']),
+        SyncNode('delivery_dates', delivery_dates, timeout_s=timeouts['delivery_dates']),
+        SyncNode('samsara', samsara, timeout_s=timeouts['samsara']),
+        SyncNode('refresh_metrics', refresh_metrics, ('po', 'shipments'), timeouts['refresh_metrics']),
+        SyncNode('po_links', po_links, ('po', 'shipments'), timeouts['po_links']),
+        SyncNode('rollups', rollups, ('po', 'shipments', 'delivery_dates'), timeouts['rollups']),
+        SyncNode('delivery_risk', delivery_risk, ('po', 'shipments', 'delivery_dates'),
+                 timeouts['delivery_risk']),
+        SyncNode('material_matches', material_matches, ('po',), timeouts['material_matches']),
+    ]
+
+
+def with_views(service, result: Dict, table: str) -> Dict:
+    """Refresh the materialized views over a table once its sync has succeeded"""
+    if result['success']:
+        views = refresh_views(service.session, service.supabase_url, service.supabase_headers, [table],
+                          service.metrics)
+        if not views['success']:
+            service.metrics.count('errors')
+    return result
+
+
+def prune_nodes(nodes: List[SyncNode], skip: Sequence[str]) -> List[SyncNode]:
+    """Drop skipped nodes; their dependents then run without waiting for them"""
+    skip = set(skip)
+    kept = [node for node in nodes if node.name not in skip]
+    for node in kept:
+        node.depends_on = tuple(dep for dep in node.depends_on if dep not in skip)
+    return kept
+
+
+def print_results(orchestrator: SyncOrchestrator, results: Dict[str, Dict], wall_s: float) -> None:
+    print("\n" + "=" * 80)
+    print("SYNC ORCHESTRATOR SUMMARY")
+    print("=" * 80)
+    print(f"{'Node':<18} {'Status':<9} {'Start s':>8} {'Seconds':>8}  Detail")
+    print("-" * 80)
+    for name, outcome in sorted(results.items(), key=lambda item: item[1]['started_s']):
+        result = outcome['result'] or {}
+        detail = outcome['error'] or (f"{result['count']} rows" if 'count' in result else '')
+        print(f"{name:<18} {outcome['status']:<9} {outcome['started_s']:8.1f} {outcome['seconds']:8.1f}  "
+              f"{str(detail)[:36]}")
+    print("-" * 80)
+    serial_s = sum(outcome['seconds'] for outcome in results.values())
+    print(f"Wall time: {wall_s:.1f}s (sum of node times: {serial_s:.1f}s)")
+    print(f"Critical path: {' -> '.join(orchestrator.critical_path(results))}")
+    print("=" * 80)
+
+
+def parse_timeouts(values: List[str]) -> Dict[str, float]:
+    timeouts = {}
+    for value in values:
+        name, _, seconds = value.partition('=')
+        if name not in DEFAULT_TIMEOUTS or not seconds:
+            raise argparse.ArgumentTypeError(f"expected NODE=SECONDS with NODE one of {', '.join(DEFAULT_TIMEOUTS)}")
+        timeouts[name] = float(seconds)
+    return timeouts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run all syncs as a dependency graph')
+    parser.add_argument('--skip', action='append', default=[], choices=list(DEFAULT_TIMEOUTS),
+                        help='Leave a node out of the run (repeatable)')
+    parser.add_argument('--timeout', action='append', default=[], metavar='NODE=SECONDS',
+                        help='Override a node timeout (repeatable)')
+    parser.add_argument('--samsara-hours-back', type=int, default=24,
+                        help='Hours of location history for the samsara node (default: 24)')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Threads to run nodes on (default: one per node)')
+    args = parser.parse_args(argv)
+
+    try:
+        timeouts = parse_timeouts(args.timeout)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    nodes = prune_nodes(build_nodes(samsara_hours_back=args.samsara_hours_back, timeouts=timeouts), args.skip)
+    orchestrator = SyncOrchestrator(nodes, max_workers=args.max_workers)
+
+    metrics = RunMetrics('orchestrator')
+    results = orchestrator.run()
+    for name, outcome in results.items():
+        metrics.phases[name] = outcome['seconds']
+    failed = [name for name, outcome in results.items() if outcome['status'] != 'success']
+    metrics.count('errors', len(failed))
+    metrics.finish(success=not failed)
+
+    print_results(orchestrator, results, metrics.duration)
+    metrics.write_report()
+    supabase_key = os.getenv('SUPABASE_ANON_KEY')
+    if os.getenv('SUPABASE_URL') and supabase_key:
+        metrics.write_ledger(requests.Session(), os.getenv('SUPABASE_URL'), {
+            'apikey': supabase_key,
+            'Authorization': f'Bearer {supabase_key}',
+            'Content-Type': 'application/json'
+        })
+
+    code = 1 if failed else 0
+    if orchestrator.abandoned:
+        # A timed-out node's thread may still be blocked on I/O; interpreter
+        # shutdown would join it, so leave without waiting
+        sys.stdout.flush()
+        os._exit(code)
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
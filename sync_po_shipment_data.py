@@ -2,6 +2,7 @@
 Sync PO & Shipment Data from Excel to Supabase
 Reads "PO & Shipment Log.xlsx" and uploads to Supabase for auto-updating dashboard
 """
+import argparse
 import os
 import sys
 import pandas as pd
@@ -9,6 +10,16 @@ import requests
 from dotenv import load_dotenv
 from datetime import datetime
 from pathlib import Path
+from checkpoint import UploadCheckpoint, file_sha256, quarantine_rejected, upload_batches
+from dashboard_rollups import DashboardRollups
+from delivery_risk import DeliveryRiskScorer
+from excel_reader import read_excel
+from local_mirror import LocalMirror
+from metrics_history import MetricsHistory
+from po_links import POLinkSync
+from row_validation import quarantine_invalid
+from supabase_rest import insert_bisecting, refresh_views
+from sync_metrics import InstrumentedSession, RunMetrics
 
 # Load environment variables
 load_dotenv()
@@ -22,7 +33,14 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
 
 class POShipmentSyncService:
-    def __init__(self):
+    def __init__(self, session=None, metrics=None, mirror=None, dry_run=False):
+        self.metrics = metrics or RunMetrics('po_shipments')
+        # LocalMirror kept in step with each upload; dry runs only diff against it
+        self.mirror = mirror
+        self.dry_run = dry_run
+        # Excel row number of each record read, per table (for quarantine and upload logs)
+        self.excel_rows = {}
+        self.session = InstrumentedSession(self.metrics, session or requests.Session())
         self.supabase_url = SUPABASE_URL
         self.supabase_key = SUPABASE_KEY
         self.supabase_headers = {
@@ -50,32 +68,36 @@ class POShipmentSyncService:
 
         return df
 
-    def sync_purchase_orders(self):
-        """Sync PO data from Excel to Supabase"""
-        print("\n1. Syncing Purchase Orders...")
+    def read_purchase_orders(self):
+        """Read the PO Parts Log sheet into purchase_orders rows"""
+        # Read PO data from Excel
+        print("   Reading PO data from Excel...")
+        with self.metrics.phase('read_po_excel'):
+            po_df = read_excel(EXCEL_FILE, sheet_name="PO Parts Log")
+        self.metrics.count('rows_read', len(po_df))
 
-        try:
-            # Read PO data from Excel
-            print("   Reading PO data from Excel...")
-            po_df = pd.read_excel(EXCEL_FILE, sheet_name="PO Parts Log")
+        # Clean column names (remove spaces, special chars)
+        po_df.columns = po_df.columns.str.strip()
 
-            # Clean column names (remove spaces, special chars)
-            po_df.columns = po_df.columns.str.strip()
-
-            # Clean data
+        # Clean data
+        with self.metrics.phase('clean_po'):
             po_df = self.clean_dataframe(po_df)
 
-            # Helper function to convert to numeric or None
-            def to_numeric(value):
-                if value is None or pd.isna(value):
-                    return None
-                try:
-                    return float(value)
-                except (ValueError, TypeError):
-                    return None
-
-            # Map Excel columns to database columns
-            po_records = []
+        # Helper function to convert to numeric or None
+        def to_numeric(value):
+            if value is None or pd.isna(value):
+                return None
+            try:
+                return float(value)
+            except (ValueError, TypeError):
+                return None
+
+        # Header is row 1, so DataFrame row i is Excel row i + 2
+        self.excel_rows['purchase_orders'] = [int(index) + 2 for index in po_df.index]
+
+        # Map Excel columns to database columns
+        po_records = []
+        with self.metrics.phase('map_po'):
             for _, row in po_df.iterrows():
                 record = {
                     'purchase_order_id': row.get('Purchase Order ID'),
@@ -113,42 +135,71 @@ class POShipmentSyncService:
                 }
                 po_records.append(record)
 
-            print(f"   Uploading {len(po_records)} PO records to Supabase...")
-
-            # Clear all existing data
-            print("   Clearing old PO data...")
-            delete_url = f"{self.supabase_url}/rest/v1/purchase_orders?id=gte.0"
-            delete_response = requests.delete(
-                delete_url,
-                headers={**self.supabase_headers, 'Prefer': 'return=minimal'}
-            )
-
-            if delete_response.status_code not in [200, 204]:
-                print(f"   Warning: Could not clear old PO data: {delete_response.status_code} - {delete_response.text}")
-
-            # Insert new data in batches
-            batch_size = 100
-            inserted = 0
-
-            for i in range(0, len(po_records), batch_size):
-                batch = po_records[i:i+batch_size]
-
-                insert_url = f"{self.supabase_url}/rest/v1/purchase_orders"
-                insert_response = requests.post(
-                    insert_url,
-                    headers=self.supabase_headers,
-                    json=batch
-                )
+        return po_records
 
-                if insert_response.status_code in [200, 201]:
-                    inserted += len(batch)
-                    print(f"   Inserted batch {i//batch_size + 1}: {inserted}/{len(po_records)} records")
-                else:
-                    print(f"   Error inserting batch: {insert_response.text}")
-                    return {'success': False, 'error': insert_response.text}
+    def sync_purchase_orders(self):
+        """Sync PO data from Excel to Supabase"""
+        print("\n1. Syncing Purchase Orders...")
 
-            print(f"   Successfully synced {inserted} PO records")
-            return {'success': True, 'count': inserted}
+        try:
+            # An unfinished upload of this same workbook resumes from its cached rows
+            workbook_hash = file_sha256(EXCEL_FILE)
+            checkpoint = None if self.dry_run else UploadCheckpoint.load('purchase_orders', workbook_hash)
+            if checkpoint:
+                print(f"   Resuming sync {checkpoint.sync_id[:8]} at batch {checkpoint.committed + 1}/"
+                      f"{checkpoint.batch_count} ({checkpoint.remaining_rows} records left)")
+                po_records = checkpoint.rows
+            else:
+                po_records = self.read_purchase_orders()
+                with self.metrics.phase('validate_po'):
+                    validation = quarantine_invalid('purchase_orders', po_records,
+                                                    self.excel_rows.get('purchase_orders'), self.metrics)
+                if po_records and not validation['valid']:
+                    return {'success': False, 'error': 'Every PO row failed validation; see the quarantine report'}
+                po_records = validation['valid']
+                self.excel_rows['purchase_orders'] = validation['excel_rows']
+
+                if self.mirror:
+                    with self.metrics.phase('mirror_diff_po'):
+                        self.mirror.print_diff('purchase_orders', po_records)
+                if self.dry_run:
+                    print("   Dry run: Supabase not changed")
+                    return {'success': True, 'count': len(po_records), 'dry_run': True}
+
+                checkpoint = UploadCheckpoint.start('purchase_orders', workbook_hash, po_records,
+                                                    excel_rows=self.excel_rows.get('purchase_orders'))
+
+            if not checkpoint.cleared:
+                print(f"   Uploading {len(po_records)} PO records to Supabase...")
+
+                # Clear all existing data
+                print("   Clearing old PO data...")
+                delete_url = f"{self.supabase_url}/rest/v1/purchase_orders?id=gte.0"
+                with self.metrics.phase('delete_po'):
+                    delete_response = self.session.delete(
+                        delete_url,
+                        headers={**self.supabase_headers, 'Prefer': 'return=minimal'}
+                    )
+
+                if delete_response.status_code not in [200, 204]:
+                    print(f"   Warning: Could not clear old PO data: {delete_response.status_code} - {delete_response.text}")
+                checkpoint.mark_cleared()
+
+            # Insert new data in batches, checkpointing each one
+            with self.metrics.phase('upload_po'):
+                upload = upload_batches(self.session, self.supabase_url, self.supabase_headers, checkpoint,
+                                        metrics=self.metrics)
+            if not upload['success']:
+                return {'success': False, 'error': upload['error']}
+            if upload['rejected']:
+                rejected = set(upload['rejected'])
+                po_records = [record for i, record in enumerate(po_records) if i not in rejected]
+
+            print(f"   Successfully synced {len(po_records)} PO records")
+            if self.mirror:
+                with self.metrics.phase('mirror_po'):
+                    self.mirror.record('purchase_orders', po_records)
+            return {'success': True, 'count': len(po_records)}
 
         except Exception as e:
             print(f"   Error syncing PO data: {e}")
@@ -163,16 +214,21 @@ class POShipmentSyncService:
         try:
             # Read shipment data from Excel
             print("   Reading shipment data from Excel...")
-            ship_df = pd.read_excel(EXCEL_FILE, sheet_name="Shipment Log")
+            with self.metrics.phase('read_shipment_excel'):
+                ship_df = read_excel(EXCEL_FILE, sheet_name="Shipment Log")
+            self.metrics.count('rows_read', len(ship_df))
 
             # Clean column names
             ship_df.columns = ship_df.columns.str.strip()
 
             # Remove duplicate shipment numbers (keep last occurrence)
+            rows_before = len(ship_df)
             ship_df = ship_df.drop_duplicates(subset=['Shipment #'], keep='last')
+            self.metrics.count('rows_skipped', rows_before - len(ship_df))
 
             # Clean data
-            ship_df = self.clean_dataframe(ship_df)
+            with self.metrics.phase('clean_shipments'):
+                ship_df = self.clean_dataframe(ship_df)
 
             # Rename columns to match database schema
             ship_df = ship_df.rename(columns={
@@ -208,62 +264,85 @@ class POShipmentSyncService:
             # Add synced_at timestamp
             ship_df['synced_at'] = datetime.utcnow().isoformat()
 
-            # Convert to records (list of dicts)
+            # Convert to records (list of dicts); duplicates dropped above keep their Excel rows
             ship_records = ship_df.to_dict('records')
+            self.excel_rows['shipments'] = [int(index) + 2 for index in ship_df.index]
 
             # Ensure all values are JSON-serializable and correct types
-            for record in ship_records:
-                for key, value in record.items():
-                    if pd.isna(value) or value is None:
-                        record[key] = None
-                    elif isinstance(value, (pd.Timestamp, datetime)):
-                        record[key] = value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)
-                    elif key in ['rts_date', 'eta', 'delivery_date'] and isinstance(value, str):
-                        # Handle dates that might have multiple values like "1/7/2026; 1/8/2026"
-                        if ';' in value:
-                            value = value.split(';')[0].strip()  # Take first date
-                        # Ensure it's in proper YYYY-MM-DD format or set to None
-                        try:
-                            parsed_date = pd.to_datetime(value, errors='coerce')
-                            record[key] = parsed_date.strftime('%Y-%m-%d') if not pd.isna(parsed_date) else None
-                        except:
+            with self.metrics.phase('clean_shipments'):
+                for record in ship_records:
+                    for key, value in record.items():
+                        if pd.isna(value) or value is None:
                             record[key] = None
-                    elif key in ['num_pieces', 'num_loads'] and value is not None:
-                        # Convert to int (handle floats like 1.0)
-                        try:
-                            record[key] = int(float(value))
-                        except (ValueError, TypeError):
+                        elif isinstance(value, (pd.Timestamp, datetime)):
+                            record[key] = value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)
+                        elif key in ['rts_date', 'eta', 'delivery_date'] and isinstance(value, str):
+                            # Handle dates that might have multiple values like "1/7/2026; 1/8/2026"
+                            if ';' in value:
+                                value = value.split(';')[0].strip()  # Take first date
+                            # Ensure it's in proper YYYY-MM-DD format or set to None
+                            try:
+                                parsed_date = pd.to_datetime(value, errors='coerce')
+                                record[key] = parsed_date.strftime('%Y-%m-%d') if not pd.isna(parsed_date) else None
+                            except:
+                                record[key] = None
+                        elif key in ['num_pieces', 'num_loads'] and value is not None:
+                            # Convert to int (handle floats like 1.0)
+                            try:
+                                record[key] = int(float(value))
+                            except (ValueError, TypeError):
+                                record[key] = None
+                        elif isinstance(value, (float, int)) and (pd.isna(value) or value in [float('inf'), float('-inf')]):
                             record[key] = None
-                    elif isinstance(value, (float, int)) and (pd.isna(value) or value in [float('inf'), float('-inf')]):
-                        record[key] = None
+
+            with self.metrics.phase('validate_shipments'):
+                validation = quarantine_invalid('shipments', ship_records, self.excel_rows['shipments'],
+                                                self.metrics)
+            if ship_records and not validation['valid']:
+                return {'success': False, 'error': 'Every shipment row failed validation; see the quarantine report'}
+            ship_records = validation['valid']
+            self.excel_rows['shipments'] = validation['excel_rows']
+
+            if self.mirror:
+                with self.metrics.phase('mirror_diff_shipments'):
+                    self.mirror.print_diff('shipments', ship_records)
+            if self.dry_run:
+                print("   Dry run: Supabase not changed")
+                return {'success': True, 'count': len(ship_records), 'dry_run': True}
 
             print(f"   Uploading {len(ship_records)} shipment records to Supabase...")
 
             # Clear existing data
             delete_url = f"{self.supabase_url}/rest/v1/shipments"
-            delete_response = requests.delete(
-                delete_url,
-                headers={**self.supabase_headers, 'Prefer': 'return=minimal'},
-                params={'id': 'gt.0'}
-            )
+            with self.metrics.phase('delete_shipments'):
+                delete_response = self.session.delete(
+                    delete_url,
+                    headers={**self.supabase_headers, 'Prefer': 'return=minimal'},
+                    params={'id': 'gt.0'}
+                )
 
             if delete_response.status_code not in [200, 204]:
                 print(f"   Warning: Could not clear old shipment data: {delete_response.text}")
 
             # Insert new data
             insert_url = f"{self.supabase_url}/rest/v1/shipments"
-            insert_response = requests.post(
-                insert_url,
-                headers=self.supabase_headers,
-                json=ship_records
-            )
-
-            if insert_response.status_code in [200, 201]:
-                print(f"   Successfully synced {len(ship_records)} shipment records")
-                return {'success': True, 'count': len(ship_records)}
-            else:
-                print(f"   Error inserting shipments: {insert_response.text}")
-                return {'success': False, 'error': insert_response.text}
+            with self.metrics.phase('upload_shipments'):
+                insert = insert_bisecting(self.session, insert_url, self.supabase_headers, ship_records)
+            self.metrics.count('rows_written', insert['inserted'])
+
+            if not insert['success']:
+                print(f"   Error inserting shipments: {insert['error']}")
+                return {'success': False, 'error': insert['error']}
+
+            if insert['rejected']:
+                rejected = set(quarantine_rejected('shipments', ship_records, insert['rejected'],
+                                                   self.excel_rows['shipments'], metrics=self.metrics))
+                ship_records = [record for i, record in enumerate(ship_records) if i not in rejected]
+            print(f"   Successfully synced {len(ship_records)} shipment records")
+            if self.mirror:
+                with self.metrics.phase('mirror_shipments'):
+                    self.mirror.record('shipments', ship_records)
+            return {'success': True, 'count': len(ship_records)}
 
         except Exception as e:
             print(f"   Error syncing shipment data: {e}")
@@ -278,13 +357,16 @@ class POShipmentSyncService:
         try:
             # Call the refresh_dashboard_metrics() function
             rpc_url = f"{self.supabase_url}/rest/v1/rpc/refresh_dashboard_metrics"
-            response = requests.post(
-                rpc_url,
-                headers=self.supabase_headers
-            )
+            with self.metrics.phase('refresh_dashboard_metrics'):
+                response = self.session.post(
+                    rpc_url,
+                    headers=self.supabase_headers
+                )
 
             if response.status_code in [200, 204]:
                 print("   Dashboard metrics refreshed successfully")
+                history = MetricsHistory(self.session, self.supabase_url, self.supabase_key, self.metrics)
+                history.record(self.metrics)
                 return {'success': True}
             else:
                 print(f"   Error refreshing metrics: {response.text}")
@@ -294,8 +376,42 @@ class POShipmentSyncService:
             print(f"   Error refreshing metrics: {e}")
             return {'success': False, 'error': str(e)}
 
+    def refresh_po_links(self):
+        """Rebuild the PO <-> shipment link tables from the freshly synced data"""
+        return POLinkSync(self.session, self.supabase_url, self.supabase_key,
+                          mirror=self.mirror, metrics=self.metrics).run()
+
+    def refresh_rollups(self):
+        """Rebuild the dashboard rollup tables from the freshly synced data"""
+        return DashboardRollups(self.session, self.supabase_url, self.supabase_key,
+                                mirror=self.mirror, metrics=self.metrics).run()
+
+    def refresh_delivery_risk(self):
+        """Rescore delivery_risk_scores from the freshly synced data"""
+        return DeliveryRiskScorer(self.session, self.supabase_url, self.supabase_key,
+                                  mirror=self.mirror, metrics=self.metrics).run()
+
+
+# RunMetrics dataset name per --only value
+DATASETS = {None: 'po_shipments', 'po': 'purchase_orders', 'shipments': 'shipments'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync PO & Shipment Log.xlsx to Supabase')
+    parser.add_argument('--only', choices=['po', 'shipments'],
+                        help='Sync only purchase orders or only shipments (default: both)')
+    parser.add_argument('--no-refresh', action='store_true',
+                        help='Skip refreshing the materialized views, dashboard metrics, rollups and risk scores')
+    parser.add_argument('--profile', action='store_true',
+                        help='Run the sync under cProfile and write a .prof file next to the metrics report')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Parse the workbook and diff it against the local mirror without writing to Supabase')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Do not update the local SQLite mirror')
+    args = parser.parse_args(argv)
+    if args.dry_run and args.no_mirror:
+        parser.error('--dry-run needs the local mirror')
 
-def main():
     print("=" * 80)
     print("PO & SHIPMENT DATA SYNC")
     print("=" * 80)
@@ -311,30 +427,82 @@ def main():
 
     try:
         # Create sync service
-        sync_service = POShipmentSyncService()
-
-        # Sync purchase orders
-        po_result = sync_service.sync_purchase_orders()
-        if not po_result['success']:
+        sync_service = POShipmentSyncService(
+            metrics=RunMetrics(DATASETS[args.only]),
+            mirror=None if args.no_mirror else LocalMirror(),
+            dry_run=args.dry_run
+        )
+        metrics = sync_service.metrics
+        po_result = ship_result = views_result = links_result = metrics_result = rollup_result = risk_result = None
+
+        with metrics.profile(args.profile):
+            # Sync purchase orders
+            if args.only in (None, 'po'):
+                po_result = sync_service.sync_purchase_orders()
+
+            # Sync shipments
+            if args.only in (None, 'shipments') and (po_result is None or po_result['success']):
+                ship_result = sync_service.sync_shipments()
+
+            # Refresh materialized views over whatever was uploaded
+            synced_tables = [table for table, result in (('purchase_orders', po_result), ('shipments', ship_result))
+                             if result and result['success']]
+            if not args.no_refresh and not args.dry_run and synced_tables:
+                views_result = refresh_views(sync_service.session, sync_service.supabase_url,
+                                             sync_service.supabase_headers, synced_tables, sync_service.metrics)
+
+            # Normalized PO <-> shipment links
+            if not args.dry_run and synced_tables:
+                links_result = sync_service.refresh_po_links()
+
+            # Refresh metrics
+            results = [result for result in (po_result, ship_result) if result is not None]
+            if not args.no_refresh and not args.dry_run and results and all(result['success'] for result in results):
+                metrics_result = sync_service.refresh_metrics()
+                rollup_result = sync_service.refresh_rollups()
+                risk_result = sync_service.refresh_delivery_risk()
+
+        if args.dry_run:
+            # Nothing was written, so there is no run to record in the ledger
+            print("\nDry run complete - see the mirror diffs above")
+            sys.exit(0)
+
+        failed = [result for result in (po_result, ship_result, views_result, links_result, metrics_result,
+                                        rollup_result, risk_result)
+                  if result and not result['success']]
+        expected = {None: [po_result, ship_result], 'po': [po_result], 'shipments': [ship_result]}[args.only]
+        synced = all(result and result['success'] for result in expected)
+        metrics.count('errors', len(failed))
+        metrics.finish(success=synced)
+        report = metrics.write_report()
+        metrics.write_ledger(sync_service.session, sync_service.supabase_url, sync_service.supabase_headers)
+
+        if po_result and not po_result['success']:
             print("\nPO sync failed!")
             sys.exit(1)
-
-        # Sync shipments
-        ship_result = sync_service.sync_shipments()
-        if not ship_result['success']:
+        if ship_result and not ship_result['success']:
             print("\nShipment sync failed!")
             sys.exit(1)
 
-        # Refresh metrics
-        metrics_result = sync_service.refresh_metrics()
-
         # Print summary
         print("\n" + "=" * 80)
         print("SYNC COMPLETED SUCCESSFULLY")
         print("=" * 80)
-        print(f"Purchase Orders synced: {po_result.get('count', 0)}")
-        print(f"Shipments synced: {ship_result.get('count', 0)}")
-        print(f"Dashboard metrics: {'Refreshed' if metrics_result['success'] else 'Failed'}")
+        if po_result:
+            print(f"Purchase Orders synced: {po_result.get('count', 0)}")
+        if ship_result:
+            print(f"Shipments synced: {ship_result.get('count', 0)}")
+        if metrics_result:
+            print(f"Dashboard metrics: {'Refreshed' if metrics_result['success'] else 'Failed'}")
+        if links_result and links_result['success']:
+            print(f"PO <-> shipment links: {links_result['links']} ({links_result['pos']} POs)")
+        if rollup_result:
+            print(f"Dashboard rollups: {'Refreshed' if rollup_result['success'] else 'Failed'}")
+        if risk_result and risk_result['success']:
+            print(f"Delivery risk scores: {risk_result['rows']} PO lines "
+                  f"({risk_result['levels'].get('high', 0)} high risk)")
+        metrics.print_summary()
+        print(f"Metrics report: {report['json']}")
         print("=" * 80)
 
         sys.exit(0)
@@ -4,12 +4,20 @@ Fetches tracker data from Samsara API and syncs to Supabase
 Run this script hourly via cron/Task Scheduler or manually
 """
 
+import argparse
 import os
 import sys
 import requests
 from datetime import datetime
 from dotenv import load_dotenv
+from geofence import Geofence, GeofenceRegistry
+from geofence_events import ARRIVAL, EVENTS_TABLE, GeofenceEventDetector
+from local_mirror import LocalMirror
 from samsara_client import SamsaraClient
+from samsara_maintenance import SamsaraHistoryMaintenance
+from supabase_rest import bulk_write, fetch_column, refresh_views
+from sync_metrics import InstrumentedSession, RunMetrics
+from trajectory import TrajectoryCompressor
 
 # Load environment variables
 load_dotenv()
@@ -19,18 +27,66 @@ SITE_LATITUDE = 35.293    # Frame 6B Power Group site, Amarillo TX
 SITE_LONGITUDE = -101.603
 SITE_RADIUS_KM = 0.5  # 500m geofence radius (tighter perimeter)
 
+# Used when the geofences table has not been created or has no active zones
+DEFAULT_SITE_ZONE = Geofence('frame-6b-site', 'Frame 6B Site', SITE_LATITUDE, SITE_LONGITUDE, SITE_RADIUS_KM)
+
+# Rows per bulk request to Supabase
+TRACKER_BATCH_SIZE = 500
+HISTORY_BATCH_SIZE = 5000
+# Tracker ids per latest_samsara_fixes call
+ANCHOR_BATCH_SIZE = 500
+
+# 'latest' stores one fix per tracker per run; 'full' stores every fetched event
+HISTORY_MODE = os.getenv('SAMSARA_HISTORY_MODE', 'latest')
+
+# Error bound (meters) for trail compression in 'full' mode; 0 disables it
+COMPRESSION_ERROR_M = float(os.getenv('SAMSARA_COMPRESSION_ERROR_M', '25'))
+
+
+def empty_stats() -> dict:
+    """Zeroed sync statistics"""
+    return {
+        'trackers_fetched': 0,
+        'trackers_updated': 0,
+        'trackers_created': 0,
+        'locations_added': 0,
+        'locations_compressed': 0,
+        'zone_events': 0,
+        'errors': 0
+    }
+
 
 class SamsaraSyncService:
     """Service for syncing Samsara data to Supabase"""
 
-    def __init__(self):
-        """Initialize sync service"""
-        # Initialize Samsara client
-        self.samsara = SamsaraClient()
+    def __init__(self, samsara_client=None, session=None, supabase_url=None, supabase_key=None,
+                 metrics=None, mirror=None):
+        """
+        Initialize sync service
+
+        Args:
+            samsara_client: SamsaraClient to fetch from. Defaults to a live client
+                built from .env
+            session: HTTP session used for Supabase requests. Defaults to a new
+                requests.Session
+            supabase_url: Supabase project URL. If None, reads SUPABASE_URL
+            supabase_key: Supabase anon key. If None, reads SUPABASE_ANON_KEY
+            metrics: RunMetrics to record phases and HTTP calls into. Defaults
+                to a new RunMetrics('samsara')
+            mirror: LocalMirror to apply tracker upserts to, if any
+        """
+        self.metrics = metrics or RunMetrics('samsara')
+        self.mirror = mirror
+
+        # Initialize Samsara client; its session is wrapped so API pagination shows up in the metrics
+        self.samsara = samsara_client or SamsaraClient()
+        if not isinstance(self.samsara.session, InstrumentedSession):
+            self.samsara.session = InstrumentedSession(self.metrics, self.samsara.session)
 
         # Initialize Supabase REST API client
-        self.supabase_url = os.getenv('SUPABASE_URL')
-        self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        self.session = InstrumentedSession(self.metrics, session or requests.Session())
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_ANON_KEY')
 
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env or GitHub secrets")
@@ -38,10 +94,17 @@ class SamsaraSyncService:
         self.supabase_headers = {
             'apikey': self.supabase_key,
             'Authorization': f'Bearer {self.supabase_key}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
+            'Content-Type': 'application/json'
         }
 
+        # Loaded at the start of each sync; falls back to the single site circle
+        self.geofences = GeofenceRegistry([DEFAULT_SITE_ZONE])
+
+        # Cached across cycles when run by the long-running poller
+        self.known_tracker_ids = None
+        self.zone_state = None
+        self.trail_anchors = None
+
     def calculate_distance(self, lat: float, lon: float) -> float:
         """Calculate distance from site using Haversine formula"""
         return self.samsara.calculate_distance_from_site(lat, lon, SITE_LATITUDE, SITE_LONGITUDE)
@@ -51,12 +114,315 @@ class SamsaraSyncService:
         distance = self.calculate_distance(lat, lon)
         return distance <= SITE_RADIUS_KM
 
-    def sync_trackers(self, hours_back: int = 168) -> dict:
+    def load_geofences(self) -> GeofenceRegistry:
+        """Load active zones from the geofences table into a spatial index"""
+        self.geofences = GeofenceRegistry.load(
+            self.session, self.supabase_url, self.supabase_headers, fallback=[DEFAULT_SITE_ZONE]
+        )
+        return self.geofences
+
+    def assign_zones(self, rows: list, lat_key: str, lon_key: str, accuracy_key: str, on_site_key: str) -> None:
+        """
+        Set zone_ids, uncertain_zone_ids and the on-site flag on rows in
+        place by classifying them as one vectorized batch. Skipped until the
+        geofences table exists, since zone_ids is added by the same migration
+        (geofence_schema.sql); uncertain_zone_ids is only set once
+        geofence_polygon_schema.sql has added it too.
+        """
+        if not self.geofences.from_database:
+            return
+
+        self.geofences.annotate(rows, lat_key, lon_key, accuracy_key=accuracy_key, on_site_key=on_site_key)
+
+    def build_rows(self, trackers: list) -> tuple:
+        """
+        Build samsara_trackers and samsara_location_history rows
+
+        Args:
+            trackers: Trackers from SamsaraClient.get_passive_tracker_locations
+
+        Returns:
+            Tuple of (tracker_rows, history_rows)
+        """
+        synced_at = datetime.utcnow().isoformat()
+        tracker_rows = []
+        history_rows = []
+
+        for tracker in trackers:
+            tracker_data = {
+                'id': tracker['id'],
+                'name': tracker['name'],
+                'type': tracker['type'],
+                'share_link': tracker.get('share_link'),
+                'created_at_samsara': tracker.get('created_at'),
+                'updated_at_samsara': tracker.get('updated_at'),
+                'synced_at': synced_at
+            }
+
+            # Add location data if available
+            if tracker['location'] is not None:
+                loc = tracker['location']
+                lat = loc['latitude']
+                lon = loc['longitude']
+                distance = self.calculate_distance(lat, lon)
+                on_site = distance <= SITE_RADIUS_KM
+
+                tracker_data.update({
+                    'last_latitude': lat,
+                    'last_longitude': lon,
+                    'last_accuracy_meters': loc['accuracy_meters'],
+                    'last_seen_at': tracker['timestamp'],
+                    'is_on_site': on_site,
+                    'distance_from_site_km': round(distance, 2)
+                })
+
+                history_rows.append({
+                    'tracker_id': tracker['id'],
+                    'latitude': lat,
+                    'longitude': lon,
+                    'accuracy_meters': loc['accuracy_meters'],
+                    'happened_at': tracker['timestamp'],
+                    'is_on_site': on_site,
+                    'distance_from_site_km': round(distance, 2)
+                })
+
+            tracker_rows.append(tracker_data)
+
+        self.assign_zones(tracker_rows, 'last_latitude', 'last_longitude', 'last_accuracy_meters', 'is_on_site')
+        self.assign_zones(history_rows, 'latitude', 'longitude', 'accuracy_meters', 'is_on_site')
+        return tracker_rows, history_rows
+
+    def build_trail_rows(self, events: list) -> list:
+        """
+        Build samsara_location_history rows for every event in a location trail
+
+        Args:
+            events: Raw location stream events from Samsara
+
+        Returns:
+            List of history rows, one per (tracker, timestamp)
+        """
+        rows = {}
+        for event in events:
+            tracker_id = event.get('asset', {}).get('id')
+            happened_at = event.get('happenedAtTime')
+            location = event.get('location') or {}
+            lat = location.get('latitude')
+            lon = location.get('longitude')
+
+            if not tracker_id or not happened_at or lat is None or lon is None:
+                continue
+
+            distance = self.calculate_distance(lat, lon)
+            rows[(tracker_id, happened_at)] = {
+                'tracker_id': tracker_id,
+                'latitude': lat,
+                'longitude': lon,
+                'accuracy_meters': location.get('accuracyMeters', 0),
+                'heading_degrees': location.get('headingDegrees'),
+                'happened_at': happened_at,
+                'is_on_site': distance <= SITE_RADIUS_KM,
+                'distance_from_site_km': round(distance, 2)
+            }
+
+        history_rows = list(rows.values())
+        self.assign_zones(history_rows, 'latitude', 'longitude', 'accuracy_meters', 'is_on_site')
+        return history_rows
+
+    def sync_zone_events(self, fixes: list, stats: dict) -> int:
+        """
+        Detect geofence arrivals/departures in a trail and store them
+
+        Args:
+            fixes: History rows for every fetched event
+            stats: Sync statistics; errors are added here
+
+        Returns:
+            Number of events written
+        """
+        if self.zone_state is None:
+            try:
+                self.zone_state = GeofenceEventDetector.load_state(
+                    self.session, self.supabase_url, self.supabase_headers
+                )
+            except Exception as e:
+                print(f"   Error loading geofence state: {e}")
+                stats['errors'] += 1
+                return 0
+
+        events = GeofenceEventDetector(self.geofences).detect(fixes, self.zone_state)
+        if not events:
+            return 0
+
+        result = bulk_write(
+            self.session, self.supabase_url, self.supabase_headers, EVENTS_TABLE, events,
+            on_conflict='tracker_id,zone_id,event_type,happened_at', resolution='ignore-duplicates'
+        )
+        if result['errors']:
+            print(f"   Error writing geofence events: {result['error']}")
+            stats['errors'] += result['errors']
+            # Reload next time rather than trust a state that was not stored
+            self.zone_state = None
+        else:
+            for event in events:
+                self.zone_state[(event['tracker_id'], event['zone_id'])] = {
+                    'state': 'inside' if event['event_type'] == ARRIVAL else 'outside',
+                    'happened_at': event['happened_at']
+                }
+        print(f"   Recorded {result['written']} geofence arrival/departure events")
+        return result['written']
+
+    def load_trail_anchors(self, trail_rows: list) -> dict:
+        """
+        Most recent stored history fix per tracker, to anchor trail compression
+
+        Reads one row per tracker through the latest_samsara_fixes RPC
+        (supabase/samsara_trail_anchors.sql). Long-running pollers keep the
+        anchors between cycles and only look up trackers not seen before.
+
+        Args:
+            trail_rows: History rows about to be compressed
+
+        Returns:
+            Dictionary of tracker_id -> stored row (trackers with nothing
+            stored are left out)
+        """
+        if self.trail_anchors is None:
+            self.trail_anchors = {}
+        missing = sorted({row['tracker_id'] for row in trail_rows} - set(self.trail_anchors))
+
+        for i in range(0, len(missing), ANCHOR_BATCH_SIZE):
+            chunk = missing[i:i + ANCHOR_BATCH_SIZE]
+            response = self.session.post(
+                f"{self.supabase_url}/rest/v1/rpc/latest_samsara_fixes",
+                headers=self.supabase_headers,
+                json={'p_tracker_ids': chunk}
+            )
+            response.raise_for_status()
+            # None marks a tracker that was looked up but has no stored fix
+            self.trail_anchors.update(dict.fromkeys(chunk))
+            for row in response.json():
+                if not self.geofences.from_database:
+                    # New fixes carry no zones yet, so stored zones would look like a transition
+                    row.pop('zone_ids', None)
+                self.trail_anchors[row['tracker_id']] = row
+
+        return {tracker_id: row for tracker_id, row in self.trail_anchors.items() if row}
+
+    def write_snapshot(self, snapshot: dict, stats: dict, history_mode: str = None,
+                       compression_error_m: float = None) -> dict:
+        """
+        Write one fetched snapshot (trackers plus location trail) to Supabase
+
+        Args:
+            snapshot: Output of SamsaraClient.get_passive_tracker_snapshot
+            stats: Sync statistics, updated in place
+            history_mode: See sync_trackers
+            compression_error_m: See sync_trackers
+
+        Returns:
+            The updated stats dictionary
+        """
+        trackers = snapshot['trackers']
+        self.metrics.count('rows_read', len(snapshot['events']))
+
+        # Build every tracker and history row before touching Supabase
+        with self.metrics.phase('build_rows'):
+            tracker_rows, history_rows = self.build_rows(trackers)
+            trail_rows = self.build_trail_rows(snapshot['events'])
+        if (history_mode or HISTORY_MODE) == 'full':
+            # The trail is already downloaded - store all of it
+            history_rows = trail_rows
+
+            error_m = COMPRESSION_ERROR_M if compression_error_m is None else compression_error_m
+            if error_m > 0:
+                with self.metrics.phase('load_trail_anchors'):
+                    try:
+                        anchors = self.load_trail_anchors(history_rows)
+                    except Exception as e:
+                        # Still correct without anchors, just less compact
+                        print(f"   Warning: could not load last stored fixes: {e}")
+                        anchors = {}
+                with self.metrics.phase('compress_trail'):
+                    history_rows, compression = TrajectoryCompressor(error_m).compress(history_rows, anchors)
+                stats['locations_compressed'] += compression['rows_in'] - compression['rows_out']
+                self.metrics.count('rows_skipped', compression['rows_in'] - compression['rows_out'])
+                print(f"   Compressed trail {compression['rows_in']} -> {compression['rows_out']} rows "
+                      f"({compression['dedup_dropped']} duplicates, "
+                      f"{compression['simplify_dropped']} simplified, error bound {error_m:g} m)")
+
+        # One paged read tells us which trackers already exist, so the
+        # upsert can report inserts and updates separately. Long-running
+        # pollers keep the set between cycles.
+        if self.known_tracker_ids is None:
+            with self.metrics.phase('load_tracker_ids'):
+                self.known_tracker_ids = set(fetch_column(
+                    self.session, self.supabase_url, self.supabase_headers, 'samsara_trackers', 'id'
+                ))
+        new_ids = {row['id'] for row in tracker_rows} - self.known_tracker_ids
+
+        with self.metrics.phase('upsert_trackers'):
+            tracker_result = bulk_write(
+                self.session, self.supabase_url, self.supabase_headers, 'samsara_trackers', tracker_rows,
+                batch_size=TRACKER_BATCH_SIZE, resolution='merge-duplicates'
+            )
+        self.metrics.count('rows_written', tracker_result['written'])
+        if tracker_result['errors']:
+            print(f"   Error upserting trackers: {tracker_result['error']}")
+            stats['errors'] += tracker_result['errors']
+        else:
+            stats['trackers_created'] += len(new_ids)
+            stats['trackers_updated'] += len(tracker_rows) - len(new_ids)
+            self.known_tracker_ids |= new_ids
+            if self.mirror:
+                self.mirror.record('samsara_trackers', tracker_rows, replace=False)
+        print(f"   Upserted {len(tracker_rows)} trackers in {tracker_result['requests']} request(s)")
+        if tracker_rows and not tracker_result['errors']:
+            if not refresh_views(self.session, self.supabase_url, self.supabase_headers, ['samsara_trackers'],
+                             self.metrics)['success']:
+                stats['errors'] += 1
+
+        # Add fixes to location history, skipping ones already stored
+        with self.metrics.phase('insert_history'):
+            history_result = bulk_write(
+                self.session, self.supabase_url, self.supabase_headers, 'samsara_location_history', history_rows,
+                batch_size=HISTORY_BATCH_SIZE, on_conflict='tracker_id,happened_at', resolution='ignore-duplicates'
+            )
+        self.metrics.count('rows_written', history_result['written'])
+        if not history_result['errors']:
+            # Fixes already stored from an overlapping window
+            self.metrics.count('rows_skipped', len(history_rows) - history_result['written'])
+        if history_result['errors']:
+            print(f"   Error adding location history: {history_result['error']}")
+            stats['errors'] += history_result['errors']
+            # Reload next time rather than anchor on fixes that were not stored
+            self.trail_anchors = None
+        elif self.trail_anchors is not None:
+            for row in sorted(history_rows, key=lambda row: row['happened_at']):
+                self.trail_anchors[row['tracker_id']] = row
+        stats['locations_added'] += history_result['written']
+        print(f"   Added {history_result['written']} location history rows in {history_result['requests']} request(s)")
+
+        # Arrival/departure events from the uncompressed trail
+        if self.geofences.from_database:
+            with self.metrics.phase('zone_events'):
+                zone_events = self.sync_zone_events(trail_rows, stats)
+            stats['zone_events'] += zone_events
+            self.metrics.count('rows_written', zone_events)
+
+        return stats
+
+    def sync_trackers(self, hours_back: int = 168, history_mode: str = None,
+                      compression_error_m: float = None) -> dict:
         """
         Sync tracker data from Samsara to Supabase
 
         Args:
             hours_back: How many hours of location history to fetch (default: 168 = 7 days)
+            history_mode: 'latest' to store only each tracker's newest fix, or
+                'full' to store every fetched event. Defaults to HISTORY_MODE
+            compression_error_m: Error bound for compressing full trails
+                before insert; 0 stores every event. Defaults to COMPRESSION_ERROR_M
 
         Returns:
             Dictionary with sync statistics
@@ -66,102 +432,22 @@ class SamsaraSyncService:
         print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 80)
 
-        stats = {
-            'trackers_fetched': 0,
-            'trackers_updated': 0,
-            'trackers_created': 0,
-            'locations_added': 0,
-            'errors': 0
-        }
+        stats = empty_stats()
 
         try:
             # Fetch tracker data from Samsara
             print("\n1. Fetching tracker data from Samsara API...")
-            trackers = self.samsara.get_passive_tracker_locations(hours_back=hours_back)
+            with self.metrics.phase('fetch_samsara'):
+                snapshot = self.samsara.get_passive_tracker_snapshot(hours_back=hours_back)
+            trackers = snapshot['trackers']
             stats['trackers_fetched'] = len(trackers)
             print(f"   Found {len(trackers)} passive trackers")
 
-            # Sync each tracker to Supabase
             print("\n2. Syncing trackers to Supabase...")
-
-            for tracker in trackers:
-                try:
-                    tracker_id = tracker['id']
-                    has_location = tracker['location'] is not None
-
-                    # Prepare tracker data
-                    tracker_data = {
-                        'id': tracker_id,
-                        'name': tracker['name'],
-                        'type': tracker['type'],
-                        'share_link': tracker.get('share_link'),
-                        'created_at_samsara': tracker.get('created_at'),
-                        'updated_at_samsara': tracker.get('updated_at'),
-                        'synced_at': datetime.utcnow().isoformat()
-                    }
-
-                    # Add location data if available
-                    if has_location:
-                        loc = tracker['location']
-                        lat = loc['latitude']
-                        lon = loc['longitude']
-
-                        tracker_data.update({
-                            'last_latitude': lat,
-                            'last_longitude': lon,
-                            'last_accuracy_meters': loc['accuracy_meters'],
-                            'last_seen_at': tracker['timestamp'],
-                            'is_on_site': self.is_on_site(lat, lon),
-                            'distance_from_site_km': round(self.calculate_distance(lat, lon), 2)
-                        })
-
-                    # Upsert tracker (insert or update) using REST API
-                    upsert_url = f"{self.supabase_url}/rest/v1/samsara_trackers"
-                    upsert_response = requests.post(
-                        upsert_url,
-                        headers={**self.supabase_headers, 'Prefer': 'resolution=merge-duplicates,return=representation'},
-                        json=tracker_data
-                    )
-
-                    if upsert_response.status_code in [200, 201]:
-                        # Determine if it was an insert or update based on response
-                        result_data = upsert_response.json()
-                        stats['trackers_updated'] += 1
-                        print(f"   Synced: {tracker['name']}")
-
-                        # Add to location history if location exists
-                        if has_location:
-                            loc_history = {
-                                'tracker_id': tracker_id,
-                                'latitude': lat,
-                                'longitude': lon,
-                                'accuracy_meters': loc['accuracy_meters'],
-                                'happened_at': tracker['timestamp'],
-                                'is_on_site': self.is_on_site(lat, lon),
-                                'distance_from_site_km': round(self.calculate_distance(lat, lon), 2)
-                            }
-
-                            # Insert into history (ignore duplicates)
-                            try:
-                                history_url = f"{self.supabase_url}/rest/v1/samsara_location_history"
-                                history_response = requests.post(
-                                    history_url,
-                                    headers=self.supabase_headers,
-                                    json=loc_history
-                                )
-                                if history_response.status_code in [200, 201]:
-                                    stats['locations_added'] += 1
-                            except Exception as e:
-                                # Likely a duplicate - that's OK
-                                if 'duplicate key' not in str(e).lower():
-                                    print(f"   Warning adding location history: {e}")
-                    else:
-                        print(f"   Error upserting tracker: {upsert_response.text}")
-                        stats['errors'] += 1
-
-                except Exception as e:
-                    print(f"   Error syncing {tracker.get('name', 'unknown')}: {e}")
-                    stats['errors'] += 1
+            with self.metrics.phase('load_geofences'):
+                self.load_geofences()
+            print(f"   Classifying against {len(self.geofences.zones)} geofence zone(s)")
+            self.write_snapshot(snapshot, stats, history_mode, compression_error_m)
 
             # Print summary
             print("\n" + "=" * 80)
@@ -171,7 +457,10 @@ class SamsaraSyncService:
             print(f"Trackers created:  {stats['trackers_created']}")
             print(f"Trackers updated:  {stats['trackers_updated']}")
             print(f"Locations added:   {stats['locations_added']}")
+            print(f"Locations skipped: {stats['locations_compressed']} (compression)")
+            print(f"Geofence events:   {stats['zone_events']}")
             print(f"Errors:            {stats['errors']}")
+            self.metrics.print_summary()
             print("=" * 80)
 
             # Get current statistics
@@ -190,7 +479,7 @@ class SamsaraSyncService:
         """Print current tracker statistics"""
         try:
             stats_url = f"{self.supabase_url}/rest/v1/vw_samsara_tracker_stats"
-            response = requests.get(stats_url, headers=self.supabase_headers)
+            response = self.session.get(stats_url, headers=self.supabase_headers)
 
             if response.status_code == 200:
                 result = response.json()
@@ -223,7 +512,7 @@ class SamsaraSyncService:
         """
         try:
             trackers_url = f"{self.supabase_url}/rest/v1/vw_active_samsara_trackers"
-            response = requests.get(trackers_url, headers=self.supabase_headers)
+            response = self.session.get(trackers_url, headers=self.supabase_headers)
 
             if response.status_code == 200:
                 trackers = response.json()
@@ -248,18 +537,71 @@ class SamsaraSyncService:
             }
 
 
-def main():
+def main(argv=None):
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Sync Samsara AT11 tracker data to Supabase')
+    parser.add_argument('--hours-back', type=int, default=24,
+                        help='Hours of location history to fetch (default: 24)')
+    parser.add_argument('--full-history', action='store_true',
+                        help='Store every fetched location event, not just the latest per tracker')
+    parser.add_argument('--compress-error-m', type=float, default=None,
+                        help='Trail compression error bound in meters for --full-history (0 disables)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and poll each tracker on an adaptive schedule')
+    parser.add_argument('--calls-per-minute', type=int, default=60,
+                        help='Samsara API call budget for --daemon (default: 60)')
+    parser.add_argument('--maintenance', action='store_true',
+                        help='After syncing, refresh history rollups and apply partition retention')
+    parser.add_argument('--profile', action='store_true',
+                        help='Run the sync under cProfile and write a .prof file next to the metrics report')
+    parser.add_argument('--no-mirror', action='store_true',
+                        help='Do not update the local SQLite mirror')
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        # Imported here because samsara_poller imports this module
+        from samsara_poller import build_poller
+        poller = build_poller(
+            calls_per_minute=args.calls_per_minute,
+            initial_hours_back=args.hours_back,
+            history_mode='full' if args.full_history else None
+        )
+        poller.run_forever()
+        sys.exit(0)
+
     print("\n" + "=" * 80)
     print("SAMSARA TRACKER SYNC")
     print("=" * 80)
 
     try:
         # Create sync service
-        sync_service = SamsaraSyncService()
+        sync_service = SamsaraSyncService(mirror=None if args.no_mirror else LocalMirror())
+
+        metrics = sync_service.metrics
 
         # Run sync (last 24 hours for most recent locations)
-        stats = sync_service.sync_trackers(hours_back=24)
+        with metrics.profile(args.profile):
+            stats = sync_service.sync_trackers(
+                hours_back=args.hours_back,
+                history_mode='full' if args.full_history else None,
+                compression_error_m=args.compress_error_m
+            )
+
+        if args.maintenance:
+            with metrics.phase('maintenance'):
+                maintenance = SamsaraHistoryMaintenance(
+                    session=sync_service.session,
+                    supabase_url=sync_service.supabase_url,
+                    supabase_key=sync_service.supabase_key
+                ).run()
+            if not maintenance['success']:
+                stats['errors'] += 1
+
+        metrics.count('errors', stats['errors'])
+        metrics.finish(success=stats['errors'] == 0)
+        report = metrics.write_report()
+        metrics.write_ledger(sync_service.session, sync_service.supabase_url, sync_service.supabase_headers)
+        print(f"\nMetrics report: {report['json']}")
 
         # Exit with appropriate code
         if stats['errors'] > 0:
@@ -12,6 +12,7 @@ assert.equal(isProjectScopedTable('receiving_records'), true);
 assert.equal(isProjectScopedTable('materials'), true);
 assert.equal(isProjectScopedTable('purchase_orders'), true);
 assert.equal(isProjectScopedTable('vw_active_samsara_trackers'), true);
+assert.equal(isProjectScopedTable('rollup_po_status'), true);
 assert.equal(isProjectScopedTable('inspection_photos'), false);
 assert.equal(isProjectScopedTable('audit_log'), false);
 
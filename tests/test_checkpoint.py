@@ -0,0 +1,240 @@
+"""
+Resumable uploads: a sync killed partway through resumes from the failed
+batch using the cached rows, without re-reading the workbook or clearing
+the table again. A batch rejected for one bad row is bisected instead, and
+the row stays out of the synced rows after a resume.
+
+Run with: python -m pytest tests/test_checkpoint.py
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkpoint  # noqa: E402
+import excel_reader  # noqa: E402
+import row_validation  # noqa: E402
+import sync_po_shipment_data  # noqa: E402
+from local_mirror import LocalMirror  # noqa: E402
+from sync_delivery_dates import ReadyByDatesSync  # noqa: E402
+from sync_po_shipment_data import POShipmentSyncService  # noqa: E402
+
+ROWS = 250  # three batches of 100, 100 and 50
+
+
+class Killed(BaseException):
+    """Stands in for the process dying (not caught by the sync's except Exception)"""
+
+
+class FakeSupabase:
+    """Records requests; kills the run, fails the Nth POST or rejects rows holding a poison value if asked to"""
+
+    def __init__(self, kill_on_post=None, fail_post=None, poison=(), unknown_column=False, kill_at=None):
+        self.kill_on_post = kill_on_post
+        self.kill_at = kill_at  # kill on the POST whose first row holds this value
+        self.fail_post = fail_post
+        self.poison = set(poison)
+        self.unknown_column = unknown_column
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, kwargs.get('json')))
+        posts = sum(1 for call_method, _ in self.calls if call_method == 'POST')
+        if method == 'POST' and (posts == self.kill_on_post or
+                                 self.kill_at is not None and self.kill_at in kwargs['json'][0].values()):
+            raise Killed()
+
+        response = requests.Response()
+        response.status_code = 201 if method == 'POST' else 204
+        response._content = b''
+        if method == 'POST' and posts == self.fail_post:
+            response.status_code = 503
+            response._content = b'{"message":"upstream timeout"}'
+        elif method == 'POST' and self.unknown_column:
+            response.status_code = 400
+            response._content = (b'{"code":"PGRST204","message":"Could not find the \'tag_number\' '
+                                 b'column of \'delivery_dates\' in the schema cache"}')
+        elif method == 'POST' and any(value in self.poison for row in kwargs['json'] for value in row.values()):
+            response.status_code = 400
+            response._content = b'{"code":"22007","message":"invalid input syntax for type date"}'
+        return response
+
+    def posted_batches(self):
+        return [payload for method, payload in self.calls if method == 'POST']
+
+    def deletes(self):
+        return sum(1 for method, _ in self.calls if method == 'DELETE')
+
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    monkeypatch.setenv('SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setenv('SUPABASE_ANON_KEY', 'test-key')
+    monkeypatch.setattr(checkpoint, 'CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    monkeypatch.setattr(row_validation, 'QUARANTINE_DIR', str(tmp_path / 'quarantine'))
+    monkeypatch.setattr(excel_reader, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+
+    path = tmp_path / 'ReadyByDates.xlsx'
+    pd.DataFrame({
+        'Project Phase ': ['Phase 1'] * ROWS,
+        'Package Description': [f'Package {i}' for i in range(ROWS)],
+        'Tag #': [f'TAG-{i:04d}' for i in range(ROWS)],
+        'Supplier Name': ['Acme'] * ROWS,
+        'PO #': [4500000000 + i for i in range(ROWS)],
+        'Ready to Ship Date': ['2026-03-01'] * ROWS,
+    }).to_excel(path, index=False)
+    return path
+
+
+@pytest.fixture
+def po_workbook(tmp_path, workbook, monkeypatch):
+    monkeypatch.setattr(sync_po_shipment_data, 'SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setattr(sync_po_shipment_data, 'SUPABASE_KEY', 'test-key')
+
+    path = tmp_path / 'PO & Shipment Log.xlsx'
+    pd.DataFrame({
+        'Purchase Order ID': [f'PO-{i:04d}' for i in range(ROWS)],
+        'Purchase Order Item': [10] * ROWS,
+        'Item UUID': [f'uuid-{i:04d}' for i in range(ROWS)],
+        'Supplier': ['Acme'] * ROWS,
+        'Ordered Quantity': [1] * ROWS,
+    }).to_excel(path, sheet_name='PO Parts Log', index=False)
+    monkeypatch.setattr(sync_po_shipment_data, 'EXCEL_FILE', str(path))
+    return path
+
+
+def make_sync(session, path):
+    sync = ReadyByDatesSync(session=session)
+    sync.excel_file = str(path)
+    return sync
+
+
+def test_killed_run_resumes_from_failed_batch(workbook, monkeypatch):
+    first = FakeSupabase(kill_on_post=2)
+    with pytest.raises(Killed):
+        make_sync(first, workbook).sync_ready_dates()
+    assert first.deletes() == 1
+    assert len(first.posted_batches()) == 2  # batch 1 committed, batch 2 in flight
+
+    # The resume must not touch the workbook
+    def no_read(self):
+        raise AssertionError('workbook re-read on resume')
+    monkeypatch.setattr(ReadyByDatesSync, 'read_records', no_read)
+
+    second = FakeSupabase()
+    result = make_sync(second, workbook).sync_ready_dates()
+
+    assert result == {'success': True, 'count': ROWS}
+    assert second.deletes() == 0
+    batches = second.posted_batches()
+    assert [len(batch) for batch in batches] == [100, 50]
+    assert batches[0][0]['tag_number'] == 'TAG-0100'
+    assert batches[-1][-1]['tag_number'] == f'TAG-{ROWS - 1:04d}'
+    assert not os.listdir(checkpoint.CHECKPOINT_DIR)
+
+
+def test_failed_batch_keeps_checkpoint(workbook):
+    first = FakeSupabase(fail_post=3)
+    result = make_sync(first, workbook).sync_ready_dates()
+    assert result['success'] is False
+
+    saved = checkpoint.UploadCheckpoint.load('delivery_dates', checkpoint.file_sha256(str(workbook)))
+    assert saved.committed == 2
+    assert saved.cleared
+
+    second = FakeSupabase()
+    assert make_sync(second, workbook).sync_ready_dates()['success']
+    assert [len(batch) for batch in second.posted_batches()] == [50]
+    assert second.deletes() == 0
+
+
+def test_changed_workbook_discards_checkpoint(workbook):
+    with pytest.raises(Killed):
+        make_sync(FakeSupabase(kill_on_post=2), workbook).sync_ready_dates()
+
+    df = pd.read_excel(workbook)
+    df.loc[0, 'Supplier Name'] = 'Other Supplier'
+    df.to_excel(workbook, index=False)
+
+    rerun = FakeSupabase()
+    assert make_sync(rerun, workbook).sync_ready_dates()['success']
+    assert rerun.deletes() == 1
+    assert [len(batch) for batch in rerun.posted_batches()] == [100, 100, 50]
+    assert rerun.posted_batches()[0][0]['supplier_name'] == 'Other Supplier'
+
+
+def test_poison_row_is_bisected_out(workbook):
+    session = FakeSupabase(poison={'TAG-0150'})
+    result = make_sync(session, workbook).sync_ready_dates()
+    assert result == {'success': True, 'count': ROWS - 1}
+
+    # Every good row was in exactly one accepted request
+    accepted = [row['tag_number'] for batch in session.posted_batches()
+                if all(row['tag_number'] != 'TAG-0150' for row in batch) for row in batch]
+    assert sorted(accepted) == [f'TAG-{i:04d}' for i in range(ROWS) if i != 150]
+    # Batch 2 costs its own request plus two per halving down to one row
+    assert len(session.posted_batches()) <= 1 + (1 + 2 * 7) + 1
+    assert not os.listdir(checkpoint.CHECKPOINT_DIR)
+
+    with open(os.path.join(row_validation.QUARANTINE_DIR, 'delivery_dates.json')) as f:
+        report = json.load(f)
+    assert [row['excel_row'] for row in report['rows']] == [152]
+    assert 'invalid input syntax' in report['rows'][0]['problems'][0]['problem']
+
+
+def test_schema_error_stops_without_bisecting(workbook):
+    session = FakeSupabase(unknown_column=True)
+    result = make_sync(session, workbook).sync_ready_dates()
+    assert result['success'] is False
+    assert 'PGRST204' in result['error']
+    assert len(session.posted_batches()) == 1  # not split, nothing quarantined
+    assert not os.path.exists(os.path.join(row_validation.QUARANTINE_DIR, 'delivery_dates.json'))
+
+    saved = checkpoint.UploadCheckpoint.load('delivery_dates', checkpoint.file_sha256(str(workbook)))
+    assert saved.committed == 0
+    assert saved.cleared
+
+
+def test_killed_po_sync_resumes_from_failed_batch(po_workbook, monkeypatch):
+    first = FakeSupabase(kill_on_post=3)
+    with pytest.raises(Killed):
+        POShipmentSyncService(session=first).sync_purchase_orders()
+    assert first.deletes() == 1
+    assert len(first.posted_batches()) == 3  # batches 1-2 committed, batch 3 in flight
+
+    def no_read(self):
+        raise AssertionError('workbook re-read on resume')
+    monkeypatch.setattr(POShipmentSyncService, 'read_purchase_orders', no_read)
+
+    second = FakeSupabase()
+    result = POShipmentSyncService(session=second).sync_purchase_orders()
+
+    assert result == {'success': True, 'count': ROWS}
+    assert second.deletes() == 0
+    batches = second.posted_batches()
+    assert [len(batch) for batch in batches] == [50]
+    assert batches[0][0]['purchase_order_id'] == 'PO-0200'
+    assert not os.listdir(checkpoint.CHECKPOINT_DIR)
+
+
+def test_rejected_row_stays_out_after_resume(workbook):
+    # Batch 2 loses TAG-0150 to bisection and commits; the run dies on batch 3
+    with pytest.raises(Killed):
+        make_sync(FakeSupabase(poison={'TAG-0150'}, kill_at='TAG-0200'), workbook).sync_ready_dates()
+
+    saved = checkpoint.UploadCheckpoint.load('delivery_dates', checkpoint.file_sha256(str(workbook)))
+    assert saved.committed == 2
+    assert saved.rejected == [150]
+
+    mirror = LocalMirror(':memory:')
+    sync = make_sync(FakeSupabase(), workbook)
+    sync.mirror = mirror
+    assert sync.sync_ready_dates() == {'success': True, 'count': ROWS - 1}
+    tags = {row['tag_number'] for row in mirror.rows('delivery_dates').values()}
+    assert len(tags) == ROWS - 1 and 'TAG-0150' not in tags
@@ -0,0 +1,211 @@
+"""
+Trajectory Compression
+Shrinks per-tracker location trails before they are stored in
+samsara_location_history. Near-identical fixes from parked equipment are
+dropped first, then the remaining trail is simplified with a time-aware
+Douglas-Peucker pass so every dropped point lies within a fixed error
+bound (meters) of the stored trail. Geofence arrivals and departures are
+always kept, as is the last fix of a stationary run before the tracker
+moves off, so departure times survive.
+
+Syncs fetch overlapping windows, so each tracker's trail can be anchored on
+its most recent stored fix: the anchor seeds dedup and simplification as a
+fixed first point and is never emitted again, and fixes at or before it are
+dropped. A parked tracker then stores one heartbeat per max_gap_s no matter
+how often the window is fetched.
+"""
+
+from datetime import datetime
+from math import cos, radians
+from typing import Dict, List, Optional
+
+import numpy as np
+
+M_PER_DEGREE_LAT = 111_320
+
+DEFAULT_ERROR_M = 25.0
+# Always keep at least one fix per tracker in this window, even when parked,
+# so "last seen here at" stays accurate in history
+DEFAULT_MAX_GAP_S = 6 * 3600
+
+
+def _parse_time(value: str) -> float:
+    """ISO 8601 timestamp to epoch seconds"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _zone_key(row: Dict):
+    """What counts as 'where' a fix is for arrival/departure detection"""
+    return tuple(row.get('zone_ids') or ()), row.get('is_on_site')
+
+
+def synchronized_distances(x: np.ndarray, y: np.ndarray, t: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Synchronized Euclidean distance of points start+1..end-1 from the
+    segment start->end: the distance from each point to where the tracker
+    would have been at that time moving at constant speed along the segment
+    """
+    span = t[end] - t[start]
+    inner = slice(start + 1, end)
+    ratio = (t[inner] - t[start]) / span if span > 0 else np.zeros(end - start - 1)
+    expected_x = x[start] + ratio * (x[end] - x[start])
+    expected_y = y[start] + ratio * (y[end] - y[start])
+    return np.hypot(x[inner] - expected_x, y[inner] - expected_y)
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, t: np.ndarray, error_m: float,
+                    keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Time-aware Douglas-Peucker simplification (iterative)
+
+    Args:
+        x, y: Planar coordinates in meters
+        t: Epoch seconds
+        error_m: Maximum allowed synchronized distance of a dropped point
+        keep: Boolean mask of points that must be kept; they split the
+            trail into independently simplified sections
+
+    Returns:
+        Boolean mask of points to keep
+    """
+    count = len(x)
+    mask = np.zeros(count, dtype=bool) if keep is None else keep.copy()
+    if count == 0:
+        return mask
+    mask[0] = mask[-1] = True
+
+    anchors = np.flatnonzero(mask)
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = synchronized_distances(x, y, t, start, end)
+        worst = int(np.argmax(distances))
+        if distances[worst] > error_m:
+            split = start + 1 + worst
+            mask[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return mask
+
+
+class TrajectoryCompressor:
+    """Distance/time dedup plus Douglas-Peucker simplification per tracker"""
+
+    def __init__(self, error_m: float = DEFAULT_ERROR_M, min_distance_m: Optional[float] = None,
+                 max_gap_s: float = DEFAULT_MAX_GAP_S):
+        """
+        Args:
+            error_m: Error bound for simplification, in meters
+            min_distance_m: Fixes closer than this to the last kept fix are
+                dropped as duplicates (defaults to error_m)
+            max_gap_s: Keep a fix at least this often even when stationary
+        """
+        self.error_m = error_m
+        self.min_distance_m = error_m if min_distance_m is None else min_distance_m
+        self.max_gap_s = max_gap_s
+
+    def compress(self, rows: List[Dict], anchors: Optional[Dict[str, Dict]] = None) -> tuple:
+        """
+        Compress history rows for any number of trackers
+
+        Args:
+            rows: samsara_location_history rows (tracker_id, latitude,
+                longitude, happened_at, optionally zone_ids / is_on_site)
+            anchors: Most recent stored fix per tracker_id, same columns.
+                Rows at or before a tracker's anchor are dropped and the
+                anchor itself is never returned
+
+        Returns:
+            Tuple of (kept_rows, stats) where stats counts rows in, rows
+            dropped by dedup (including rows already covered by an anchor),
+            rows dropped by simplification and rows kept
+        """
+        stats = {'rows_in': len(rows), 'dedup_dropped': 0, 'simplify_dropped': 0, 'rows_out': 0}
+        anchors = anchors or {}
+
+        by_tracker: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_tracker.setdefault(row['tracker_id'], []).append(row)
+
+        kept = []
+        for tracker_id, trail in by_tracker.items():
+            trail.sort(key=lambda row: _parse_time(row['happened_at']))
+            anchor = anchors.get(tracker_id)
+            if anchor:
+                anchored_at = _parse_time(anchor['happened_at'])
+                fresh = [row for row in trail if _parse_time(row['happened_at']) > anchored_at]
+                stats['dedup_dropped'] += len(trail) - len(fresh)
+                if not fresh:
+                    continue
+                trail = [anchor] + fresh
+
+            deduped, departures = self._dedup(trail)
+            simplified = self._simplify(deduped, departures)
+            stats['dedup_dropped'] += len(trail) - len(deduped)
+            stats['simplify_dropped'] += len(deduped) - len(simplified)
+            # The anchor is always the first point kept; it is already stored
+            kept.extend(simplified[1:] if anchor else simplified)
+
+        stats['rows_out'] = len(kept)
+        return kept, stats
+
+    def _project(self, trail: List[Dict]):
+        lats = np.array([row['latitude'] for row in trail], dtype=float)
+        lons = np.array([row['longitude'] for row in trail], dtype=float)
+        times = np.array([_parse_time(row['happened_at']) for row in trail], dtype=float)
+        scale = M_PER_DEGREE_LAT * cos(radians(lats.mean()))
+        return (lons - lons[0]) * scale, (lats - lats[0]) * M_PER_DEGREE_LAT, times
+
+    def _transitions(self, trail: List[Dict]) -> np.ndarray:
+        """Mask of the fixes on both sides of every zone change"""
+        keys = [_zone_key(row) for row in trail]
+        mask = np.zeros(len(trail), dtype=bool)
+        for i in range(1, len(trail)):
+            if keys[i] != keys[i - 1]:
+                mask[i - 1] = mask[i] = True
+        return mask
+
+    def _dedup(self, trail: List[Dict]) -> tuple:
+        """(kept rows, mask of the kept rows that are departures from a parked spot)"""
+        if len(trail) < 2:
+            return trail, np.zeros(len(trail), dtype=bool)
+
+        x, y, t = self._project(trail)
+        transitions = self._transitions(trail)
+        kept = [0]
+        departures = set()
+        for i in range(1, len(trail)):
+            last = kept[-1]
+            near = np.hypot(x[i] - x[last], y[i] - y[last]) < self.min_distance_m
+            recent = t[i] - t[last] < self.max_gap_s
+            if transitions[i] or not (near and recent):
+                # Moving off: keep the last parked fix too, it is the departure time
+                if not near and i - 1 > last:
+                    kept.append(i - 1)
+                    departures.add(i - 1)
+                kept.append(i)
+        return [trail[i] for i in kept], np.array([i in departures for i in kept], dtype=bool)
+
+    def _simplify(self, trail: List[Dict], departures: Optional[np.ndarray] = None) -> List[Dict]:
+        if len(trail) < 3:
+            return trail
+
+        x, y, t = self._project(trail)
+        keep = self._transitions(trail)
+        if departures is not None:
+            keep |= departures
+        mask = douglas_peucker(x, y, t, self.error_m, keep=keep)
+
+        # Put back a heartbeat wherever simplification left a gap longer than max_gap_s
+        last = 0
+        for i in range(1, len(trail)):
+            if mask[i]:
+                last = i
+            elif t[i] - t[last] >= self.max_gap_s:
+                mask[i] = True
+                last = i
+
+        return [row for row, keep in zip(trail, mask) if keep]